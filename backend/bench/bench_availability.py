@@ -0,0 +1,105 @@
+"""
+Earliest-availability search over many doctors and days.
+Seeds a local SQLite database with N doctors whose first --full-days are fully
+booked and the rest partly booked, then times find_earliest_slots (a booked-slots
+query per search window plus the bitmask pass) against the per-doctor, per-day scan
+it replaces. --rtt-ms adds a simulated database round trip to every query, as
+against a hosted Supabase project. Runs offline; prints JSON.
+
+    python bench/bench_availability.py --doctors 300 --days 30 --full-days 5
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from data.sqlite_repo import SQLiteRepository  # noqa: E402
+from availability import SLOT_TIMES, find_earliest_slots  # noqa: E402
+
+
+class RemoteRepository(SQLiteRepository):
+    """SQLite with a fixed network round trip added to every query."""
+
+    def __init__(self, rtt: float):
+        super().__init__(":memory:")
+        self.rtt = rtt
+
+    async def _query(self, op, sql, params=()):
+        if self.rtt:
+            await asyncio.sleep(self.rtt)
+        return await super()._query(op, sql, params)
+
+
+async def seed(repo: SQLiteRepository, doctors: int, days: int, full_days: int, fill: float, rng: random.Random):
+    doctor_rows = [{"id": f"doctor-{i}", "name": f"Dr. {i}", "email": f"d{i}@example.com", "role": "doctor",
+                    "speciality": rng.choice(["Cardiologist", "General Physician", "Orthopedic"])} for i in range(doctors)]
+    await repo.insert("users", doctor_rows + [{"id": "patient-0", "name": "P", "email": "p@example.com", "role": "patient"}])
+    today = date.today()
+    appts = [{
+        "patient_id": "patient-0", "doctor_id": d["id"], "date": (today + timedelta(days=day)).isoformat(),
+        "time": t, "status": "accepted", "type": "Checkup",
+    } for d in doctor_rows for day in range(days) for t in SLOT_TIMES if day < full_days or rng.random() < fill]
+    await repo.insert("appointments", appts)
+    return doctor_rows, len(appts)
+
+
+async def naive(repo: SQLiteRepository, doctors, days: int, limit: int):
+    """What book_appointment used to do, widened to every doctor and day: one query per doctor-day."""
+    found = []
+    today = date.today()
+    for day in range(days):
+        d = (today + timedelta(days=day)).isoformat()
+        for doc in doctors:
+            booked = (await repo.booked_slots([doc["id"]], d)).get(doc["id"], {}).get(d, set())
+            found += [(d, t, doc["id"]) for t in SLOT_TIMES if t not in booked]
+        if len(found) >= limit:
+            break
+    return sorted(found)[:limit]
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--doctors", type=int, default=300)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--full-days", type=int, default=5, help="leading days with every slot booked")
+    parser.add_argument("--fill", type=float, default=0.7, help="fraction of later slots already booked")
+    parser.add_argument("--rtt-ms", type=float, default=20.0)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    repo = RemoteRepository(args.rtt_ms / 1000)
+    doctors, booked = await seed(repo, args.doctors, args.days, args.full_days, args.fill, random.Random(7))
+
+    repo.query_counts.clear()
+    started = time.perf_counter()
+    for _ in range(args.runs):
+        slots = await find_earliest_slots(repo, doctors, days=args.days, limit=5, per_doctor=2)
+    engine_ms = (time.perf_counter() - started) / args.runs * 1000
+    engine_queries = repo.query_counts["booked_slots"] / args.runs
+
+    repo.query_counts.clear()
+    started = time.perf_counter()
+    await naive(repo, doctors, args.days, 5)
+    naive_ms = (time.perf_counter() - started) * 1000
+
+    print(json.dumps({
+        "doctors": args.doctors,
+        "days": args.days,
+        "booked_slots": booked,
+        "rtt_ms": args.rtt_ms,
+        "engine_ms": round(engine_ms, 2),
+        "engine_queries": engine_queries,
+        "naive_ms": round(naive_ms, 2),
+        "naive_queries": repo.query_counts["booked_slots"],
+        "earliest": [f"{s['date']} {s['time']} {s['doctor_id']}" for s in slots],
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
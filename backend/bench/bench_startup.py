@@ -0,0 +1,121 @@
+"""
+Cold-start benchmark: how long a fresh worker process takes to import the app and
+to become ready (lifespan start-up plus a first request), and how long N workers
+started together take, as with `uvicorn --workers N`.
+
+Runs offline (SQLite, fake LLM, fake SMS). Pass --ref to measure another commit
+side by side, e.g. the one before lazy client initialisation:
+
+    python bench/bench_startup.py --runs 7 --workers 4 --ref HEAD~1
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+import tempfile
+from typing import Dict, Any, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.abspath(os.path.join(HERE, "..", ".."))
+
+# Executed in a fresh interpreter per sample so nothing is already imported.
+PROBE = r"""
+import sys, time, json, asyncio, contextlib
+started = time.perf_counter()
+with contextlib.redirect_stdout(sys.stderr):
+    import main
+imported = time.perf_counter()
+
+async def first_request():
+    import httpx
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://probe") as client:
+            await client.get("/")
+        return time.perf_counter()
+
+with contextlib.redirect_stdout(sys.stderr):
+    ready = asyncio.run(first_request())
+print(json.dumps({"import_ms": (imported - started) * 1000, "ready_ms": (ready - started) * 1000}))
+"""
+
+
+def probe_env(workdir: str, tag: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        "DATA_BACKEND": "sqlite",
+        "SQLITE_PATH": os.path.join(workdir, f"{tag}.db"),
+        "LLM_PROVIDER": "fake",
+        "SMS_PROVIDER": "fake",
+        "ALERT_OUTBOX_PATH": os.path.join(workdir, f"{tag}-outbox.db"),
+    })
+    return env
+
+
+def spawn(src_dir: str, workdir: str, tag: str) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-c", PROBE], cwd=src_dir, env=probe_env(workdir, tag),
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+    )
+
+
+def collect(proc: subprocess.Popen) -> Dict[str, float]:
+    out, _ = proc.communicate()
+    if proc.returncode != 0:
+        raise RuntimeError(f"probe exited with {proc.returncode}")
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def measure(src_dir: str, runs: int, workers: int) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix="agentcare-startup-")
+    singles: List[Dict[str, float]] = []
+    for i in range(runs):
+        singles.append(collect(spawn(src_dir, workdir, f"single-{i}")))
+
+    fleet_walls = []
+    for i in range(runs):
+        started = time.perf_counter()
+        procs = [spawn(src_dir, workdir, f"fleet-{i}-{w}") for w in range(workers)]
+        for proc in procs:
+            collect(proc)
+        fleet_walls.append((time.perf_counter() - started) * 1000)
+
+    return {
+        "import_ms": round(statistics.median(s["import_ms"] for s in singles), 1),
+        "ready_ms": round(statistics.median(s["ready_ms"] for s in singles), 1),
+        f"{workers}_workers_ready_ms": round(statistics.median(fleet_walls), 1),
+    }
+
+
+def export_ref(ref: str) -> str:
+    """Extract backend/src at a git ref into a temp dir (no checkout or worktree changes)."""
+    target = tempfile.mkdtemp(prefix=f"agentcare-{ref.replace('/', '_')}-")
+    archive = subprocess.run(["git", "archive", ref, "backend/src"], cwd=REPO_ROOT, check=True, capture_output=True)
+    subprocess.run(["tar", "-x", "-C", target], input=archive.stdout, check=True)
+    return os.path.join(target, "backend", "src")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Samples per measurement (median is reported)")
+    parser.add_argument("--workers", type=int, default=4, help="Processes started together for the fleet measurement")
+    parser.add_argument("--ref", help="Also measure backend/src at this git ref")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    report: Dict[str, Any] = {"config": vars(args), "current": measure(os.path.join(HERE, "..", "src"), args.runs, args.workers)}
+    if args.ref:
+        report[args.ref] = measure(export_ref(args.ref), args.runs, args.workers)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main_cli()
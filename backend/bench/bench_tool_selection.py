@@ -0,0 +1,59 @@
+"""
+Tool-subset selection benchmark.
+Compares the estimated prompt tokens spent on tool schemas when every turn sends
+all tools versus the intent-selected subset. Runs offline; prints JSON.
+
+    python bench/bench_tool_selection.py
+"""
+import os
+import sys
+import json
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from context_budget import estimate_tokens  # noqa: E402
+from intents import select_tool_names  # noqa: E402
+from orchestrator import ALL_TOOLS, TOOLS_BY_NAME  # noqa: E402
+
+CONVERSATIONS = [
+    ["Hello!", "What medicines am I taking?", "Thank you"],
+    ["I want to book an appointment", "My knee has been hurting for 3 days", "Thanks"],
+    ["When is my next appointment?", "How is my blood pressure?"],
+    ["I have chest pain and can't breathe"],
+    ["Find a hospital near me", "Which doctors work there?"],
+    ["Can you tell me a joke?", "Good morning"],
+]
+
+
+def main():
+    all_tokens = estimate_tokens(json.dumps(ALL_TOOLS))
+    turns = []
+    started = time.perf_counter()
+    for convo in CONVERSATIONS:
+        history = []
+        for message in convo:
+            names = select_tool_names(message, history)
+            sent = ALL_TOOLS if names is None else [TOOLS_BY_NAME[n] for n in names]
+            turns.append({
+                "message": message,
+                "tools": [t["function"]["name"] for t in sent],
+                "schema_tokens": estimate_tokens(json.dumps(sent)) if sent else 0,
+            })
+            history += [{"role": "user", "content": message}, {"role": "assistant", "content": "..."}]
+    elapsed = time.perf_counter() - started
+
+    selected_total = sum(t["schema_tokens"] for t in turns)
+    baseline_total = all_tokens * len(turns)
+    print(json.dumps({
+        "turns": len(turns),
+        "baseline_schema_tokens": baseline_total,
+        "selected_schema_tokens": selected_total,
+        "reduction_pct": round(100 * (1 - selected_total / baseline_total), 1),
+        "classifier_us_per_turn": round(elapsed / len(turns) * 1e6, 1),
+        "detail": turns,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
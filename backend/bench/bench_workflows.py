@@ -0,0 +1,121 @@
+"""
+LLM iterations per common workflow: one tool per model turn vs composite tools.
+Runs the emergency, booking and status flows through AgentOrchestrator.chat (the real
+agent loop) twice with the scripted fake LLM: once calling one tool per model turn,
+as hosted models do when each step depends on reading the previous result, and once
+through the composite tools. Reports LLM calls and latency per workflow. Runs
+offline; prints JSON.
+
+    python bench/bench_workflows.py --runs 20 --llm-latency-ms 800
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import statistics
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "src"))
+sys.path.insert(0, HERE)
+
+WORKFLOWS = {
+    "emergency": {
+        "message": "I fell in the bathroom and my chest hurts, please help",
+        "history": [],
+        "sequential": [{"name": "find_nearest_hospital"}, {"name": "send_emergency_alert"}],
+        "composite": [{"name": "emergency_response"}],
+    },
+    "booking": {
+        "message": "My knee has been hurting for three days when I climb stairs",
+        "history": [
+            {"role": "user", "content": "I want to book an appointment"},
+            {"role": "assistant", "content": "Of course. Could you tell me a little about your symptoms?"},
+        ],
+        "sequential": [{"name": "get_available_doctors"}, {"name": "book_appointment", "arguments": {
+            "doctor_name": "Dr.", "reason": "Knee pain", "patient_notes": "{message}"}}],
+        "composite": [{"name": "book_appointment", "arguments": {
+            "doctor_name": "best match", "reason": "Knee pain", "patient_notes": "{message}"}}],
+    },
+    "status": {
+        "message": "How am I doing, and when is my next appointment?",
+        "history": [],
+        "sequential": [{"name": "get_health_summary"}, {"name": "get_appointments"}],
+        "composite": [{"name": "status_overview"}],
+    },
+}
+
+
+def scripts(mode: str):
+    """One script per workflow: each tool call is its own model turn, then the reply."""
+    return {
+        re.escape(spec["message"]): [{"tool_calls": [call]} for call in spec[mode]] + ["Done."]
+        for spec in WORKFLOWS.values()
+    }
+
+
+async def run_mode(mode: str, args, repo, patients):
+    from fakes import FakeGeoTransport
+    from agents import tools
+    from llm import FakeLLMProvider
+    from orchestrator import AgentOrchestrator
+
+    tools.set_http_transport(FakeGeoTransport(lambda: args.geo_latency_ms / 1000, random.Random(3)))
+    orchestrator = AgentOrchestrator(repo, FakeLLMProvider(scripts=scripts(mode), latency=args.llm_latency_ms / 1000))
+    out = {}
+    for name, spec in WORKFLOWS.items():
+        calls, latencies, tools_run = [], [], []
+        for i in range(args.runs):
+            # A different patient and location each run so no run is served from another's cache
+            patient = patients[i % len(patients)]
+            started = time.perf_counter()
+            result = await orchestrator.chat(patient, spec["message"], spec["history"],
+                                             lat=9.93 + i * 0.01, lng=76.27 + i * 0.01)
+            latencies.append((time.perf_counter() - started) * 1000)
+            calls.append(result["usage"]["llm_calls"])
+            tools_run = [a["tool"] for a in result["actions"]]
+        out[name] = {
+            "llm_calls": statistics.mean(calls),
+            "mean_ms": round(statistics.mean(latencies), 1),
+            "tools_run": tools_run,
+        }
+    return out
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0)
+    parser.add_argument("--geo-latency-ms", type=float, default=300.0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="agentcare-workflows-")
+    os.environ["SMS_PROVIDER"] = "fake"
+    os.environ["ALERT_OUTBOX_PATH"] = os.path.join(workdir, "outbox.db")
+
+    from fakes import seed
+    from data.sqlite_repo import SQLiteRepository
+    from agents.alerts import get_alert_outbox
+
+    repo = SQLiteRepository(":memory:")
+    patients = (await seed(repo, max(args.runs, 10), 40, random.Random(7)))["patients"]
+    outbox = get_alert_outbox()
+    await outbox.start()
+    try:
+        report = {mode: await run_mode(mode, args, repo, patients) for mode in ("sequential", "composite")}
+    finally:
+        await outbox.stop()
+    print(json.dumps({
+        "runs": args.runs,
+        "llm_latency_ms": args.llm_latency_ms,
+        "geo_latency_ms": args.geo_latency_ms,
+        **report,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
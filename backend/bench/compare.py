@@ -0,0 +1,75 @@
+"""
+Compare two load_test.py reports and flag regressions.
+
+    python bench/compare.py baseline.json candidate.json [--threshold 10]
+
+Exits non-zero when any operation's p95/p99 latency or query count got worse by
+more than the threshold (percent), or its throughput dropped by more than it.
+"""
+import sys
+import json
+import argparse
+
+# (path within a by_kind summary, higher_is_worse)
+METRICS = [
+    (("latency_ms", "p50"), True),
+    (("latency_ms", "p95"), True),
+    (("latency_ms", "p99"), True),
+    (("queries_per_request",), True),
+    (("llm_calls_per_request",), True),
+    (("throughput_rps",), False),
+]
+GATED = {("latency_ms", "p95"), ("latency_ms", "p99"), ("queries_per_request",), ("throughput_rps",)}
+
+
+def _get(d, path):
+    for key in path:
+        d = d.get(key, {}) if isinstance(d, dict) else {}
+    return d if isinstance(d, (int, float)) else None
+
+
+def compare(base, cand, threshold: float):
+    rows, regressions = [], []
+    sections = {"overall": (base["overall"], cand["overall"])}
+    for kind in sorted(set(base["by_kind"]) & set(cand["by_kind"])):
+        sections[kind] = (base["by_kind"][kind], cand["by_kind"][kind])
+
+    for name, (b, c) in sections.items():
+        for path, higher_is_worse in METRICS:
+            old, new = _get(b, path), _get(c, path)
+            if old is None or new is None:
+                continue
+            change = ((new - old) / old * 100) if old else (0.0 if new == old else float("inf"))
+            worse = change > threshold if higher_is_worse else change < -threshold
+            label = f"{name}.{'.'.join(path)}"
+            rows.append((label, old, new, change, worse))
+            if worse and path in GATED:
+                regressions.append(label)
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Allowed change in percent")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        base = json.load(f)
+    with open(args.candidate) as f:
+        cand = json.load(f)
+
+    print(f"baseline {base['meta']['commit']}  ->  candidate {cand['meta']['commit']}")
+    rows, regressions = compare(base, cand, args.threshold)
+    for label, old, new, change, worse in rows:
+        flag = "  REGRESSION" if worse else ""
+        print(f"{label:45s} {old:>10.2f} -> {new:>10.2f}  ({change:+.1f}%){flag}")
+
+    if regressions:
+        print(f"\n{len(regressions)} gated regression(s) beyond {args.threshold}%: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
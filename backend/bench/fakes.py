@@ -0,0 +1,132 @@
+"""
+Local stand-ins for the benchmark suite: an httpx transport that answers Nominatim
+and Overpass requests, and a seeder that fills a SQLiteRepository with a realistic
+clinic population.
+"""
+import re
+import random
+import asyncio
+from datetime import date, timedelta
+from typing import Callable, Dict, Any, List
+
+import httpx
+
+from geo_index import hospital_key
+
+HOSPITAL_NAMES = [
+    "City General Hospital",
+    "St. Judes Medical Center",
+    "Sunset Health Clinic",
+    "Lakeshore Hospital",
+    "Amrita Institute of Medical Sciences",
+    "Medical Trust Hospital",
+    "Renai Medicity",
+    "Aster Medcity",
+]
+
+SPECIALITIES = ["General Physician", "Cardiology", "Orthopedics", "Neurology", "Geriatrics", "Dermatology", "ENT"]
+
+AROUND = re.compile(r"around:\d+,(-?[\d.]+),(-?[\d.]+)")
+
+
+def place_coordinates(query: str):
+    """Stable made-up coordinates within ~10 km of central Kochi for any place name."""
+    rng = random.Random(hospital_key(query.split(",")[0]))
+    return round(9.93 + rng.uniform(-0.09, 0.09), 5), round(76.27 + rng.uniform(-0.09, 0.09), 5)
+
+
+class FakeGeoTransport(httpx.AsyncBaseTransport):
+    """Answers Nominatim search and Overpass interpreter calls with synthetic data
+    after a sampled delay. Counts calls per upstream so benchmarks can report volume."""
+
+    def __init__(self, latency: Callable[[], float], rng: random.Random):
+        self.latency = latency
+        self.rng = rng
+        self.calls: Dict[str, int] = {"nominatim": 0, "overpass": 0}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(self.latency())
+        if "nominatim" in request.url.host:
+            self.calls["nominatim"] += 1
+            lat, lon = place_coordinates(request.url.params.get("q", ""))
+            return httpx.Response(200, json=[{"lat": str(lat), "lon": str(lon)}])
+
+        self.calls["overpass"] += 1
+        body = (await request.aread()).decode()
+        m = AROUND.search(httpx.QueryParams(body).get("data", ""))
+        lat, lon = (float(m.group(1)), float(m.group(2))) if m else (9.9312, 76.2673)
+        elements = [{
+            "type": "node",
+            "lat": lat + self.rng.uniform(-0.03, 0.03),
+            "lon": lon + self.rng.uniform(-0.03, 0.03),
+            "tags": {"name": name, "amenity": "hospital", "phone": "+91 484 000 0000", "emergency": "yes"},
+        } for name in self.rng.sample(HOSPITAL_NAMES, 5)]
+        return httpx.Response(200, json={"elements": elements})
+
+
+async def seed(repo, patients: int, doctors: int, rng: random.Random) -> Dict[str, List[str]]:
+    """Populate the repository. Returns the generated ids and appointment ids."""
+    doctor_rows = [{
+        "id": f"doctor-{i}",
+        "name": f"Dr. {rng.choice(['Anil', 'Meera', 'Joseph', 'Priya', 'Rahul', 'Sara'])} {i}",
+        "email": f"doctor{i}@example.com",
+        "role": "doctor",
+        "speciality": rng.choice(SPECIALITIES),
+        "hospital_name": rng.choice(HOSPITAL_NAMES),
+    } for i in range(doctors)]
+    patient_rows = [{
+        "id": f"patient-{i}",
+        "name": f"Patient {i}",
+        "email": f"patient{i}@example.com",
+        "role": "patient",
+        "dob": f"19{rng.randint(35, 60)}-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}",
+        "guardian_phone": f"98{rng.randint(10000000, 99999999)}",
+    } for i in range(patients)]
+    await repo.insert("users", doctor_rows + patient_rows)
+    # Hospital coordinates as the doctor index's geocoding job leaves them
+    await repo.upsert_hospital_locations([
+        {"name_key": hospital_key(name), "name": name, **dict(zip(("latitude", "longitude"), place_coordinates(name)))}
+        for name in HOSPITAL_NAMES
+    ])
+
+    today = date.today()
+    vitals, meds, appts = [], [], []
+    for p in patient_rows:
+        for d in range(5):
+            vitals.append({
+                "patient_id": p["id"],
+                "bp_systolic": rng.randint(110, 150),
+                "bp_diastolic": rng.randint(70, 95),
+                "heart_rate": rng.randint(60, 95),
+                "spo2": rng.randint(93, 99),
+                "logged_at": (today - timedelta(days=d)).isoformat() + "T08:00:00",
+            })
+        for name, dosage in rng.sample([("Metformin", "500mg"), ("Amlodipine", "5mg"), ("Atorvastatin", "10mg"),
+                                        ("Aspirin", "75mg"), ("Levothyroxine", "50mcg")], 2):
+            meds.append({
+                "patient_id": p["id"],
+                "name": name,
+                "dosage": dosage,
+                "frequency": rng.choice(["once daily", "twice daily"]),
+                "current_stock": rng.randint(0, 40),
+                "stock_threshold": 10,
+                "refill_quantity": 30,
+            })
+        doc = rng.choice(doctor_rows)
+        appts.append({
+            "id": f"appt-{p['id']}",
+            "patient_id": p["id"],
+            "doctor_id": doc["id"],
+            "date": (today + timedelta(days=rng.randint(1, 14))).isoformat(),
+            "time": f"{rng.randint(9, 16):02d}:{rng.choice(['00', '30'])}",
+            "status": rng.choice(["pending", "accepted"]),
+            "reason": "Routine follow-up",
+        })
+    await repo.insert("vitals", vitals)
+    await repo.insert("medications", meds)
+    await repo.insert("appointments", appts)
+    return {
+        "patients": [p["id"] for p in patient_rows],
+        "doctors": [d["id"] for d in doctor_rows],
+        "appointments": [a["id"] for a in appts],
+    }
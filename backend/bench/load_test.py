@@ -0,0 +1,265 @@
+"""
+End-to-end load test for the AgentCare backend.
+
+Runs the FastAPI app in-process with local stand-ins for every external service
+(fake LLM, SQLite instead of Supabase, fake Nominatim/Overpass, fake SMS), replays a
+weighted mix of /chat, /api/previsit/interview-turn, /api/nearby-hospitals and
+refill scans at a fixed concurrency, and writes a JSON report with p50/p95/p99
+latency, throughput and database query counts per operation.
+
+    python bench/load_test.py --requests 500 --concurrency 32 --output bench_output.json
+    python bench/compare.py baseline.json bench_output.json
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import argparse
+import contextlib
+import platform
+import subprocess
+import tempfile
+from collections import defaultdict
+from typing import Dict, Any, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "src"))
+sys.path.insert(0, HERE)
+
+CHAT_MESSAGES = [
+    "What are my medications?",
+    "When is my next appointment?",
+    "How is my blood pressure?",
+    "Hello, good morning!",
+    "I want to book an appointment",
+    "My knee has been hurting for three days, please book an appointment",
+    "Find a hospital near me",
+    "I have chest pain and can't breathe",
+    "Can you remind me what the doctor said about my diet?",
+    "I feel dizzy when I stand up",
+]
+
+INTERVIEW_ANSWERS = [
+    "It started about three days ago.",
+    "The pain is around 6 out of 10.",
+    "It gets worse when I climb stairs.",
+    "No, I haven't taken anything for it yet.",
+]
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # Nearest-rank percentile
+    k = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def summarize(samples: List[Dict[str, Any]], wall_seconds: float) -> Dict[str, Any]:
+    lat = sorted(s["ms"] for s in samples)
+    ok = [s for s in samples if s["ok"]]
+    return {
+        "requests": len(samples),
+        "errors": len(samples) - len(ok),
+        "throughput_rps": round(len(samples) / wall_seconds, 2) if wall_seconds else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(lat, 50), 2),
+            "p95": round(percentile(lat, 95), 2),
+            "p99": round(percentile(lat, 99), 2),
+            "mean": round(sum(lat) / len(lat), 2) if lat else 0.0,
+            "max": round(lat[-1], 2) if lat else 0.0,
+        },
+        "queries_per_request": round(sum(s["queries"] for s in samples) / len(samples), 2) if samples else 0.0,
+        "llm_calls_per_request": round(sum(s.get("llm_calls", 0) for s in samples) / len(samples), 2) if samples else 0.0,
+        "shed": sum(1 for s in samples if s.get("shed")),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def configure_environment(args, workdir: str):
+    """Must run before the app is imported: main.py builds its clients from the environment."""
+    os.environ["DATA_BACKEND"] = "sqlite"
+    os.environ["SQLITE_PATH"] = os.path.join(workdir, "bench.db")
+    os.environ["LLM_PROVIDER"] = "fake"
+    os.environ["FAKE_LLM_LATENCY_MS"] = str(args.llm_latency_ms)
+    os.environ["FAKE_LLM_429_RATE"] = str(args.rate_limit_rate)
+    os.environ["FAKE_LLM_SEED"] = str(args.seed)
+    os.environ["SMS_PROVIDER"] = "fake"
+    os.environ["ALERT_OUTBOX_PATH"] = os.path.join(workdir, "outbox.db")
+
+
+async def run(args) -> Dict[str, Any]:
+    import httpx
+    from fakes import FakeGeoTransport, seed
+    from llm import lognormal_latency
+
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix="agentcare-bench-")
+    configure_environment(args, workdir)
+
+    import main
+    from agents import tools
+    from agents.refill_agent import RefillMonitorAgent
+    from data import count_queries
+    from intents import classify
+    from admission import priority_for, PRIORITY_NAMES
+    from metrics import PREFETCHES
+    from geo_index import get_doctor_index
+
+    geo_rng = random.Random(args.seed + 1)
+    geo_latency = lognormal_latency(args.geo_latency_ms / 1000, rng=geo_rng) if args.geo_latency_ms else (lambda: 0.0)
+    geo = FakeGeoTransport(geo_latency, geo_rng)
+    tools.set_http_transport(geo)
+    ids = await seed(main.get_repo(), args.patients, args.doctors, rng)
+    refill_agent = RefillMonitorAgent(main.get_repo())
+
+    weights = dict(item.split("=") for item in args.mix.split(","))
+    kinds = list(weights)
+    kind_weights = [float(weights[k]) for k in kinds]
+    # Draw every random choice up front so the workload is identical run to run,
+    # whatever order the concurrent workers pick requests up in.
+    # --locations N clusters patients around N facilities (a few metres of GPS jitter),
+    # as when many residents of the same care home chat at once.
+    sites = [(9.93 + rng.uniform(-0.05, 0.05), 76.26 + rng.uniform(-0.05, 0.05)) for _ in range(args.locations)]
+
+    def location() -> Dict[str, float]:
+        if sites:
+            lat, lng = rng.choice(sites)
+            return {"lat": lat + rng.uniform(-0.0002, 0.0002), "lng": lng + rng.uniform(-0.0002, 0.0002)}
+        return {"lat": 9.93 + rng.uniform(-0.05, 0.05), "lng": 76.26 + rng.uniform(-0.05, 0.05)}
+
+    plan = [{
+        "kind": rng.choices(kinds, kind_weights)[0],
+        "patient": rng.choice(ids["patients"]),
+        "message": rng.choice(CHAT_MESSAGES),
+        "turns": rng.randint(1, len(INTERVIEW_ANSWERS)),
+        **location(),
+    } for _ in range(args.requests)]
+
+    samples: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    chat_by_priority: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    queue: asyncio.Queue = asyncio.Queue()
+    for spec in plan:
+        queue.put_nowait(spec)
+
+    async def one(client: httpx.AsyncClient, spec: Dict[str, Any]):
+        kind, patient = spec["kind"], spec["patient"]
+        llm_calls, shed = 0, False
+        with count_queries() as queries:
+            started = time.perf_counter()
+            try:
+                if kind == "chat":
+                    res = await client.post("/chat", json={
+                        "message": spec["message"], "patient_id": patient, "lat": spec["lat"], "lng": spec["lng"],
+                    })
+                    ok = res.status_code == 200
+                    if ok:
+                        llm_calls = (res.json().get("usage") or {}).get("llm_calls", 0)
+                        shed = bool(res.json().get("shed"))
+                elif kind == "previsit":
+                    history = []
+                    for answer in INTERVIEW_ANSWERS[:spec["turns"]]:
+                        history += [{"role": "assistant", "content": "Can you tell me more?"}, {"role": "user", "content": answer}]
+                    res = await client.post("/api/previsit/interview-turn", json={
+                        "appointment_id": f"appt-{patient}", "appointment_reason": "Knee pain",
+                        "patient_id": patient, "chat_history": history,
+                    })
+                    ok = res.status_code == 200
+                    llm_calls = 2  # next question + live report draft
+                elif kind == "hospitals":
+                    res = await client.post("/api/nearby-hospitals", json={"latitude": spec["lat"], "longitude": spec["lng"]})
+                    ok = res.status_code == 200
+                elif kind == "refill":
+                    await refill_agent.check_stocks_and_trigger_refills()
+                    ok = True
+                else:
+                    raise ValueError(f"Unknown workload kind: {kind}")
+            except Exception as e:
+                print(f"[Bench] {kind} failed: {e}", file=sys.stderr)
+                ok = False
+            elapsed_ms = (time.perf_counter() - started) * 1000
+        sample = {"ms": elapsed_ms, "ok": ok, "queries": sum(queries.values()), "llm_calls": llm_calls, "shed": shed}
+        samples[kind].append(sample)
+        if kind == "chat":
+            chat_by_priority[PRIORITY_NAMES[priority_for(classify(spec["message"]))]].append(sample)
+
+    async def worker(client: httpx.AsyncClient):
+        while not queue.empty():
+            await one(client, queue.get_nowait())
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            # Warm-up outside the measured window (imports, caches, sqlite pages)
+            await client.get("/")
+            started = time.perf_counter()
+            await asyncio.gather(*(worker(client) for _ in range(args.concurrency)))
+            wall = time.perf_counter() - started
+
+    all_samples = [s for kind_samples in samples.values() for s in kind_samples]
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "config": vars(args),
+        },
+        "overall": summarize(all_samples, wall),
+        "by_kind": {kind: summarize(s, wall) for kind, s in sorted(samples.items())},
+        "chat_by_priority": {p: summarize(s, wall) for p, s in sorted(chat_by_priority.items())},
+        "upstream_calls": {
+            **geo.calls,
+            "llm": main.get_llm().calls,
+            "llm_rate_limited": main.get_llm().rate_limited,
+            "db_queries_by_op": dict(main.get_repo().query_counts),
+            "coalesced": {f.name: {"leaders": f.leaders, "followers": f.followers}
+                          for f in (tools._geocode_flights, tools._overpass_flights)},
+        },
+        "admission": main.get_orchestrator().admission.snapshot(),
+        "doctor_index": get_doctor_index().snapshot(),
+        "prefetch": {f"{tool}:{result}": int(n) for (tool, result), n in sorted(PREFETCHES._values.items())},
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--mix", default="chat=60,previsit=20,hospitals=15,refill=5",
+                        help="Weighted workload mix, e.g. chat=60,previsit=20,hospitals=15,refill=5")
+    parser.add_argument("--patients", type=int, default=200)
+    parser.add_argument("--doctors", type=int, default=40)
+    parser.add_argument("--locations", type=int, default=0,
+                        help="Cluster patients around this many facilities (0 = spread over the city)")
+    parser.add_argument("--llm-latency-ms", type=float, default=300, help="Median fake LLM latency (lognormal)")
+    parser.add_argument("--geo-latency-ms", type=float, default=150, help="Median fake Nominatim/Overpass latency")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of LLM calls that return 429")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    # The app logs with print(); keep stdout clean for the JSON report.
+    with contextlib.redirect_stdout(sys.stderr):
+        report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+        overall = report["overall"]
+        print(f"[Bench] {overall['requests']} requests, {overall['throughput_rps']} rps, "
+              f"p50 {overall['latency_ms']['p50']} ms, p99 {overall['latency_ms']['p99']} ms -> {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main_cli()
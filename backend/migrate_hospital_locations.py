@@ -0,0 +1,31 @@
+"""
+Migration: Add the hospital_locations table used by the doctor index (geo_index.py).
+Run once: python migrate_hospital_locations.py
+"""
+import os
+from dotenv import load_dotenv
+from supabase import create_client
+
+load_dotenv()
+
+supabase = create_client(os.environ["SUPABASE_URL"], os.environ["SUPABASE_KEY"])
+
+# Tables can't be created through PostgREST; check for it and print the SQL
+# to run in the Supabase Dashboard SQL Editor if it's missing.
+try:
+    test = supabase.table("hospital_locations").select("name_key, name, latitude, longitude").limit(1).execute()
+    print(f"✅ hospital_locations already exists ({len(test.data)} row(s) sampled). Migration not needed.")
+except Exception as e:
+    print(f"❌ hospital_locations doesn't exist yet. Error: {e}")
+    print("\n⚠️  Please run this SQL in Supabase Dashboard > SQL Editor:")
+    print("""
+    CREATE TABLE IF NOT EXISTS hospital_locations (
+        name_key TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        latitude DOUBLE PRECISION,
+        longitude DOUBLE PRECISION,
+        geocoded_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    );
+    """)
+    print("Until then doctor search lists all doctors without distance ranking.")
+    print("Then re-run this script to verify.")
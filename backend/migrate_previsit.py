@@ -1,5 +1,5 @@
 """
-Migration: Add pre_visit_report columns to appointments table.
+Migration: Add pre_visit_report columns (and updated_at) to appointments table.
 Run once: python migrate_previsit.py
 """
 import os
@@ -20,7 +20,7 @@ print(f"Appointments table accessible: {len(test.data)} row(s)")
 
 # Try selecting the new columns to see if they exist
 try:
-    test2 = supabase.table("appointments").select("id, pre_visit_report, pre_visit_status").limit(1).execute()
+    test2 = supabase.table("appointments").select("id, pre_visit_report, pre_visit_status, updated_at").limit(1).execute()
     print("✅ Columns already exist! Migration not needed.")
 except Exception as e:
     print(f"❌ Columns don't exist yet. Error: {e}")
@@ -28,6 +28,7 @@ except Exception as e:
     print("""
     ALTER TABLE appointments 
     ADD COLUMN IF NOT EXISTS pre_visit_report TEXT,
-    ADD COLUMN IF NOT EXISTS pre_visit_status TEXT DEFAULT NULL;
+    ADD COLUMN IF NOT EXISTS pre_visit_status TEXT DEFAULT NULL,
+    ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP;
     """)
     print("Then re-run this script to verify.")
@@ -34,6 +34,16 @@ CREATE TABLE IF NOT EXISTS hospitals (
     contact_phone TEXT
 );
 
+-- Hospital coordinates, geocoded once per distinct doctors.hospital_name (see geo_index.py).
+-- NULL coordinates mark a name the geocoder couldn't resolve.
+CREATE TABLE IF NOT EXISTS hospital_locations (
+    name_key TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    latitude DOUBLE PRECISION,
+    longitude DOUBLE PRECISION,
+    geocoded_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
 -- MCP Events (Audit Log)
 CREATE TABLE IF NOT EXISTS mcp_events (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
@@ -54,6 +64,25 @@ CREATE TABLE IF NOT EXISTS patients (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Newest rows per patient for batched context loads (SupabaseRepository.patient_contexts):
+-- one round trip for the whole batch, bounded on the server. medical_reports is created
+-- by the app, like users and appointments.
+CREATE OR REPLACE FUNCTION recent_vitals(patient_ids UUID[], per_patient INTEGER)
+RETURNS SETOF vitals LANGUAGE sql STABLE AS $$
+    SELECT (ranked.v).* FROM (
+        SELECT v, ROW_NUMBER() OVER (PARTITION BY v.patient_id ORDER BY v.logged_at DESC) AS rn
+        FROM vitals v WHERE v.patient_id = ANY(patient_ids)
+    ) ranked WHERE ranked.rn <= per_patient
+$$;
+
+CREATE OR REPLACE FUNCTION recent_medical_reports(patient_ids UUID[], per_patient INTEGER)
+RETURNS SETOF medical_reports LANGUAGE sql STABLE AS $$
+    SELECT (ranked.r).* FROM (
+        SELECT r, ROW_NUMBER() OVER (PARTITION BY r.patient_id ORDER BY r.created_at DESC) AS rn
+        FROM medical_reports r WHERE r.patient_id = ANY(patient_ids)
+    ) ranked WHERE ranked.rn <= per_patient
+$$;
+
 -- Seed test data
 INSERT INTO hospitals (name, city, specialization, er_available) VALUES
 ('City General Hospital', 'New York', ARRAY['Cardiology', 'Emergency', 'Neurology'], true),
@@ -0,0 +1,139 @@
+"""
+Admission control for LLM chat sessions.
+Caps concurrent agent loops, runs at most one turn per patient at a time, and queues
+the rest in a bounded priority queue that serves emergencies first. When the queue is
+full, the lowest-priority waiter is shed (never an emergency in favour of small talk).
+"""
+import time
+import heapq
+import asyncio
+import itertools
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Dict, List, Tuple, AsyncIterator
+
+from metrics import ADMISSIONS, ADMISSION_WAIT_SECONDS
+from deadline import remaining
+
+EMERGENCY, CLINICAL, ROUTINE = 0, 1, 2
+PRIORITY_NAMES = {EMERGENCY: "emergency", CLINICAL: "clinical", ROUTINE: "routine"}
+
+CLINICAL_INTENTS = {"booking", "symptoms", "doctors", "hospital"}
+
+
+def priority_for(intents) -> int:
+    if "emergency" in intents:
+        return EMERGENCY
+    if intents & CLINICAL_INTENTS:
+        return CLINICAL
+    return ROUTINE
+
+
+class AdmissionRejected(Exception):
+    """The turn was shed; reason is one of queue_full, timeout, patient_busy."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class AdmissionController:
+    def __init__(self, max_sessions: int = 8, max_queue: int = 32, queue_timeout: float = 20.0):
+        self.max_sessions = max_sessions
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._active = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []  # heap of (priority, seq, future)
+        self._seq = itertools.count()
+        self._patient_locks: Dict[str, asyncio.Lock] = {}
+        self._patient_refs: Counter = Counter()
+        self.stats: Counter = Counter()
+
+    @asynccontextmanager
+    async def admit(self, patient_id: str, priority: int = ROUTINE) -> AsyncIterator[None]:
+        """Hold an LLM session slot for the duration of the block, or raise AdmissionRejected.
+        Emergencies skip the per-patient limit so they never wait behind the same patient's small talk."""
+        label = PRIORITY_NAMES[priority]
+        lock = None
+        if priority != EMERGENCY:
+            # One turn running plus at most one waiting per patient; double-submits beyond that are shed.
+            if self._patient_refs[patient_id] >= 2:
+                self._reject("patient_busy", label)
+            lock = self._patient_locks.setdefault(patient_id, asyncio.Lock())
+            self._patient_refs[patient_id] += 1
+        # Never queue past the request's own deadline
+        left = remaining()
+        queue_timeout = self.queue_timeout if left is None else min(self.queue_timeout, left)
+        try:
+            started = time.perf_counter()
+            if lock is not None:
+                try:
+                    await asyncio.wait_for(lock.acquire(), queue_timeout)
+                except asyncio.TimeoutError:
+                    self._reject("patient_busy", label)
+            try:
+                await self._acquire_slot(priority, label, queue_timeout - (time.perf_counter() - started))
+                ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - started, priority=label)
+                self.stats["admitted"] += 1
+                ADMISSIONS.inc(result="admitted", priority=label)
+                try:
+                    yield
+                finally:
+                    self._release_slot()
+            finally:
+                if lock is not None:
+                    lock.release()
+        finally:
+            if lock is not None:
+                self._patient_refs[patient_id] -= 1
+                if not self._patient_refs[patient_id]:
+                    del self._patient_refs[patient_id]
+                    self._patient_locks.pop(patient_id, None)
+
+    def snapshot(self) -> Dict[str, int]:
+        return {"active": self._active, "queued": len(self._waiters), **self.stats}
+
+    def _reject(self, reason: str, label: str):
+        self.stats[reason] += 1
+        ADMISSIONS.inc(result=reason, priority=label)
+        raise AdmissionRejected(reason)
+
+    async def _acquire_slot(self, priority: int, label: str, timeout: float):
+        if self._active < self.max_sessions and not self._waiters:
+            self._active += 1
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            # Shed the lowest-priority, most recent waiter to make room, if it ranks below us
+            worst = max(self._waiters)
+            if worst[0] <= priority:
+                self._reject("queue_full", label)
+            self._waiters.remove(worst)
+            heapq.heapify(self._waiters)
+            self.stats["queue_full"] += 1
+            ADMISSIONS.inc(result="queue_full", priority=PRIORITY_NAMES[worst[0]])
+            worst[2].set_exception(AdmissionRejected("queue_full"))
+
+        fut = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._seq), fut)
+        heapq.heappush(self._waiters, entry)
+        try:
+            await asyncio.wait_for(fut, max(timeout, 0.0))
+        except BaseException as e:
+            if fut.done() and not fut.cancelled() and fut.exception() is None:
+                self._release_slot()  # slot was handed over just as we gave up
+            elif entry in self._waiters:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            if isinstance(e, asyncio.TimeoutError):
+                self._reject("timeout", label)
+            raise
+
+    def _release_slot(self):
+        # Hand the slot straight to the highest-priority live waiter; otherwise free it
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self._active -= 1
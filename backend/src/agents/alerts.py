@@ -0,0 +1,392 @@
+"""
+Emergency Alert Outbox
+Durable queue of outgoing SMS alerts, drained by a bounded pool of async workers
+with retries, exponential backoff and per-patient dedup windows.
+"""
+import os
+import time
+import uuid
+import random
+import socket
+import sqlite3
+import asyncio
+import threading
+from typing import Dict, Any, List, Optional
+
+from metrics import span
+
+
+# ── SMS providers ──────────────────────────────────────────────────────────────
+
+class SmsPermanentError(Exception):
+    """Raised by a provider when retrying the same message can never succeed."""
+
+
+class SmsProvider:
+    """Base class for SMS providers. Instances are long-lived and shared by all workers."""
+    name = "base"
+
+    async def send(self, to: str, body: str) -> str:
+        """Send one SMS and return the provider's message id."""
+        raise NotImplementedError
+
+
+class TwilioSmsProvider(SmsProvider):
+    name = "twilio"
+
+    def __init__(self, account_sid: str, auth_token: str, from_phone: str):
+        from twilio.rest import Client as TwilioClient
+        self.client = TwilioClient(account_sid, auth_token)
+        self.from_phone = from_phone
+
+    async def send(self, to: str, body: str) -> str:
+        try:
+            # The Twilio SDK is synchronous; keep it off the event loop.
+            sms = await asyncio.to_thread(
+                self.client.messages.create, body=body, from_=self.from_phone, to=to
+            )
+        except Exception as e:
+            status = getattr(e, "status", None)
+            # 4xx (bad number, unverified recipient, ...) will not fix itself; 429 will.
+            if isinstance(status, int) and 400 <= status < 500 and status != 429:
+                raise SmsPermanentError(str(e)) from e
+            raise
+        return sms.sid
+
+
+class FakeSmsProvider(SmsProvider):
+    """In-memory provider for tests and local runs. Records every message it 'sends'."""
+    name = "fake"
+
+    def __init__(self, fail_times: int = 0, latency: float = 0.0):
+        self.sent: List[Dict[str, Any]] = []
+        self.attempts = 0
+        self.fail_times = fail_times
+        self.latency = latency
+
+    async def send(self, to: str, body: str) -> str:
+        self.attempts += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.fail_times > 0:
+            self.fail_times -= 1
+            raise RuntimeError("Simulated transient SMS failure")
+        sid = f"FAKE{len(self.sent) + 1:06d}"
+        self.sent.append({"sid": sid, "to": to, "body": body, "sent_at": time.time()})
+        print(f"[Alerts] (fake) SMS to {to}: {body}")
+        return sid
+
+
+def create_sms_provider() -> SmsProvider:
+    """Twilio when credentials are configured, otherwise the local fake (simulation)."""
+    sid = os.environ.get("TWILIO_ACCOUNT_SID")
+    token = os.environ.get("TWILIO_AUTH_TOKEN")
+    from_phone = os.environ.get("TWILIO_PHONE_NUMBER")
+    if os.environ.get("SMS_PROVIDER", "").lower() != "fake" and sid and token and from_phone:
+        return TwilioSmsProvider(sid, token, from_phone)
+    print("[Alerts] Twilio credentials missing in .env. Falling back to simulation.")
+    return FakeSmsProvider()
+
+
+# ── Durable store ──────────────────────────────────────────────────────────────
+
+class OutboxStore:
+    """SQLite-backed alert table. Survives restarts; pending alerts are re-queued on start.
+    Claims are stamped with `owner`, which must survive a restart (the host name by default),
+    so a restarted process reclaims its own in-flight sends at once; anyone's claim that
+    outlives the lease is reclaimed too."""
+
+    def __init__(self, path: str = "alert_outbox.db", owner: Optional[str] = None, claim_lease: float = 300.0):
+        self.owner = owner or socket.gethostname()
+        self.claim_lease = claim_lease  # after this long a 'sending' row is presumed abandoned by its owner
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS alert_outbox (
+                    id TEXT PRIMARY KEY,
+                    patient_id TEXT NOT NULL,
+                    dest_phone TEXT NOT NULL,
+                    body TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    sent_at REAL,
+                    provider_id TEXT,
+                    last_error TEXT,
+                    claimed_by TEXT,
+                    claimed_at REAL
+                )
+            """)
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(alert_outbox)")}
+            for column, kind in (("claimed_by", "TEXT"), ("claimed_at", "REAL")):
+                if column not in columns:  # outbox files created before claims were stamped
+                    self._conn.execute(f"ALTER TABLE alert_outbox ADD COLUMN {column} {kind}")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_alert_outbox_patient ON alert_outbox (patient_id, created_at)"
+            )
+
+    def add_unless_recent(self, alert: Dict[str, Any], window_seconds: float) -> Optional[Dict[str, Any]]:
+        """Insert the alert unless one for the same patient is live within the window.
+        Returns the existing alert when deduplicated, otherwise None."""
+        with self._lock, self._conn:
+            existing = self._conn.execute(
+                "SELECT * FROM alert_outbox WHERE patient_id = ? AND created_at >= ? AND status != 'failed' "
+                "ORDER BY created_at DESC LIMIT 1",
+                (alert["patient_id"], alert["created_at"] - window_seconds),
+            ).fetchone()
+            if existing:
+                return dict(existing)
+            self._conn.execute(
+                "INSERT INTO alert_outbox (id, patient_id, dest_phone, body, status, attempts, next_attempt_at, created_at) "
+                "VALUES (:id, :patient_id, :dest_phone, :body, 'pending', 0, :next_attempt_at, :created_at)",
+                alert,
+            )
+        return None
+
+    def get(self, alert_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM alert_outbox WHERE id = ?", (alert_id,)).fetchone()
+        return dict(row) if row else None
+
+    def claim(self, alert_id: str) -> Optional[Dict[str, Any]]:
+        """Mark a pending alert as sending and return it, or None if someone else got it."""
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "UPDATE alert_outbox SET status = 'sending', attempts = attempts + 1, claimed_by = ?, claimed_at = ? "
+                "WHERE id = ? AND status = 'pending'",
+                (self.owner, time.time(), alert_id),
+            )
+            if cur.rowcount == 0:
+                return None
+            row = self._conn.execute("SELECT * FROM alert_outbox WHERE id = ?", (alert_id,)).fetchone()
+        return dict(row)
+
+    def mark_sent(self, alert_id: str, provider_id: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE alert_outbox SET status = 'sent', sent_at = ?, provider_id = ?, last_error = NULL WHERE id = ?",
+                (time.time(), provider_id, alert_id),
+            )
+
+    def mark_retry(self, alert_id: str, next_attempt_at: float, error: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE alert_outbox SET status = 'pending', next_attempt_at = ?, last_error = ? WHERE id = ?",
+                (next_attempt_at, error, alert_id),
+            )
+
+    def mark_failed(self, alert_id: str, error: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE alert_outbox SET status = 'failed', last_error = ? WHERE id = ?", (error, alert_id)
+            )
+
+    def recover_pending(self) -> List[Dict[str, Any]]:
+        """Return alerts still owed a delivery, resetting any this owner left 'sending' (a crash or
+        restart) and any whose claim outlived the lease. Other live processes' sends are left alone."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE alert_outbox SET status = 'pending' WHERE status = 'sending' AND (claimed_by = ? OR claimed_at < ?)",
+                (self.owner, time.time() - self.claim_lease),
+            )
+            rows = self._conn.execute(
+                "SELECT id, next_attempt_at FROM alert_outbox WHERE status = 'pending' ORDER BY next_attempt_at"
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def reclaim_expired(self) -> List[Dict[str, Any]]:
+        """Reset 'sending' alerts whose claim outlived the lease (their sender died) and return them."""
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT id, next_attempt_at FROM alert_outbox WHERE status = 'sending' AND claimed_at < ?",
+                (time.time() - self.claim_lease,),
+            ).fetchall()
+            for row in rows:
+                self._conn.execute(
+                    "UPDATE alert_outbox SET status = 'pending' WHERE id = ? AND status = 'sending'", (row["id"],)
+                )
+        return [dict(r) for r in rows]
+
+
+# ── Outbox ─────────────────────────────────────────────────────────────────────
+
+class AlertOutbox:
+    def __init__(
+        self,
+        store: OutboxStore,
+        provider: Optional[SmsProvider] = None,
+        workers: int = 4,
+        max_attempts: int = 5,
+        backoff_base: float = 2.0,
+        backoff_max: float = 60.0,
+        dedup_window: float = 300.0,
+        enqueue_timeout: float = 0.5,
+    ):
+        self.store = store
+        self.provider = provider or create_sms_provider()
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.dedup_window = dedup_window
+        self.enqueue_timeout = enqueue_timeout
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._timers: List[asyncio.TimerHandle] = []
+
+    @property
+    def is_running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self):
+        """Spawn the worker pool and re-queue anything left over from a previous run."""
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        now = time.time()
+        for row in await asyncio.to_thread(self.store.recover_pending):
+            self._schedule(row["id"], max(0.0, row["next_attempt_at"] - now))
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._reclaimer()))
+        print(f"[Alerts] Outbox started with {self.workers} workers ({self.provider.name} provider)")
+
+    async def stop(self, drain_timeout: float = 5.0):
+        """Give in-flight sends a moment to finish, then stop. Undelivered alerts stay in the store."""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            print("[Alerts] Outbox drain timed out; pending alerts will resume on next start.")
+        for timer in self._timers:
+            timer.cancel()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._timers = []
+        self._queue = None
+
+    async def enqueue(self, patient_id: str, dest_phone: str, body: str) -> Dict[str, Any]:
+        """Persist an alert and hand it to the workers. Returns within `enqueue_timeout`; if the
+        store is slower than that, the insert carries on and the alert is scheduled as soon as
+        it lands, and the result says so (status "storing") rather than reporting a failure."""
+        now = time.time()
+        alert = {
+            "id": str(uuid.uuid4()),
+            "patient_id": patient_id,
+            "dest_phone": dest_phone,
+            "body": body,
+            "next_attempt_at": now,
+            "created_at": now,
+        }
+        insert = asyncio.ensure_future(asyncio.to_thread(self.store.add_unless_recent, alert, self.dedup_window))
+        insert.add_done_callback(lambda done: self._inserted(alert["id"], done))
+        try:
+            existing = await asyncio.wait_for(asyncio.shield(insert), timeout=self.enqueue_timeout)
+        except asyncio.TimeoutError:
+            print(f"[Alerts] Alert for patient {patient_id} is still being stored; it will be sent once it lands")
+            return {"alert_id": alert["id"], "status": "storing", "deduplicated": False}
+        if existing:
+            print(f"[Alerts] Alert for patient {patient_id} deduplicated into {existing['id']}")
+            return {"alert_id": existing["id"], "status": existing["status"], "deduplicated": True}
+        return {"alert_id": alert["id"], "status": "pending", "deduplicated": False}
+
+    def _inserted(self, alert_id: str, insert: asyncio.Future):
+        """Schedule a freshly stored alert, whether or not enqueue() was still waiting for it."""
+        if insert.cancelled():
+            return
+        if insert.exception() is not None:
+            print(f"[Alerts] Could not store alert {alert_id}: {insert.exception()}")
+            return
+        if insert.result() is None:
+            self._schedule(alert_id, 0.0)
+
+    def _schedule(self, alert_id: str, delay: float):
+        if self._queue is None:
+            return  # Not started; the alert is picked up from the store on start().
+        if delay <= 0:
+            self._queue.put_nowait(alert_id)
+        else:
+            loop = asyncio.get_running_loop()
+            self._timers = [t for t in self._timers if t.when() > loop.time()]
+            self._timers.append(loop.call_later(delay, self._queue.put_nowait, alert_id))
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (attempts - 1)))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _reclaimer(self):
+        """Re-queue alerts abandoned mid-send by a process that died and hasn't come back."""
+        interval = max(1.0, self.store.claim_lease / 2)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                rows = await asyncio.to_thread(self.store.reclaim_expired)
+            except Exception as e:
+                print(f"[Alerts] Lease reclaim failed: {e}")
+                continue
+            now = time.time()
+            for row in rows:
+                print(f"[Alerts] Alert {row['id']} outlived its claim lease; re-queued")
+                self._schedule(row["id"], max(0.0, row["next_attempt_at"] - now))
+
+    async def _worker(self, index: int):
+        while True:
+            alert_id = await self._queue.get()
+            try:
+                await self._deliver(alert_id)
+            except Exception as e:
+                print(f"[Alerts] Worker {index} error for alert {alert_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, alert_id: str):
+        alert = await asyncio.to_thread(self.store.claim, alert_id)
+        if not alert:
+            return
+        try:
+            with span("sms", self.provider.name):
+                provider_id = await self.provider.send(alert["dest_phone"], alert["body"])
+        except SmsPermanentError as e:
+            print(f"[Alerts] Alert {alert_id} failed permanently: {e}")
+            await asyncio.to_thread(self.store.mark_failed, alert_id, str(e))
+            return
+        except Exception as e:
+            if alert["attempts"] >= self.max_attempts:
+                print(f"[Alerts] Alert {alert_id} failed after {alert['attempts']} attempts: {e}")
+                await asyncio.to_thread(self.store.mark_failed, alert_id, str(e))
+                return
+            delay = self._backoff(alert["attempts"])
+            print(f"[Alerts] Alert {alert_id} attempt {alert['attempts']} failed ({e}); retrying in {delay:.1f}s")
+            await asyncio.to_thread(self.store.mark_retry, alert_id, time.time() + delay, str(e))
+            self._schedule(alert_id, delay)
+            return
+
+        await asyncio.to_thread(self.store.mark_sent, alert_id, provider_id)
+        print(f"[Alerts] SMS sent for alert {alert_id} via {self.provider.name} ({provider_id})")
+
+
+_outbox: Optional[AlertOutbox] = None
+
+
+def get_alert_outbox() -> AlertOutbox:
+    """Process-wide outbox, configured from the environment on first use."""
+    global _outbox
+    if _outbox is None:
+        _outbox = AlertOutbox(
+            OutboxStore(
+                os.environ.get("ALERT_OUTBOX_PATH", "alert_outbox.db"),
+                owner=os.environ.get("ALERT_WORKER_ID") or None,
+                claim_lease=float(os.environ.get("ALERT_CLAIM_LEASE_SECONDS", "300")),
+            ),
+            workers=int(os.environ.get("ALERT_WORKERS", "4")),
+            max_attempts=int(os.environ.get("ALERT_MAX_ATTEMPTS", "5")),
+            dedup_window=float(os.environ.get("ALERT_DEDUP_WINDOW_SECONDS", "300")),
+        )
+    return _outbox
@@ -2,55 +2,53 @@
 Appoint-Ready Pre-Visit Agent
 Generates targeted health questions and produces a structured pre-visit report.
 """
-import os
 import json
 from typing import Dict, Any, List, Optional
-from groq import Groq
-from supabase import Client
+
+from data import Repository
+from llm import LLMProvider, create_llm_provider
+from metrics import span, record_llm_usage, LLM_CALLS
+from pubsub import ReportBroker, get_report_broker
+from audit import AuditLog, get_audit_log
 
 
 class PreVisitAgent:
-    def __init__(self, supabase: Client):
-        self.supabase = supabase
-        api_key = os.environ.get("GROQ_API_KEY")
-        if not api_key:
-            raise ValueError("GROQ_API_KEY is required")
-        self.client = Groq(api_key=api_key)
+    def __init__(
+        self, repo: Repository, llm: Optional[LLMProvider] = None,
+        broker: Optional[ReportBroker] = None, audit: Optional[AuditLog] = None,
+    ):
+        self.repo = repo
+        self.llm = llm or create_llm_provider()
+        self.broker = broker or get_report_broker()
+        self.audit = audit or get_audit_log()
         self.model = "llama-3.1-8b-instant"
 
-    def _get_patient_context(self, patient_id: str) -> Dict[str, Any]:
+    async def _get_patient_context(self, patient_id: str) -> Dict[str, Any]:
         """Fetch patient health context for smarter questions."""
-        user_res = self.supabase.table("users").select("name, dob, guardian_phone").eq("id", patient_id).execute()
-        user = user_res.data[0] if user_res.data else {}
-
-        vitals_res = self.supabase.table("vitals").select("*").eq("patient_id", patient_id).order("logged_at", desc=True).limit(3).execute()
-        vitals = vitals_res.data or []
-
-        meds_res = self.supabase.table("medications").select("name, dosage, frequency").eq("patient_id", patient_id).execute()
-        medications = meds_res.data or []
-
-        try:
-            reports_res = self.supabase.table("medical_reports").select("*").eq("patient_id", patient_id).order("created_at", desc=True).limit(3).execute()
-            reports = reports_res.data or []
-        except Exception:
-            reports = []  # Table may not exist or have different columns
+        context = await self.repo.patient_context(patient_id, vitals_limit=3, include_reports=True)
+        return self.shape_context(context)
 
+    @staticmethod
+    def shape_context(context: Dict[str, Any]) -> Dict[str, Any]:
+        """Repository patient context -> the fields the prompts use."""
+        user = context["user"]
         return {
             "patient_name": user.get("name", "Unknown"),
             "dob": user.get("dob"),
-            "vitals": vitals,
-            "medications": medications,
-            "recent_reports": reports,
+            "vitals": context["vitals"],
+            "medications": context["medications"],
+            "recent_reports": context["reports"],
         }
 
-    def conduct_interview_turn(self, appointment_reason: str, patient_id: str, chat_history: List[Dict[str, str]]) -> Dict[str, Any]:
+    async def conduct_interview_turn(self, appointment_reason: str, patient_id: str, chat_history: List[Dict[str, str]]) -> Dict[str, Any]:
         """Process the chat history and generate the next symptom question, or conclude the interview."""
-        context = self._get_patient_context(patient_id)
+        context = await self._get_patient_context(patient_id)
         
         # Count how many questions the assistant has asked so far
         assistant_questions = sum(1 for m in chat_history if m["role"] == "assistant")
         
         if assistant_questions >= 5:
+            self._audit_turn(patient_id, appointment_reason, assistant_questions, "complete")
             return {"next_question": None, "is_complete": True}
 
         system_prompt = f"""You are a medical intake assistant conducting a pre-visit interview.
@@ -78,24 +76,30 @@ Output ONLY your response text and nothing else."""
             messages.append({"role": msg["role"], "content": msg["content"]})
             
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                max_tokens=200,
-                temperature=0.3,
-            )
+            with span("llm", self.model):
+                response = await self.llm.acomplete(
+                    model=self.model,
+                    messages=messages,
+                    max_tokens=200,
+                    temperature=0.3,
+                )
+            record_llm_usage("previsit", self.model, response)
             content = response.choices[0].message.content.strip()
             
             if "INTERVIEW_COMPLETE" in content or assistant_questions >= 5:
+                self._audit_turn(patient_id, appointment_reason, assistant_questions, "complete")
                 return {"next_question": None, "is_complete": True}
                 
+            self._audit_turn(patient_id, appointment_reason, assistant_questions, "question")
             return {"next_question": content, "is_complete": False}
             
         except Exception as e:
+            LLM_CALLS.inc(agent="previsit", model=self.model, status="error")
             print(f"[PreVisit] Error generating next question: {e}")
+            self._audit_turn(patient_id, appointment_reason, assistant_questions, "fallback")
             return {"next_question": "Could you tell me anything else about how you're feeling?", "is_complete": assistant_questions >= 4}
 
-    def generate_report(
+    async def generate_report(
         self, appointment_id: str, patient_id: str, appointment_reason: str,
         chat_history: List[Dict[str, str]], is_final: bool = False
     ) -> str:
@@ -103,7 +107,7 @@ Output ONLY your response text and nothing else."""
         if not chat_history:
             return ""
             
-        context = self._get_patient_context(patient_id)
+        context = await self._get_patient_context(patient_id)
 
         # Build Q&A transcript
         transcript = ""
@@ -111,8 +115,89 @@ Output ONLY your response text and nothing else."""
             speaker = "Assistant" if msg["role"] == "assistant" else "Patient"
             transcript += f"**{speaker}:** {msg['content']}\n\n"
 
-        prompt = f"""You are a medical documentation assistant evaluating a simulated interview between an AI assistant and a patient.
-Generate a concise, structured Pre-Visit Report for the doctor, and provide a self-evaluation of the AI's performance.
+        prompt = self._report_prompt(context, appointment_reason, transcript)
+
+        try:
+            report = await self._complete_report(prompt)
+        except Exception as e:
+            print(f"[PreVisit] Error generating report: {e}")
+            report = self._fallback_report(context, appointment_reason, transcript)
+
+        # If it's a live update, we might set status to 'draft'. If final, 'completed'.
+        await self._save_report(appointment_id, patient_id, report, "completed" if is_final else "draft")
+        return report
+
+    async def prepare_report(self, appointment: Dict[str, Any], context: Dict[str, Any]) -> str:
+        """Chart-prep report from the EHR and booking notes, for appointments with no interview yet.
+        Saved as 'prepared'. Raises on LLM and save errors so bulk jobs can retry, back off or count the failure."""
+        reason = appointment.get("reason") or appointment.get("type") or "General Checkup"
+        notes = appointment.get("patient_notes")
+        transcript = f"**Patient (booking notes):** {notes}\n\n" if notes else "No pre-visit interview has been conducted yet.\n\n"
+        report = await self._complete_report(self._report_prompt(context, reason, transcript, interview=False))
+        if not await self._save_report(appointment["id"], appointment.get("patient_id"), report, "prepared"):
+            raise RuntimeError(f"Could not save the report for appointment {appointment['id']}")
+        return report
+
+    async def _complete_report(self, prompt: str) -> str:
+        try:
+            with span("llm", self.model):
+                response = await self.llm.acomplete(
+                    model=self.model,
+                    messages=[{"role": "user", "content": prompt}],
+                    max_tokens=1000,
+                    temperature=0.2,
+                )
+        except Exception:
+            LLM_CALLS.inc(agent="previsit", model=self.model, status="error")
+            raise
+        record_llm_usage("previsit", self.model, response)
+        return response.choices[0].message.content.strip()
+
+    def _audit_turn(self, patient_id: str, reason: str, questions_asked: int, outcome: str):
+        self.audit.record("previsit_agent", "interview_turn", {
+            "reason": reason,
+            "questions_asked": questions_asked,
+            "outcome": outcome,
+        }, patient_id=patient_id)
+
+    async def _save_report(self, appointment_id: str, patient_id: Optional[str], report: str, status: str) -> bool:
+        """Store the report and notify live viewers. Returns False (after logging) if it couldn't be saved."""
+        try:
+            await self.repo.save_previsit_report(appointment_id, report, status)
+            print(f"[PreVisit] Report saved for appointment {appointment_id}")
+            self.audit.record("previsit_agent", "report_saved", {
+                "appointment_id": appointment_id,
+                "status": status,
+                "length": len(report),
+            }, patient_id=patient_id, target_agent="doctor_dashboard")
+            # Same shape as GET /api/previsit/report/{id}; live viewers get it without polling
+            self.broker.publish(appointment_id, {"pre_visit_report": report, "pre_visit_status": status})
+        except Exception as e:
+            print(f"[PreVisit] Error saving report: {e}")
+            return False
+        return True
+
+    def _report_prompt(self, context: Dict[str, Any], appointment_reason: str, transcript: str, interview: bool = True) -> str:
+        evaluation = """
+
+---
+
+## AI Interview Evaluation
+### Clinical Insights Extracted
+[What key pieces of information did the AI successfully uncover that will help the doctor?]
+
+### AI Self-Evaluation (Quality & Opportunities)
+[Provide a frank, 2-3 bullet point evaluation of the AI's interviewing skills. Note strengths (e.g., "effectively narrowed down the timeline") and missed opportunities (e.g., "failed to ask about radiating pain", "question was too broad", "did not ask for pain scale").]""" if interview else """
+
+### Suggested Focus for the Visit
+[1-3 bullet points the doctor may want to check, based on the visit reason, vitals and medications.]"""
+        intro = ("You are a medical documentation assistant evaluating a simulated interview between an AI assistant and a patient.\n"
+                 "Generate a concise, structured Pre-Visit Report for the doctor, and provide a self-evaluation of the AI's performance."
+                 if interview else
+                 "You are a medical documentation assistant preparing a patient's chart before a clinic visit.\n"
+                 "Generate a concise, structured Pre-Visit Report for the doctor from the health record and the patient's booking notes.")
+
+        return f"""{intro}
 
 APPOINTMENT REASON: {appointment_reason}
 
@@ -139,42 +224,7 @@ Generate a structured report using exactly this markdown structure:
 [List any relevant conditions or note 'None on file']
 
 ### Medications (from EHR and interview)
-[List medications in context]
-
----
-
-## AI Interview Evaluation
-### Clinical Insights Extracted
-[What key pieces of information did the AI successfully uncover that will help the doctor?]
-
-### AI Self-Evaluation (Quality & Opportunities)
-[Provide a frank, 2-3 bullet point evaluation of the AI's interviewing skills. Note strengths (e.g., "effectively narrowed down the timeline") and missed opportunities (e.g., "failed to ask about radiating pain", "question was too broad", "did not ask for pain scale").]"""
-
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=1000,
-                temperature=0.2,
-            )
-            report = response.choices[0].message.content.strip()
-        except Exception as e:
-            print(f"[PreVisit] Error generating report: {e}")
-            report = self._fallback_report(context, appointment_reason, transcript)
-
-        # Save report to the appointment
-        try:
-            # If it's a live update, we might set status to 'draft'. If final, 'completed'.
-            status = "completed" if is_final else "draft"
-            self.supabase.table("appointments").update({
-                "pre_visit_report": report,
-                "pre_visit_status": status,
-            }).eq("id", appointment_id).execute()
-            print(f"[PreVisit] Report saved for appointment {appointment_id}")
-        except Exception as e:
-            print(f"[PreVisit] Error saving report: {e}")
-
-        return report
+[List medications in context]{evaluation}"""
 
     def _fallback_report(
         self, context: Dict, reason: str, transcript: str
@@ -0,0 +1,196 @@
+"""
+Bulk pre-visit report preparation for a doctor's clinic days.
+Loads the doctor's appointments and every patient's context in a fixed number of
+batched queries, then generates reports with bounded concurrency, paced to the
+LLM's request budget and backing off on rate limits. Appointments whose report is
+already current are skipped. Jobs run in the background and expose progress.
+"""
+import time
+import uuid
+import asyncio
+from collections import OrderedDict
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Any, List, Optional
+
+from agents.previsit_agent import PreVisitAgent
+
+# Reports written from a patient interview are never replaced by chart-prep ones
+INTERVIEW_STATUSES = {"draft", "completed"}
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    msg = str(error)
+    return "rate_limit" in msg.lower() or "429" in msg
+
+
+def _parse_timestamp(value: Any) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        ts = datetime.fromisoformat(str(value).replace("Z", "+00:00").replace(" ", "T"))
+    except ValueError:
+        return None
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+class RequestPacer:
+    """Spaces LLM requests to a requests-per-minute budget; halves the rate on a 429
+    and creeps back up on success."""
+
+    def __init__(self, requests_per_minute: float, min_requests_per_minute: float = 2.0):
+        self.base_interval = 60.0 / requests_per_minute
+        self.max_interval = 60.0 / min_requests_per_minute
+        self.interval = self.base_interval
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def back_off(self):
+        self.interval = min(self.interval * 2, self.max_interval)
+        self._next = time.monotonic() + self.interval
+
+    def recover(self):
+        self.interval = max(self.base_interval, self.interval * 0.9)
+
+
+class BulkReportJob:
+    def __init__(self, doctor_id: str, date_from: str, date_to: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.doctor_id = doctor_id
+        self.date_from = date_from
+        self.date_to = date_to
+        self.status = "pending"
+        self.total = 0
+        self.skipped = 0
+        self.generated = 0
+        self.failed = 0
+        self.rate_limited = 0
+        self.errors: List[Dict[str, str]] = []
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def progress(self) -> Dict[str, Any]:
+        elapsed = ((self.finished_at or time.monotonic()) - self.started_at) if self.started_at else 0.0
+        pending = self.total - self.skipped - self.generated - self.failed
+        per_minute = self.generated / elapsed * 60 if elapsed else 0.0
+        return {
+            "job_id": self.id,
+            "doctor_id": self.doctor_id,
+            "date_from": self.date_from,
+            "date_to": self.date_to,
+            "status": self.status,
+            "total": self.total,
+            "skipped": self.skipped,
+            "generated": self.generated,
+            "failed": self.failed,
+            "pending": max(pending, 0),
+            "rate_limited": self.rate_limited,
+            "elapsed_seconds": round(elapsed, 1),
+            "reports_per_minute": round(per_minute, 1),
+            "eta_seconds": round(pending / per_minute * 60, 1) if per_minute and pending > 0 else None,
+            "errors": self.errors[-10:],
+        }
+
+
+class BulkReportRunner:
+    def __init__(
+        self,
+        agent: PreVisitAgent,
+        concurrency: int = 4,
+        requests_per_minute: float = 30,
+        max_retries: int = 3,
+        max_age_hours: float = 12,
+        max_jobs: int = 50,
+    ):
+        self.agent = agent
+        self.concurrency = concurrency
+        self.requests_per_minute = requests_per_minute
+        self.max_retries = max_retries
+        self.max_age = timedelta(hours=max_age_hours)
+        self.max_jobs = max_jobs
+        self.jobs: "OrderedDict[str, BulkReportJob]" = OrderedDict()
+
+    def start(self, doctor_id: str, date_from: str, date_to: Optional[str] = None, force: bool = False) -> BulkReportJob:
+        """Start a background job, or return the one already running for the same doctor and dates."""
+        date_to = date_to or date_from
+        for job in self.jobs.values():
+            if job.status in ("pending", "running") and (job.doctor_id, job.date_from, job.date_to) == (doctor_id, date_from, date_to):
+                return job
+        job = BulkReportJob(doctor_id, date_from, date_to)
+        self.jobs[job.id] = job
+        while len(self.jobs) > self.max_jobs:
+            self.jobs.popitem(last=False)
+        job.task = asyncio.create_task(self.run(job, force=force))
+        return job
+
+    def get(self, job_id: str) -> Optional[BulkReportJob]:
+        return self.jobs.get(job_id)
+
+    def is_current(self, appointment: Dict[str, Any], now: Optional[datetime] = None) -> bool:
+        if not appointment.get("pre_visit_report"):
+            return False
+        if appointment.get("pre_visit_status") in INTERVIEW_STATUSES:
+            return True
+        updated = _parse_timestamp(appointment.get("updated_at"))
+        return updated is not None and (now or datetime.now(timezone.utc)) - updated < self.max_age
+
+    async def run(self, job: BulkReportJob, force: bool = False) -> BulkReportJob:
+        job.status = "running"
+        job.started_at = time.monotonic()
+        repo = self.agent.repo
+        try:
+            appointments = await repo.appointments_for_doctor(job.doctor_id, job.date_from, job.date_to)
+            job.total = len(appointments)
+            # force only skips the freshness check; interview reports are never replaced
+            todo = [a for a in appointments if a.get("pre_visit_status") not in INTERVIEW_STATUSES
+                    and (force or not self.is_current(a))]
+            job.skipped = job.total - len(todo)
+            print(f"[PreVisit] Bulk job {job.id}: {job.total} appointments, {job.skipped} already current")
+
+            # All patient contexts in one batched round trip, however many appointments there are
+            contexts = await repo.patient_contexts([a["patient_id"] for a in todo], vitals_limit=3, include_reports=True)
+
+            pacer = RequestPacer(self.requests_per_minute)
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def prepare(appointment: Dict[str, Any]):
+                async with semaphore:
+                    await self._prepare_one(job, pacer, appointment, contexts[appointment["patient_id"]])
+
+            await asyncio.gather(*(prepare(a) for a in todo))
+            job.status = "done"
+        except Exception as e:
+            print(f"[PreVisit] Bulk job {job.id} failed: {e}")
+            job.errors.append({"appointment_id": "", "error": str(e)[:200]})
+            job.status = "failed"
+        finally:
+            job.finished_at = time.monotonic()
+        print(f"[PreVisit] Bulk job {job.id} {job.status}: {job.progress()['generated']} generated "
+              f"({job.progress()['reports_per_minute']}/min), {job.failed} failed")
+        return job
+
+    async def _prepare_one(self, job: BulkReportJob, pacer: RequestPacer, appointment: Dict[str, Any], context: Dict[str, Any]):
+        shaped = PreVisitAgent.shape_context(context)
+        for attempt in range(self.max_retries + 1):
+            await pacer.wait()
+            try:
+                await self.agent.prepare_report(appointment, shaped)
+                pacer.recover()
+                job.generated += 1
+                return
+            except Exception as e:
+                if _is_rate_limited(e) and attempt < self.max_retries:
+                    job.rate_limited += 1
+                    pacer.back_off()
+                    continue
+                job.failed += 1
+                job.errors.append({"appointment_id": appointment["id"], "error": str(e)[:200]})
+                return
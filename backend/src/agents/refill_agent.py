@@ -1,75 +1,76 @@
 import asyncio
 import json
-from datetime import datetime, timedelta
-from typing import Dict, Any, List
-from supabase import Client
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from data import Repository
+from audit import AuditLog, get_audit_log
 
 class RefillMonitorAgent:
-    def __init__(self, supabase: Client):
-        self.supabase = supabase
+    def __init__(self, repo: Repository, audit: Optional[AuditLog] = None):
+        self.repo = repo
+        self.audit = audit or get_audit_log()
         self.is_running = False
 
-    async def generate_health_report(self, patient_id: str) -> Dict[str, Any]:
-        """Compile a health status report including recent vitals and medications."""
-        # Get patient details
-        user_res = self.supabase.table("users").select("name, dob").eq("id", patient_id).execute()
-        user = user_res.data[0] if user_res.data else {}
-
-        # Get recent vitals
-        vitals_res = self.supabase.table("vitals").select("*").eq("patient_id", patient_id).order("logged_at", desc=True).limit(10).execute()
-        vitals = vitals_res.data or []
-
-        # Get current medications
-        meds_res = self.supabase.table("medications").select("name, dosage, frequency, current_stock").eq("patient_id", patient_id).execute()
-        medications = meds_res.data or []
-
-        report = {
-            "patient_name": user.get("name", "Unknown"),
+    @staticmethod
+    def _health_report(context: Dict[str, Any]) -> Dict[str, Any]:
+        """Shape a patient context into the health status report attached to a refill request."""
+        return {
+            "patient_name": context["user"].get("name", "Unknown"),
             "report_date": datetime.now().isoformat(),
             "summary": "This is an automated health status report generated for medication refill approval.",
-            "recent_vitals": vitals,
-            "current_medications": medications
+            "recent_vitals": context["vitals"],
+            "current_medications": context["medications"]
         }
-        return report
 
-    async def check_stocks_and_trigger_refills(self):
+    async def generate_health_report(self, patient_id: str) -> Dict[str, Any]:
+        """Compile a health status report including recent vitals and medications."""
+        context = await self.repo.patient_context(patient_id, vitals_limit=10)
+        return self._health_report(context)
+
+    async def check_stocks_and_trigger_refills(self) -> List[Dict[str, Any]]:
         """Check all medications for low stock and initiate refill requests."""
         print("[RefillAgent] Checking medication stocks...")
-        
-        # Get all medications
-        # Note: In a real app we'd filter by current_stock < stock_threshold in the query
-        # But let's fetch and filter to be safe with existing data
-        res = self.supabase.table("medications").select("*").execute()
-        meds = res.data or []
 
-        for med in meds:
-            stock_count = med.get("current_stock")
-            threshold = med.get("stock_threshold")
-            
-            # Skip if threshold is not set or stock is sufficient
-            if stock_count is None or threshold is None:
-                continue
-                
-            if stock_count <= threshold:
-                # Check if a pending refill request already exists for this medication
-                # Statuses that count as "already in progress": pending, approved_by_doctor, approved_by_patient
-                pending_res = self.supabase.table("refill_requests").select("id").eq("medication_id", med["id"]).in_("status", ["pending", "approved_by_patient", "approved_by_doctor"]).execute()
-                
-                if not pending_res.data:
-                    print(f"[RefillAgent] Low stock detected for {med['name']} (Stock: {stock_count}, Threshold: {threshold}). Initiating refill...")
-                    
-                    # Generate health report
-                    health_report = await self.generate_health_report(med["patient_id"])
-                    
-                    # Create refill request
-                    self.supabase.table("refill_requests").insert({
-                        "patient_id": med["patient_id"],
-                        "medication_id": med["id"],
-                        "status": "pending",
-                        "health_report": health_report
-                    }).execute()
-                else:
-                    print(f"[RefillAgent] Refill already in progress for {med['name']}.")
+        # Low-stock filter, in-progress check and patient context are each one batched query,
+        # regardless of how many medications are low.
+        low_stock = await self.repo.low_stock_medications()
+        if not low_stock:
+            return []
+
+        in_progress = await self.repo.active_refill_medication_ids([m["id"] for m in low_stock])
+        for med in low_stock:
+            if med["id"] in in_progress:
+                print(f"[RefillAgent] Refill already in progress for {med['name']}.")
+
+        to_refill = [m for m in low_stock if m["id"] not in in_progress]
+        if not to_refill:
+            return []
+
+        contexts = await self.repo.patient_contexts([m["patient_id"] for m in to_refill], vitals_limit=10)
+
+        rows = []
+        for med in to_refill:
+            print(f"[RefillAgent] Low stock detected for {med['name']} (Stock: {med['current_stock']}, Threshold: {med['stock_threshold']}). Initiating refill...")
+            rows.append({
+                "patient_id": med["patient_id"],
+                "medication_id": med["id"],
+                "status": "pending",
+                "health_report": self._health_report(contexts[med["patient_id"]]),
+            })
+
+        created = await self.repo.bulk_insert_refills(rows)
+        meds = {m["id"]: m for m in to_refill}
+        for refill in created:
+            med = meds.get(refill.get("medication_id"), {})
+            self.audit.record("refill_agent", "refill_requested", {
+                "refill_id": refill.get("id"),
+                "medication_id": refill.get("medication_id"),
+                "medication": med.get("name"),
+                "current_stock": med.get("current_stock"),
+                "stock_threshold": med.get("stock_threshold"),
+            }, patient_id=refill.get("patient_id"), target_agent="doctor")
+        return created
 
     async def run_forever(self, interval_seconds: int = 3600):
         """Background loop to periodically check stocks."""
@@ -79,7 +80,7 @@ class RefillMonitorAgent:
                 await self.check_stocks_and_trigger_refills()
             except Exception as e:
                 print(f"[RefillAgent] Error in background loop: {e}")
-            
+
             await asyncio.sleep(interval_seconds)
 
     def stop(self):
@@ -1,18 +1,81 @@
 import os
-import httpx
-from typing import Dict, Any, Optional
-from supabase import Client
-
-
-async def get_health_summary(supabase: Client, patient_id: str) -> Dict[str, Any]:
-    user_res = supabase.table("users").select("name, email, dob, guardian_phone").eq("id", patient_id).execute()
-    user = user_res.data[0] if user_res.data else {}
-
-    vitals_res = supabase.table("vitals").select("*").eq("patient_id", patient_id).order("logged_at", desc=True).limit(5).execute()
-    vitals = vitals_res.data or []
-
-    meds_res = supabase.table("medications").select("name, dosage, frequency").eq("patient_id", patient_id).execute()
-    medications = meds_res.data or []
+import time
+import asyncio
+from typing import Dict, Any, List, Optional, Tuple, TYPE_CHECKING
+
+from data import Repository
+from agents.alerts import get_alert_outbox
+from metrics import span
+from singleflight import SingleFlight, location_key
+from availability import find_earliest_slots
+from deadline import budget
+from hedging import LatencyTracker, hedged
+from geo_index import get_doctor_index, haversine_km
+from specialty import rank_doctors
+
+if TYPE_CHECKING:
+    import httpx
+
+# Transport for outbound Nominatim/Overpass calls. None means the real network;
+# benchmarks and offline runs install a local stand-in via set_http_transport().
+_http_transport: Optional["httpx.AsyncBaseTransport"] = None
+_http: Optional["httpx.AsyncClient"] = None
+
+
+def set_http_transport(transport: Optional["httpx.AsyncBaseTransport"]):
+    global _http_transport, _http
+    _http_transport = transport
+    _http = None
+
+
+def _http_client() -> "httpx.AsyncClient":
+    """One pooled client for all outbound calls, created on first use (keeps connections warm)."""
+    global _http
+    if _http is None:
+        import httpx
+        _http = httpx.AsyncClient(transport=_http_transport)
+    return _http
+
+
+# How far ahead book_appointment looks when the requested day is full
+BOOKING_SEARCH_DAYS = 30
+
+# book_appointment with doctor_name "best match": how many of the best-fitting doctors
+# to try, in order, when the first has no open slot
+BEST_MATCH = "best match"
+BEST_MATCH_CANDIDATES = 3
+
+# Doctor search: the closest DOCTOR_SEARCH_LIMIT doctors whose hospital is within the radius
+DOCTOR_SEARCH_LIMIT = int(os.environ.get("DOCTOR_SEARCH_LIMIT", "20"))
+DOCTOR_SEARCH_RADIUS_KM = float(os.environ.get("DOCTOR_SEARCH_RADIUS_KM", "25"))
+
+# Identical concurrent lookups (same city, same ~110 m area) share one upstream call.
+_geocode_flights = SingleFlight("geocode")
+_overpass_flights = SingleFlight("overpass")
+
+# Overpass mirrors in preference order. A search still running past the given percentile
+# of recent latencies is also sent to the next mirror (OVERPASS_HEDGE_SECONDS until
+# enough samples exist); whichever answers first is used.
+OVERPASS_URLS = [u.strip() for u in os.environ.get(
+    "OVERPASS_URLS", "https://overpass-api.de/api/interpreter,https://overpass.kumi.systems/api/interpreter",
+).split(",") if u.strip()]
+OVERPASS_HEDGE_PERCENTILE = float(os.environ.get("OVERPASS_HEDGE_PERCENTILE", "90"))
+OVERPASS_HEDGE_SECONDS = float(os.environ.get("OVERPASS_HEDGE_SECONDS", "3"))
+_overpass_latency = LatencyTracker()
+
+
+async def close_http_client():
+    """Called from the app lifespan on shutdown."""
+    global _http
+    if _http is not None:
+        await _http.aclose()
+        _http = None
+
+
+async def get_health_summary(repo: Repository, patient_id: str) -> Dict[str, Any]:
+    context = await repo.patient_context(patient_id, vitals_limit=5)
+    user = context["user"]
+    vitals = context["vitals"]
 
     return {
         "patient_name": user.get("name", "Unknown"),
@@ -20,69 +83,91 @@ async def get_health_summary(supabase: Client, patient_id: str) -> Dict[str, Any
         "guardian_phone": user.get("guardian_phone"),
         "latest_vitals": vitals[0] if vitals else None,
         "vitals_history": vitals,
-        "medications": medications,
+        "medications": context["medications"],
     }
 
 
-async def get_available_doctors(supabase: Client, user_lat: Optional[float] = None, user_lng: Optional[float] = None) -> Dict[str, Any]:
-    """Fetch available doctors at hospitals near the patient."""
-    
-    # 1. First, find hospitals near the user
-    nearby_hospital_names = []
+async def _candidate_doctors(repo: Repository, user_lat: Optional[float], user_lng: Optional[float]) -> Tuple[List[Dict[str, Any]], bool]:
+    """Doctors nearest the patient (closest first, with distance_km), or everyone, unranked,
+    when none are near or the doctor index couldn't be built. Returns (doctors, is_near)."""
     if user_lat is not None and user_lng is not None:
-        hospital_res = await find_nearest_hospital(latitude=user_lat, longitude=user_lng)
-        nearby_hospital_names = [h["name"].lower() for h in hospital_res.get("hospitals", [])]
-        print(f"[AgentCare] Nearby hospitals found: {nearby_hospital_names}")
-
-    # 2. Fetch doctors
-    res = supabase.table("users").select("id, name, speciality, email, hospital_name").eq("role", "doctor").execute()
-    doctors = res.data or []
-    
-    filtered_doctors = []
-    for d in doctors:
-        doc_hospital = (d.get("hospital_name") or "").lower()
-        
-        # If no proximity data available, include all (fallback)
-        if not nearby_hospital_names:
-            filtered_doctors.append({
-                "name": d["name"],
-                "speciality": d.get("speciality") or "General Physician",
-                "email": d.get("email"),
-                "hospital": d.get("hospital_name") or "Clinic",
-                "is_near": False
-            })
-            continue
-
-        # Match doctor hospital against nearby hospitals
-        is_near = any(h_name in doc_hospital or doc_hospital in h_name for h_name in nearby_hospital_names)
-        
-        if is_near:
-            filtered_doctors.append({
-                "name": d["name"],
-                "speciality": d.get("speciality") or "General Physician",
-                "email": d.get("email"),
-                "hospital": d.get("hospital_name") or "Clinic",
-                "is_near": True
-            })
-
-    # If we have nearby results, only show those. Otherwise show all.
-    near_matches = [d for d in filtered_doctors if d.get("is_near")]
-    results = near_matches if near_matches else filtered_doctors
-
-    msg = "Showing only doctors at nearby hospitals." if near_matches else "No doctors found at nearby hospitals. Showing ALL available doctors from the database. Do NOT invent a doctor."
+        index = get_doctor_index()
+        if index.repo is None:
+            await index.try_rebuild(repo)  # outside the app lifespan (scripts, benchmarks); built once
+        if index.ready:
+            nearest = index.nearest(user_lat, user_lng, k=DOCTOR_SEARCH_LIMIT, max_km=DOCTOR_SEARCH_RADIUS_KM)
+            if nearest:
+                return nearest, True
+    return await repo.list_doctors(), False
+
+
+async def get_available_doctors(repo: Repository, user_lat: Optional[float] = None, user_lng: Optional[float] = None) -> Dict[str, Any]:
+    """Fetch available doctors nearest the patient, ranked by distance to their hospital."""
+    doctors, near = await _candidate_doctors(repo, user_lat, user_lng)
+
+    results = [{
+        "name": d["name"],
+        "speciality": d.get("speciality") or "General Physician",
+        "email": d.get("email"),
+        "hospital": d.get("hospital_name") or "Clinic",
+        "distance_km": d.get("distance_km"),
+        "is_near": near,
+    } for d in doctors]
+
+    msg = "Showing the doctors nearest to you, closest first." if near else "No doctors found at nearby hospitals. Showing ALL available doctors from the database. Do NOT invent a doctor."
 
     return {
         "message": msg,
         "doctors": results,
         "total": len(results),
-        "proximity_active": bool(near_matches)
+        "proximity_active": near
     }
 
 
-async def get_appointments(supabase: Client, patient_id: str) -> Dict[str, Any]:
-    res = supabase.table("appointments").select(
-        "*, doctor:doctor_id (name, email)"
-    ).eq("patient_id", patient_id).order("date", desc=False).execute()
+async def find_available_slots(
+    repo: Repository,
+    specialty: Optional[str] = None,
+    doctor_name: Optional[str] = None,
+    date_from: Optional[str] = None,
+    days: int = 14,
+    limit: int = 5,
+    user_lat: Optional[float] = None,
+    user_lng: Optional[float] = None,
+) -> Dict[str, Any]:
+    """Earliest open appointment slots across suitable nearby doctors (or one named doctor)."""
+    if doctor_name:
+        doctor = await repo.find_doctor(doctor_name)
+        doctors, near = ([doctor] if doctor else []), False
+    else:
+        doctors, near = await _candidate_doctors(repo, user_lat, user_lng)
+
+    msg = "Earliest open slots at nearby hospitals." if near else "Earliest open slots across all doctors."
+    if specialty and not doctor_name:
+        wanted = specialty.lower()
+        matching = [d for d in doctors if wanted in (d.get("speciality") or "General Physician").lower()]
+        if matching:
+            doctors = matching
+        else:
+            msg += f" No {specialty} found, so every specialty is shown."
+
+    # Two per doctor so the patient sees a choice of doctors, not one doctor's whole morning
+    try:
+        slots = await find_earliest_slots(repo, doctors, date_from=date_from, days=days, limit=limit, per_doctor=2)
+    except ValueError:
+        return {"error": f"Invalid date '{date_from}'. Use YYYY-MM-DD."}
+    if not slots:
+        msg = f"No open slots in the next {days} days."
+    return {"message": msg, "slots": slots, "total": len(slots), "proximity_active": near}
+
+
+def is_best_match(doctor_name: Optional[str]) -> bool:
+    """No name, or the model asking the server to choose."""
+    name = (doctor_name or "").strip().lower().replace("_", " ")
+    return not name or name in (BEST_MATCH, "any", "any doctor", "best")
+
+
+async def get_appointments(repo: Repository, patient_id: str) -> Dict[str, Any]:
+    rows = await repo.appointments_for_patient(patient_id)
 
     appointments = [{
         "id": a["id"],
@@ -93,13 +178,13 @@ async def get_appointments(supabase: Client, patient_id: str) -> Dict[str, Any]:
         "status": a["status"],
         "reason": a.get("reason"),
         "patient_notes": a.get("patient_notes"),
-    } for a in (res.data or [])]
+    } for a in rows]
 
     return {"appointments": appointments, "total": len(appointments)}
 
 
 async def book_appointment(
-    supabase: Client,
+    repo: Repository,
     patient_id: str,
     doctor_name: Optional[str] = None,
     specialty: Optional[str] = None,
@@ -107,37 +192,46 @@ async def book_appointment(
     time: Optional[str] = None,
     reason: Optional[str] = None,
     patient_notes: Optional[str] = None,
+    user_lat: Optional[float] = None,
+    user_lng: Optional[float] = None,
 ) -> Dict[str, Any]:
-    """Book appointment with a doctor chosen by name from get_available_doctors."""
-    doc_res = None
-
-    # Find doctor by name
-    if doctor_name:
-        doc_res = supabase.table("users").select("id, name, speciality, hospital_name").eq("role", "doctor").ilike("name", f"%{doctor_name}%").limit(1).execute()
-
-    # Last resort: any doctor
-    if not doc_res or not doc_res.data:
-        doc_res = supabase.table("users").select("id, name, speciality, hospital_name").eq("role", "doctor").limit(1).execute()
-
-    if not doc_res or not doc_res.data:
+    """Book appointment with a doctor chosen by name, or with doctor_name "best match" (or
+    none) the nearest doctor whose speciality fits the patient's notes."""
+    matched_specialty = None
+    if is_best_match(doctor_name):
+        candidates, _ = await _candidate_doctors(repo, user_lat, user_lng)
+        ranked = rank_doctors(" ".join(filter(None, [reason, patient_notes])), candidates, preferred=specialty)
+        doctors = [d for _, _, d in ranked[:BEST_MATCH_CANDIDATES]]
+        if ranked:
+            matched_specialty = ranked[0][1]
+            print(f"[AgentCare] Best match for {patient_id}: {ranked[0][2]['name']} ({matched_specialty}, score {ranked[0][0]})")
+    else:
+        doctor = await repo.find_doctor(doctor_name)  # last resort: any doctor
+        doctors = [doctor] if doctor else []
+    if not doctors:
         return {"success": False, "error": "No doctors found in the system."}
-
-    doctor = doc_res.data[0]
+    doctor = doctors[0]
 
     # Default date: tomorrow
     if not date:
         from datetime import datetime, timedelta
         date = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
 
-    # Auto-pick first available slot
+    # Auto-pick the first open slot on or after that date, moving down the best matches
+    # when the top one is full
     if not time:
-        slots_res = supabase.table("appointments").select("time").eq("doctor_id", doctor["id"]).eq("date", date).in_("status", ["pending", "accepted"]).execute()
-        booked = [s["time"] for s in (slots_res.data or [])]
-        all_slots = [f"{h:02d}:{m:02d}" for h in range(9, 17) for m in [0, 30]]
-        available = [s for s in all_slots if s not in booked]
-        time = available[0] if available else "10:00"
+        for doctor in doctors:
+            try:
+                slots = await find_earliest_slots(repo, [doctor], date_from=date, days=BOOKING_SEARCH_DAYS, limit=1)
+            except ValueError:
+                return {"success": False, "error": f"Invalid date '{date}'. Use YYYY-MM-DD."}
+            if slots:
+                break
+        else:
+            return {"success": False, "error": f"{doctor['name']} has no open slots in the next {BOOKING_SEARCH_DAYS} days."}
+        date, time = slots[0]["date"], slots[0]["time"]
 
-    insert_res = supabase.table("appointments").insert({
+    appointment = await repo.insert_appointment({
         "patient_id": patient_id,
         "doctor_id": doctor["id"],
         "date": date,
@@ -146,15 +240,17 @@ async def book_appointment(
         "reason": reason,
         "patient_notes": patient_notes,
         "status": "pending",
-    }).execute()
+    })
 
-    if insert_res.data:
+    if appointment:
         return {
             "success": True,
-            "appointment_id": insert_res.data[0]["id"],
+            "appointment_id": appointment["id"],
             "doctor_name": doctor["name"],
             "doctor_speciality": doctor.get("speciality") or "General Physician",
             "hospital_name": doctor.get("hospital_name") or "Clinic",
+            "distance_km": doctor.get("distance_km"),
+            "matched_specialty": matched_specialty,
             "date": date,
             "time": time,
             "reason": reason,
@@ -163,17 +259,62 @@ async def book_appointment(
         }
     return {"success": False, "error": "Failed to insert appointment."}
 
+async def geocode_place(city: str) -> Optional[Tuple[float, float]]:
+    """Nominatim lookup of a city or place name: (lat, lng), or None when nothing matches."""
+    with span("http", "nominatim"):
+        geo_res = await _http_client().get(
+            "https://nominatim.openstreetmap.org/search",
+            params={"q": city, "format": "json", "limit": 1},
+            headers={"User-Agent": "ElderCare-Hackathon/1.0"},
+            timeout=budget(10.0),
+        )
+    geo_data = geo_res.json()
+    if not geo_data:
+        return None
+    lat, lon = float(geo_data[0]["lat"]), float(geo_data[0]["lon"])
+    print(f"[AgentCare] Resolved {city} to {lat}/{lon}")
+    return lat, lon
+
+
+async def _search_hospitals(lat: float, lon: float) -> Dict[str, Any]:
+    """Raw Overpass elements for hospitals within 5km, or {"error": ...}."""
+    overpass_query = f"""
+    [out:json][timeout:15];
+    (
+      node["amenity"="hospital"](around:5000,{lat},{lon});
+      way["amenity"="hospital"](around:5000,{lat},{lon});
+    );
+    out center;
+    """
+    hedge_after = _overpass_latency.percentile(OVERPASS_HEDGE_PERCENTILE) or OVERPASS_HEDGE_SECONDS
+    attempts = [lambda url=url: _overpass_post(url, overpass_query) for url in OVERPASS_URLS]
+    try:
+        data, _ = await hedged("overpass", attempts, hedge_after)
+        return data
+    except asyncio.TimeoutError:
+        raise  # out of time; the caller decides what a timeout means
+    except Exception as e:
+        return {"error": str(e) or "Hospital search failed."}
 
-import math
 
-def calculate_haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """Calculate the great-circle distance between two points in kilometers."""
-    R = 6371.0  # Earth's radius in km
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
-    a = math.sin(dlat / 2)**2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon / 2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
+async def _overpass_post(url: str, query: str) -> Dict[str, Any]:
+    """One Overpass call against one mirror. Raises on anything but a usable answer."""
+    started = time.perf_counter()
+    with span("http", "overpass"):
+        res = await _http_client().post(url, data={"data": query}, timeout=budget(20.0))
+    if res.status_code != 200:
+        print(f"[AgentCare] Overpass API Error ({url}): {res.status_code} - {res.text[:200]}")
+        raise RuntimeError(f"Hospital search API error: {res.status_code}")
+
+    try:
+        data = res.json()
+    except Exception as e:
+        print(f"[AgentCare] Overpass API JSON Error ({url}): {e}")
+        print(f"Response text: {res.text[:500]}")
+        raise RuntimeError("Failed to parse hospital search results.")
+    _overpass_latency.observe(time.perf_counter() - started)
+    return data
+
 
 async def find_nearest_hospital(
     patient_city: Optional[str] = None,
@@ -188,46 +329,23 @@ async def find_nearest_hospital(
     if search_lat is None or search_lon is None:
         city = patient_city or "Kochi"
         print(f"[AgentCare] find_nearest_hospital: Missing coordinates. Geocoding fallback city: {city}")
-        async with httpx.AsyncClient() as client:
-            geo_res = await client.get(
-                "https://nominatim.openstreetmap.org/search",
-                params={"q": city, "format": "json", "limit": 1},
-                headers={"User-Agent": "ElderCare-Hackathon/1.0"},
-                timeout=10.0,
-            )
-            geo_data = geo_res.json()
-            if geo_data:
-                search_lat = float(geo_data[0]["lat"])
-                search_lon = float(geo_data[0]["lon"])
-                print(f"[AgentCare] Resolved {city} to {search_lat}/{search_lon}")
-            else:
-                return {"hospitals": [], "error": f"Could not geocode city: {city}"}
-
-    # Search hospitals via Overpass API (OpenStreetMap) within 5km
-    overpass_query = f"""
-    [out:json][timeout:15];
-    (
-      node["amenity"="hospital"](around:5000,{search_lat},{search_lon});
-      way["amenity"="hospital"](around:5000,{search_lat},{search_lon});
-    );
-    out center;
-    """
-    async with httpx.AsyncClient() as client:
-        res = await client.post(
-            "https://overpass-api.de/api/interpreter",
-            data={"data": overpass_query},
-            timeout=20.0,
-        )
-        if res.status_code != 200:
-            print(f"[AgentCare] Overpass API Error: {res.status_code} - {res.text}")
-            return {"hospitals": [], "error": f"Hospital search API error: {res.status_code}"}
-        
         try:
-            data = res.json()
-        except Exception as e:
-            print(f"[AgentCare] Overpass API JSON Error: {e}")
-            print(f"Response text: {res.text[:500]}")
-            return {"hospitals": [], "error": "Failed to parse hospital search results."}
+            coords = await _geocode_flights.do(city.strip().lower(), lambda: geocode_place(city), timeout=10.0)
+        except asyncio.TimeoutError:
+            return {"hospitals": [], "error": f"Timed out locating {city}"}
+        if coords is None:
+            return {"hospitals": [], "error": f"Could not geocode city: {city}"}
+        search_lat, search_lon = coords
+
+    # Search around the rounded location so nearby callers share one Overpass query;
+    # distances below are still measured from the caller's exact position.
+    key = location_key(search_lat, search_lon)
+    try:
+        data = await _overpass_flights.do(key, lambda: _search_hospitals(*key), timeout=20.0)
+    except asyncio.TimeoutError:
+        return {"hospitals": [], "error": "Hospital search timed out"}
+    if data.get("error"):
+        return {"hospitals": [], "error": data["error"]}
 
     hospitals = []
     for el in data.get("elements", []):
@@ -237,7 +355,7 @@ async def find_nearest_hospital(
         
         distance = None
         if search_lat is not None and search_lon is not None and lat and lon:
-            distance = calculate_haversine_distance(search_lat, search_lon, lat, lon)
+            distance = haversine_km(search_lat, search_lon, lat, lon)
 
         hospitals.append({
             "name": tags.get("name", "Unnamed Hospital"),
@@ -260,11 +378,10 @@ async def find_nearest_hospital(
     }
 
 
-async def send_emergency_alert(supabase: Client, patient_id: str, message: Optional[str] = None) -> Dict[str, Any]:
-    user_res = supabase.table("users").select("name, guardian_phone").eq("id", patient_id).execute()
-    user = user_res.data[0] if user_res.data else {}
+async def send_emergency_alert(repo: Repository, patient_id: str, message: Optional[str] = None) -> Dict[str, Any]:
+    user = await repo.get_user(patient_id) or {}
 
-    dest_phone = user.get("guardian_phone", "").strip()
+    dest_phone = (user.get("guardian_phone") or "").strip()
     if not dest_phone:
         return {"success": False, "error": "No guardian phone number on file."}
     
@@ -277,31 +394,26 @@ async def send_emergency_alert(supabase: Client, patient_id: str, message: Optio
 
     alert_message = message or f"Emergency alert for {user.get('name', 'your loved one')}. Please check on them immediately."
 
+    # Only enqueue here; delivery, retries and dedup happen in the outbox workers.
+    outbox = get_alert_outbox()
     try:
-        from twilio.rest import Client as TwilioClient
-        sid = os.environ.get("TWILIO_ACCOUNT_SID")
-        token = os.environ.get("TWILIO_AUTH_TOKEN")
-        from_phone = os.environ.get("TWILIO_PHONE_NUMBER")
-        
-        if sid and token and from_phone:
-            tw_client = TwilioClient(sid, token)
-            sms = tw_client.messages.create(
-                body=f"ELDERCARE ALERT: {alert_message}",
-                from_=from_phone,
-                to=dest_phone,
-            )
-            print(f"[AgentCare] SMS sent successfully via Twilio! SID: {sms.sid}")
-            return {"success": True, "sent_to": dest_phone, "twilio_sid": sms.sid}
-        else:
-            print("[AgentCare] Twilio credentials missing in .env. Falling back to simulation.")
+        queued = await outbox.enqueue(patient_id, dest_phone, f"ELDERCARE ALERT: {alert_message}")
     except Exception as e:
-        error_detail = str(e)
-        print(f"[AgentCare] Twilio Error: {error_detail}")
-        return {"success": False, "error": f"Twilio failed: {error_detail}", "sent_to": dest_phone}
+        reason = str(e) or type(e).__name__
+        print(f"[AgentCare] Failed to enqueue emergency alert: {reason}")
+        return {"success": False, "error": f"Could not queue alert: {reason}", "sent_to": dest_phone}
 
-    return {"success": True, "sent_to": dest_phone, "simulated": True, "message": alert_message}
+    return {
+        "success": True,
+        "queued": True,
+        "alert_id": queued["alert_id"],
+        "deduplicated": queued["deduplicated"],
+        "sent_to": dest_phone,
+        "simulated": outbox.provider.name == "fake",
+        "message": alert_message,
+    }
 
 
-async def get_medications(supabase: Client, patient_id: str) -> Dict[str, Any]:
-    res = supabase.table("medications").select("*").eq("patient_id", patient_id).execute()
-    return {"medications": res.data or [], "count": len(res.data or [])}
+async def get_medications(repo: Repository, patient_id: str) -> Dict[str, Any]:
+    medications = await repo.medications(patient_id)
+    return {"medications": medications, "count": len(medications)}
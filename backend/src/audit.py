@@ -0,0 +1,246 @@
+"""
+Batched audit log for agent events (the mcp_events table).
+Agents record tool calls, pre-visit turns and refill actions into an in-memory ring
+buffer without awaiting anything; a background flusher writes them to the database in
+bulk when the buffer reaches a batch or a time threshold passes. Under backpressure
+(buffer full, database down) events are spilled to a local JSONL file and replayed on
+the next start, or dropped and counted when no spill file is configured. A batch the
+database rejects is retried row by row, so one bad event can't take the rest with it.
+"""
+import os
+import json
+import asyncio
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Deque
+
+from metrics import AUDIT_EVENTS
+
+# Consecutive single-row failures, with no success, that mean the database is down rather than a bad row
+OUTAGE_FAILURES = 3
+
+
+class AuditLog:
+    def __init__(
+        self,
+        max_buffer: int = 5000,
+        batch_size: int = 200,
+        flush_interval: float = 2.0,
+        spill_path: Optional[str] = None,
+    ):
+        self.max_buffer = max_buffer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_path = spill_path
+        self.repo = None
+        self._buffer: Deque[Dict[str, Any]] = deque()
+        self._overflow: List[Dict[str, Any]] = []  # evicted from a full buffer, awaiting spill
+        self._replay: List[Dict[str, Any]] = []  # read back from the spill file on start
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._flush_lock = asyncio.Lock()
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None
+
+    def record(
+        self,
+        source_agent: str,
+        event_type: str,
+        payload: Dict[str, Any],
+        patient_id: Optional[str] = None,
+        target_agent: Optional[str] = None,
+    ):
+        """Buffer one event. Never blocks and never raises; the write happens in the next flush."""
+        if patient_id is not None and self.repo is not None and not self.repo.is_valid_id(patient_id):
+            # Not an id the users foreign key can hold; keep it in the payload instead of failing the batch
+            payload = {**payload, "patient_id": patient_id}
+            patient_id = None
+        event = {
+            "source_agent": source_agent,
+            "target_agent": target_agent,
+            "event_type": event_type,
+            "patient_id": patient_id,
+            "payload": payload,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        }
+        if len(self._buffer) >= self.max_buffer:
+            evicted = self._buffer.popleft()
+            if self.spill_path and len(self._overflow) < self.max_buffer:
+                self._overflow.append(evicted)
+            else:
+                AUDIT_EVENTS.inc(result="dropped")
+        self._buffer.append(event)
+        AUDIT_EVENTS.inc(result="recorded")
+        if self._wake is not None and (len(self._buffer) >= self.batch_size or self._overflow):
+            self._wake.set()
+
+    async def start(self, repo):
+        """Bind the repository, pick up events spilled by a previous run and start flushing."""
+        if self._task:
+            return
+        self.repo = repo
+        if self.spill_path:
+            self._replay = await asyncio.to_thread(self._read_spill)
+            if self._replay:
+                print(f"[Audit] Replaying {len(self._replay)} spilled events from {self.spill_path}")
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 5.0):
+        """Stop the flusher and write out everything still buffered (spilling what doesn't make it)."""
+        if not self._task:
+            return
+        # Let a flush in progress finish and the loop exit on its own; a flush that hangs is
+        # cancelled, and puts its unwritten events back in the buffer for the spill below.
+        self._stopping = True
+        self._wake.set()
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            print("[Audit] Flusher did not stop in time.")
+        self._task = None
+        self._wake = None
+        self._stopping = False
+        try:
+            await asyncio.wait_for(self.flush(), timeout)
+        except asyncio.TimeoutError:
+            print("[Audit] Final flush timed out.")
+        leftover = self._replay + self._overflow + list(self._buffer)
+        self._replay, self._overflow = [], []
+        self._buffer.clear()
+        if leftover:
+            await asyncio.to_thread(self._spill, leftover)
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            if self._stopping:
+                return
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"[Audit] Flush error: {e}")
+
+    async def flush(self):
+        """Write everything buffered so far, one bulk insert per batch."""
+        if self.repo is None:
+            return
+        async with self._flush_lock:
+            if self._overflow:
+                overflow, self._overflow = self._overflow, []
+                await asyncio.to_thread(self._spill, overflow)
+            if self._replay:
+                replay, self._replay = self._replay, []
+                # A replayed batch that fails again is dropped rather than spilled forever
+                await self._write(replay, spill_on_error=False)
+            while self._buffer:
+                batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+                await self._write(batch, spill_on_error=True)
+
+    async def _write(self, events: List[Dict[str, Any]], spill_on_error: bool):
+        for start in range(0, len(events), self.batch_size):
+            batch = events[start:start + self.batch_size]
+            try:
+                await self.repo.insert_mcp_events(batch)
+                AUDIT_EVENTS.inc(len(batch), result="written")
+                continue
+            except asyncio.CancelledError:
+                self._requeue(events[start:])
+                raise
+            except Exception as e:
+                print(f"[Audit] Failed to write {len(batch)} events ({e}); retrying one by one")
+            try:
+                failed = await self._write_each(batch)
+            except asyncio.CancelledError:
+                self._requeue(events[start + self.batch_size:])  # _write_each requeued its own
+                raise
+            if not failed:
+                continue
+            print(f"[Audit] {len(failed)} of {len(batch)} events could not be written")
+            if spill_on_error:
+                await asyncio.to_thread(self._spill, failed)
+            else:
+                AUDIT_EVENTS.inc(len(failed), result="dropped")
+
+    async def _write_each(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Insert events one at a time so a bad row can't sink the rest of its batch; an event
+        whose patient_id fails the foreign key is written without the link. Returns the events
+        that still failed (all remaining ones once the database itself looks down)."""
+        failed: List[Dict[str, Any]] = []
+        for i, event in enumerate(events):
+            if i >= OUTAGE_FAILURES and len(failed) == i:
+                return failed + events[i:]
+            attempts = [event]
+            if event.get("patient_id") is not None:
+                attempts.append({**event, "patient_id": None,
+                                 "payload": {**event["payload"], "patient_id": event["patient_id"]}})
+            try:
+                for attempt in attempts:
+                    try:
+                        await self.repo.insert_mcp_events([attempt])
+                        AUDIT_EVENTS.inc(result="written")
+                        break
+                    except Exception:
+                        continue
+                else:
+                    failed.append(event)
+            except asyncio.CancelledError:
+                self._requeue(failed + events[i:])
+                raise
+        return failed
+
+    def _requeue(self, events: List[Dict[str, Any]]):
+        """Put events a cancelled write never confirmed back at the front of the buffer."""
+        self._buffer.extendleft(reversed(events))
+
+    def _spill(self, events: List[Dict[str, Any]]):
+        if not self.spill_path:
+            AUDIT_EVENTS.inc(len(events), result="dropped")
+            return
+        try:
+            with open(self.spill_path, "a") as f:
+                for event in events:
+                    f.write(json.dumps(event, default=str) + "\n")
+            AUDIT_EVENTS.inc(len(events), result="spilled")
+        except OSError as e:
+            print(f"[Audit] Could not spill {len(events)} events: {e}")
+            AUDIT_EVENTS.inc(len(events), result="dropped")
+
+    def _read_spill(self) -> List[Dict[str, Any]]:
+        if not os.path.exists(self.spill_path):
+            return []
+        events = []
+        with open(self.spill_path) as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    continue  # torn last line from a crash
+        os.remove(self.spill_path)
+        return events
+
+    def snapshot(self) -> Dict[str, int]:
+        return {"buffered": len(self._buffer), "overflow": len(self._overflow), "replay": len(self._replay)}
+
+
+_audit_log: Optional[AuditLog] = None
+
+
+def get_audit_log() -> AuditLog:
+    """Process-wide audit log, configured from the environment on first use."""
+    global _audit_log
+    if _audit_log is None:
+        _audit_log = AuditLog(
+            max_buffer=int(os.environ.get("AUDIT_BUFFER_SIZE", "5000")),
+            batch_size=int(os.environ.get("AUDIT_BATCH_SIZE", "200")),
+            flush_interval=float(os.environ.get("AUDIT_FLUSH_SECONDS", "2")),
+            spill_path=os.environ.get("AUDIT_SPILL_PATH") or None,
+        )
+    return _audit_log
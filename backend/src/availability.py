@@ -0,0 +1,132 @@
+"""
+Earliest-availability search across doctors and days.
+Booked slots for every candidate doctor come from one query per search window. Each
+doctor's window becomes a bitmask of half-hour slots in a single Python int
+(bit = day * SLOTS_PER_DAY + slot), so blocking booked and past slots is a handful of
+big-int operations per doctor. The earliest open slots across all doctors are drawn
+from a heap keyed on each doctor's lowest free bit. The window starts short and only
+widens (loading just the new days) when it doesn't hold enough open slots.
+"""
+import heapq
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+from data import Repository
+
+SLOT_TIMES = [f"{h:02d}:{m:02d}" for h in range(9, 17) for m in (0, 30)]
+SLOTS_PER_DAY = len(SLOT_TIMES)
+DAY_START_MINUTES = 9 * 60
+SLOT_MINUTES = 30
+MAX_DAYS = 60
+FIRST_WINDOW_DAYS = 3
+
+
+def slot_index(time_str: Any) -> Optional[int]:
+    """Slot a booked time falls in ("10:15" and "10:15:00" both block 10:00), or None outside clinic hours."""
+    try:
+        minutes = int(str(time_str)[:2]) * 60 + int(str(time_str)[3:5])
+    except ValueError:
+        return None
+    idx = (minutes - DAY_START_MINUTES) // SLOT_MINUTES
+    return idx if 0 <= idx < SLOTS_PER_DAY else None
+
+
+def occupancy_masks(
+    booked: Dict[str, Dict[str, Set[str]]], doctor_ids: List[str], start: date, days: int,
+) -> Dict[str, int]:
+    """doctor_id -> bitmask of booked slots over [start, start + days)."""
+    masks: Dict[str, int] = {}
+    for doctor_id in doctor_ids:
+        mask = 0
+        for day, times in booked.get(doctor_id, {}).items():
+            offset = (date.fromisoformat(str(day)[:10]) - start).days
+            if not 0 <= offset < days:
+                continue
+            for t in times:
+                idx = slot_index(t)
+                if idx is not None:
+                    mask |= 1 << (offset * SLOTS_PER_DAY + idx)
+        masks[doctor_id] = mask
+    return masks
+
+
+def past_mask(start: date, now: datetime) -> int:
+    """Slots that have already started (only non-zero when the window begins today)."""
+    if start != now.date():
+        return 0
+    minutes = now.hour * 60 + now.minute
+    started = sum(1 for i in range(SLOTS_PER_DAY) if DAY_START_MINUTES + i * SLOT_MINUTES <= minutes)
+    return (1 << started) - 1
+
+
+def earliest_open(
+    masks: Dict[str, int], days: int, limit: int, blocked: int = 0, per_doctor: Optional[int] = None,
+) -> List[Tuple[int, str]]:
+    """The earliest `limit` open (bit, doctor_id) pairs across all doctors. Ties go to the
+    doctor listed first in `masks`; per_doctor caps how many slots one doctor contributes."""
+    window = (1 << (days * SLOTS_PER_DAY)) - 1
+    heap = []
+    for order, (doctor_id, occupied) in enumerate(masks.items()):
+        free = window & ~(occupied | blocked)
+        if free:
+            heap.append(((free & -free).bit_length() - 1, order, doctor_id, free))
+    heapq.heapify(heap)
+
+    picked: List[Tuple[int, str]] = []
+    taken: Dict[str, int] = {}
+    while heap and len(picked) < limit:
+        bit, order, doctor_id, free = heapq.heappop(heap)
+        picked.append((bit, doctor_id))
+        taken[doctor_id] = taken.get(doctor_id, 0) + 1
+        free &= free - 1  # clear the slot just taken
+        if free and (per_doctor is None or taken[doctor_id] < per_doctor):
+            heapq.heappush(heap, ((free & -free).bit_length() - 1, order, doctor_id, free))
+    return picked
+
+
+async def find_earliest_slots(
+    repo: Repository,
+    doctors: List[Dict[str, Any]],
+    date_from: Optional[str] = None,
+    days: int = 14,
+    limit: int = 5,
+    per_doctor: Optional[int] = None,
+    now: Optional[datetime] = None,
+) -> List[Dict[str, Any]]:
+    """Earliest open slots across `doctors` (in preference order) from date_from (default today)."""
+    if not doctors:
+        return []
+    now = now or datetime.now()
+    start = max(date.fromisoformat(date_from[:10]) if date_from else now.date(), now.date())
+    days = max(1, min(days, MAX_DAYS))
+    by_id = {d["id"]: d for d in doctors}
+    doctor_ids = list(by_id)
+    blocked = past_mask(start, now)
+
+    # Slots found in the first `window` days are earlier than anything after it, so the
+    # answer is final as soon as the window holds `limit` of them.
+    masks = dict.fromkeys(doctor_ids, 0)
+    loaded, window = 0, min(FIRST_WINDOW_DAYS, days)
+    while True:
+        booked = await repo.booked_slots(doctor_ids, (start + timedelta(days=loaded)).isoformat(),
+                                         (start + timedelta(days=window - 1)).isoformat())
+        for doctor_id, mask in occupancy_masks(booked, doctor_ids, start, window).items():
+            masks[doctor_id] |= mask
+        picked = earliest_open(masks, window, limit, blocked=blocked, per_doctor=per_doctor)
+        if len(picked) >= limit or window >= days:
+            break
+        loaded, window = window, min(window * 4, days)
+
+    slots = []
+    for bit, doctor_id in picked:
+        day, idx = divmod(bit, SLOTS_PER_DAY)
+        doctor = by_id[doctor_id]
+        slots.append({
+            "doctor_id": doctor_id,
+            "doctor_name": doctor.get("name"),
+            "speciality": doctor.get("speciality") or "General Physician",
+            "hospital": doctor.get("hospital_name") or "Clinic",
+            "date": (start + timedelta(days=day)).isoformat(),
+            "time": SLOT_TIMES[idx],
+        })
+    return slots
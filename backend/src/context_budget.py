@@ -0,0 +1,219 @@
+"""
+Token budgeting and context compaction for the agentic loop.
+Keeps the prompt under a fixed budget by trimming old history, compacting tool
+results to the fields the model actually uses, and metering token usage per request.
+"""
+import json
+import math
+from datetime import date
+from typing import Dict, Any, List, Optional
+
+# Rough chars-per-token ratio for LLaMA-family tokenizers on English text.
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Cheap local token estimate. Good enough for budgeting; the API reports exact counts."""
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def count_message_tokens(messages: List[Dict[str, Any]], tools: Optional[List[Dict]] = None) -> int:
+    total = 0
+    for m in messages:
+        total += MESSAGE_OVERHEAD_TOKENS + estimate_tokens(m.get("content"))
+        for call in m.get("tool_calls") or []:
+            total += estimate_tokens(call["function"]["name"]) + estimate_tokens(call["function"]["arguments"])
+    if tools:
+        total += estimate_tokens(json.dumps(tools))
+    return total
+
+
+# ── Tool result compaction ─────────────────────────────────────────────────────
+
+def _pick(d: Optional[Dict[str, Any]], *fields: str) -> Optional[Dict[str, Any]]:
+    if not d:
+        return d
+    return {f: d[f] for f in fields if d.get(f) is not None}
+
+
+def _compact_health_summary(r: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "patient_name": r.get("patient_name"),
+        "dob": r.get("dob"),
+        "has_guardian_phone": bool(r.get("guardian_phone")),
+        "latest_vitals": _pick(r.get("latest_vitals"), "bp_systolic", "bp_diastolic", "heart_rate", "spo2", "logged_at"),
+        "medications": [_pick(m, "name", "dosage", "frequency") for m in r.get("medications", [])],
+    }
+
+
+def _compact_medications(r: Dict[str, Any]) -> Dict[str, Any]:
+    meds = [_pick(m, "name", "dosage", "frequency", "current_stock") for m in r.get("medications", [])]
+    return {"medications": meds, "count": len(meds)}
+
+
+def _compact_appointments(r: Dict[str, Any]) -> Dict[str, Any]:
+    today = date.today().isoformat()
+    appts = [_pick(a, "doctor_name", "date", "time", "status", "reason") for a in r.get("appointments", [])]
+    upcoming = [a for a in appts if (a.get("date") or "") >= today][:5]
+    past = [a for a in appts if (a.get("date") or "") < today][-3:]
+    return {"upcoming": upcoming, "recent_past": past, "total": r.get("total", len(appts))}
+
+
+def _compact_doctors(r: Dict[str, Any]) -> Dict[str, Any]:
+    doctors = [_pick(d, "name", "speciality", "hospital", "distance_km") for d in r.get("doctors", [])]
+    return {"message": r.get("message"), "doctors": doctors[:15], "total": r.get("total", len(doctors))}
+
+
+def _compact_slots(r: Dict[str, Any]) -> Dict[str, Any]:
+    out = {"message": r.get("message"),
+           "slots": [_pick(s, "doctor_name", "speciality", "hospital", "date", "time") for s in r.get("slots", [])]}
+    if r.get("error"):
+        out["error"] = r["error"]
+    return out
+
+
+def _compact_hospitals(r: Dict[str, Any]) -> Dict[str, Any]:
+    out = {"hospitals": [_pick(h, "name", "distance", "phone", "emergency") for h in r.get("hospitals", [])]}
+    if r.get("error"):
+        out["error"] = r["error"]
+    return out
+
+
+def _compact_booking(r: Dict[str, Any]) -> Dict[str, Any]:
+    return _pick(r, "success", "doctor_name", "doctor_speciality", "hospital_name", "distance_km", "date", "time", "error")
+
+
+def _compact_alert(r: Dict[str, Any]) -> Dict[str, Any]:
+    return _pick(r, "success", "queued", "deduplicated", "error")
+
+
+def _compact_emergency(r: Dict[str, Any]) -> Dict[str, Any]:
+    out = {"alert": _compact_alert(r.get("alert") or {}), **_compact_hospitals({"hospitals": r.get("hospitals", [])})}
+    if r.get("hospital_error"):
+        out["hospital_error"] = r["hospital_error"]
+    return out
+
+
+def _compact_status(r: Dict[str, Any]) -> Dict[str, Any]:
+    out = {
+        "health": _compact_health_summary(r.get("health") or {}),
+        "upcoming_appointments": [_pick(a, "doctor_name", "date", "time", "status", "reason")
+                                  for a in r.get("upcoming_appointments", [])][:5],
+    }
+    if r.get("error"):
+        out["error"] = r["error"]
+    return out
+
+
+TOOL_COMPACTORS = {
+    "get_health_summary": _compact_health_summary,
+    "get_medications": _compact_medications,
+    "get_appointments": _compact_appointments,
+    "get_available_doctors": _compact_doctors,
+    "find_available_slots": _compact_slots,
+    "find_nearest_hospital": _compact_hospitals,
+    "book_appointment": _compact_booking,
+    "send_emergency_alert": _compact_alert,
+    "emergency_response": _compact_emergency,
+    "status_overview": _compact_status,
+}
+
+
+# ── Usage metering ─────────────────────────────────────────────────────────────
+
+class UsageMeter:
+    """Accumulates provider-reported and locally estimated token counts for one request."""
+
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.estimated_prompt_tokens = 0
+        self.compaction_saved_tokens = 0
+        self.llm_calls = 0
+
+    def record_call(self, response: Any, estimated_prompt_tokens: int):
+        self.llm_calls += 1
+        self.estimated_prompt_tokens += estimated_prompt_tokens
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            self.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+            self.completion_tokens += getattr(usage, "completion_tokens", 0) or 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.prompt_tokens + self.completion_tokens,
+            "estimated_prompt_tokens": self.estimated_prompt_tokens,
+            "compaction_saved_tokens": self.compaction_saved_tokens,
+            "llm_calls": self.llm_calls,
+        }
+
+
+# ── Context manager ────────────────────────────────────────────────────────────
+
+class ContextManager:
+    def __init__(
+        self,
+        max_prompt_tokens: int = 3000,
+        max_completion_tokens: int = 512,
+        keep_recent_messages: int = 6,
+        summary_max_tokens: int = 200,
+    ):
+        self.max_prompt_tokens = max_prompt_tokens
+        self.max_completion_tokens = max_completion_tokens
+        self.keep_recent_messages = keep_recent_messages
+        self.summary_max_tokens = summary_max_tokens
+
+    def build_messages(
+        self, system_prompt: str, history: List[Dict[str, str]], message: str,
+        tools: Optional[List[Dict]] = None,
+    ) -> List[Dict[str, Any]]:
+        """System prompt + as much recent history as fits + the new user message.
+        Older turns that don't fit are folded into a short extractive summary."""
+        fixed = [{"role": "system", "content": system_prompt}, {"role": "user", "content": message}]
+        budget = self.max_prompt_tokens - count_message_tokens(fixed, tools) - self.summary_max_tokens
+
+        kept: List[Dict[str, str]] = []
+        used = 0
+        for i, msg in enumerate(reversed(history)):
+            cost = MESSAGE_OVERHEAD_TOKENS + estimate_tokens(msg["content"])
+            if i >= self.keep_recent_messages or used + cost > budget:
+                break
+            kept.append({"role": msg["role"], "content": msg["content"]})
+            used += cost
+        kept.reverse()
+        dropped = history[: len(history) - len(kept)]
+
+        messages = [fixed[0]]
+        if dropped:
+            messages.append({"role": "system", "content": self._summarize(dropped)})
+        messages.extend(kept)
+        messages.append(fixed[1])
+        return messages
+
+    def _summarize(self, dropped: List[Dict[str, str]]) -> str:
+        lines = []
+        budget_chars = self.summary_max_tokens * CHARS_PER_TOKEN
+        for msg in reversed(dropped):
+            speaker = "Patient" if msg["role"] == "user" else "Assistant"
+            text = " ".join((msg.get("content") or "").split())
+            line = f"- {speaker}: {text[:120]}{'…' if len(text) > 120 else ''}"
+            if sum(len(l) for l in lines) + len(line) > budget_chars:
+                break
+            lines.append(line)
+        lines.reverse()
+        return "Summary of earlier conversation (older turns omitted):\n" + "\n".join(lines)
+
+    def compact_tool_result(self, tool_name: str, result: Dict[str, Any], meter: Optional[UsageMeter] = None) -> str:
+        """JSON for the tool message, reduced to the fields the model needs to answer."""
+        compactor = TOOL_COMPACTORS.get(tool_name)
+        compacted = compactor(result) if compactor else result
+        content = json.dumps(compacted, default=str, separators=(",", ":"))
+        if meter is not None and compactor:
+            full = estimate_tokens(json.dumps(result, default=str))
+            meter.compaction_saved_tokens += max(0, full - estimate_tokens(content))
+        return content
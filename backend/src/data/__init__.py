@@ -0,0 +1,26 @@
+"""
+Data-access layer: Repository interface with Supabase and local SQLite backends.
+"""
+import os
+
+from data.base import Repository, count_queries
+from data.supabase_repo import SupabaseRepository
+from data.sqlite_repo import SQLiteRepository
+
+
+def create_repository() -> Repository:
+    """DATA_BACKEND=sqlite uses a local database at SQLITE_PATH; otherwise Supabase."""
+    if os.environ.get("DATA_BACKEND", "supabase").lower() == "sqlite":
+        return SQLiteRepository(os.environ.get("SQLITE_PATH", "agentcare.db"))
+
+    from supabase import create_client
+    return SupabaseRepository(create_client(os.environ.get("SUPABASE_URL"), os.environ.get("SUPABASE_KEY")))
+
+
+__all__ = [
+    "Repository",
+    "SupabaseRepository",
+    "SQLiteRepository",
+    "count_queries",
+    "create_repository",
+]
@@ -0,0 +1,137 @@
+"""
+Repository interface for all backend data access.
+Agents and tools talk to a Repository instead of building Supabase queries inline,
+so queries can be batched, counted and optimised in one place, and the backend can
+run against a local SQLite database with no live Supabase project.
+"""
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Set, Iterator
+
+from metrics import DB_QUERIES
+
+ACTIVE_REFILL_STATUSES = ["pending", "approved_by_patient", "approved_by_doctor"]
+ACTIVE_APPOINTMENT_STATUSES = ["pending", "accepted"]
+
+USER_FIELDS = ["id", "name", "email", "dob", "guardian_phone"]
+DOCTOR_FIELDS = ["id", "name", "speciality", "email", "hospital_name"]
+MEDICATION_SUMMARY_FIELDS = ["name", "dosage", "frequency", "current_stock"]
+
+_query_scope: contextvars.ContextVar[Optional[Counter]] = contextvars.ContextVar("query_scope", default=None)
+
+
+@contextmanager
+def count_queries() -> Iterator[Counter]:
+    """Count the queries issued inside this block (per operation name), e.g. for one request.
+    Safe across concurrent requests: each asyncio task sees its own counter."""
+    counter: Counter = Counter()
+    token = _query_scope.set(counter)
+    try:
+        yield counter
+    finally:
+        _query_scope.reset(token)
+
+
+class Repository:
+    """Typed, async data-access methods. Each round trip to the database is counted."""
+    name = "base"
+
+    def __init__(self):
+        self.query_counts: Counter = Counter()
+
+    def _count(self, op: str, n: int = 1):
+        self.query_counts[op] += n
+        DB_QUERIES.inc(n, backend=self.name, op=op)
+        scope = _query_scope.get()
+        if scope is not None:
+            scope[op] += n
+
+    def is_valid_id(self, value: Any) -> bool:
+        """Whether value fits this backend's id columns (checked before using it as a foreign key)."""
+        return isinstance(value, str) and bool(value)
+
+    # ── Patients ───────────────────────────────────────────────────────────────
+
+    async def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def patient_context(
+        self, patient_id: str, vitals_limit: int = 5, include_reports: bool = False,
+    ) -> Dict[str, Any]:
+        """User row, latest vitals (newest first), medication summaries and optionally recent reports."""
+        raise NotImplementedError
+
+    async def patient_contexts(
+        self, patient_ids: List[str], vitals_limit: int = 5, include_reports: bool = False,
+    ) -> Dict[str, Dict[str, Any]]:
+        """Batched patient_context for many patients in a fixed number of queries."""
+        raise NotImplementedError
+
+    async def medications(self, patient_id: str) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    # ── Doctors & appointments ─────────────────────────────────────────────────
+
+    async def list_doctors(self) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def find_doctor(self, name: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """First doctor whose name contains `name` (case-insensitive), or any doctor."""
+        raise NotImplementedError
+
+    async def appointments_for_patient(self, patient_id: str) -> List[Dict[str, Any]]:
+        """Appointments ordered by date, each with a nested `doctor` {name, email}."""
+        raise NotImplementedError
+
+    async def appointments_for_doctor(
+        self, doctor_id: str, date_from: str, date_to: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """A doctor's active (pending or accepted) appointments in [date_from, date_to], ordered
+        by date and time, including pre_visit_report, pre_visit_status and updated_at."""
+        raise NotImplementedError
+
+    async def booked_slots(
+        self, doctor_ids: List[str], date_from: str, date_to: Optional[str] = None,
+    ) -> Dict[str, Dict[str, Set[str]]]:
+        """doctor_id -> date -> booked HH:MM times over [date_from, date_to], in one query."""
+        raise NotImplementedError
+
+    async def insert_appointment(self, row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def appointment_report(self, appointment_id: str) -> Optional[Dict[str, Any]]:
+        """{pre_visit_report, pre_visit_status} for an appointment, or None if it doesn't exist."""
+        raise NotImplementedError
+
+    async def save_previsit_report(self, appointment_id: str, report: str, status: str):
+        raise NotImplementedError
+
+    # ── Hospital locations ─────────────────────────────────────────────────────
+
+    async def hospital_locations(self) -> List[Dict[str, Any]]:
+        """Every geocoded hospital: {name_key, name, latitude, longitude} (coordinates None if unresolved)."""
+        raise NotImplementedError
+
+    async def upsert_hospital_locations(self, rows: List[Dict[str, Any]]):
+        """Insert or replace locations by name_key in one round trip."""
+        raise NotImplementedError
+
+    # ── Refills ────────────────────────────────────────────────────────────────
+
+    async def low_stock_medications(self) -> List[Dict[str, Any]]:
+        """Medications whose current_stock is at or below stock_threshold."""
+        raise NotImplementedError
+
+    async def active_refill_medication_ids(self, medication_ids: List[str]) -> Set[str]:
+        """Which of these medications already have a refill in progress."""
+        raise NotImplementedError
+
+    async def bulk_insert_refills(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    # ── Audit ──────────────────────────────────────────────────────────────────
+
+    async def insert_mcp_events(self, rows: List[Dict[str, Any]]):
+        """Append audit events to mcp_events in one round trip."""
+        raise NotImplementedError
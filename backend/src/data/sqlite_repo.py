@@ -0,0 +1,255 @@
+"""
+Local SQLite implementation of the Repository.
+Runs the whole backend without a live Supabase project (development, load tests,
+profiling). Uses the stdlib sqlite3 driver; each query runs in a worker thread.
+"""
+import os
+import json
+import uuid
+import sqlite3
+import asyncio
+import threading
+from typing import Dict, Any, List, Optional, Set, Sequence
+
+from data.base import (
+    Repository,
+    ACTIVE_REFILL_STATUSES,
+    ACTIVE_APPOINTMENT_STATUSES,
+    USER_FIELDS,
+    DOCTOR_FIELDS,
+    MEDICATION_SUMMARY_FIELDS,
+)
+from metrics import span
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "sqlite_schema.sql")
+JSON_COLUMNS = {"health_report", "payload"}
+
+
+def _placeholders(values: Sequence[Any]) -> str:
+    return ", ".join("?" for _ in values)
+
+
+class SQLiteRepository(Repository):
+    name = "sqlite"
+
+    def __init__(self, path: str = ":memory:"):
+        super().__init__()
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        with open(SCHEMA_PATH) as f:
+            self.conn.executescript(f.read())
+
+    def _query_sync(self, sql: str, params: Sequence[Any] = ()) -> List[Dict[str, Any]]:
+        with self._lock, self.conn:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [self._decode(dict(r)) for r in rows]
+
+    async def _query(self, op: str, sql: str, params: Sequence[Any] = ()) -> List[Dict[str, Any]]:
+        self._count(op)
+        with span("db", op):
+            return await asyncio.to_thread(self._query_sync, sql, params)
+
+    @staticmethod
+    def _decode(row: Dict[str, Any]) -> Dict[str, Any]:
+        for col in JSON_COLUMNS & row.keys():
+            if isinstance(row[col], str):
+                row[col] = json.loads(row[col])
+        return row
+
+    def _insert_sync(self, table: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        out = []
+        with self._lock, self.conn:
+            for row in rows:
+                row = {"id": str(uuid.uuid4()), **row}
+                values = [json.dumps(v, default=str) if k in JSON_COLUMNS else v for k, v in row.items()]
+                self.conn.execute(
+                    f"INSERT INTO {table} ({', '.join(row)}) VALUES ({_placeholders(values)})", values
+                )
+                out.append(row)
+        return out
+
+    async def insert(self, table: str, rows: List[Dict[str, Any]], op: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Insert rows (ids generated when missing) in one transaction. Also used for seeding."""
+        if not rows:
+            return []
+        op = op or f"insert_{table}"
+        self._count(op)
+        with span("db", op):
+            return await asyncio.to_thread(self._insert_sync, table, rows)
+
+    # ── Patients ───────────────────────────────────────────────────────────────
+
+    async def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
+        rows = await self._query("get_user", f"SELECT {', '.join(USER_FIELDS)} FROM users WHERE id = ?", (user_id,))
+        return rows[0] if rows else None
+
+    async def patient_context(self, patient_id: str, vitals_limit: int = 5, include_reports: bool = False) -> Dict[str, Any]:
+        queries = [
+            self.get_user(patient_id),
+            self._query("vitals", "SELECT * FROM vitals WHERE patient_id = ? ORDER BY logged_at DESC LIMIT ?",
+                        (patient_id, vitals_limit)),
+            self._query("medications", f"SELECT {', '.join(MEDICATION_SUMMARY_FIELDS)} FROM medications WHERE patient_id = ?",
+                        (patient_id,)),
+        ]
+        if include_reports:
+            queries.append(self._query("recent_reports",
+                                       "SELECT * FROM medical_reports WHERE patient_id = ? ORDER BY created_at DESC LIMIT 3",
+                                       (patient_id,)))
+        results = await asyncio.gather(*queries)
+        return {
+            "user": results[0] or {},
+            "vitals": results[1],
+            "medications": results[2],
+            "reports": results[3] if include_reports else [],
+        }
+
+    async def patient_contexts(self, patient_ids: List[str], vitals_limit: int = 5, include_reports: bool = False) -> Dict[str, Dict[str, Any]]:
+        ids = list(dict.fromkeys(patient_ids))
+        if not ids:
+            return {}
+        ph = _placeholders(ids)
+        queries = [
+            self._query("users_batch", f"SELECT {', '.join(USER_FIELDS)} FROM users WHERE id IN ({ph})", ids),
+            self._query("vitals_batch",
+                        f"SELECT * FROM (SELECT *, ROW_NUMBER() OVER (PARTITION BY patient_id ORDER BY logged_at DESC) AS rn "
+                        f"FROM vitals WHERE patient_id IN ({ph})) WHERE rn <= ? ORDER BY patient_id, logged_at DESC",
+                        [*ids, vitals_limit]),
+            self._query("medications_batch",
+                        f"SELECT patient_id, {', '.join(MEDICATION_SUMMARY_FIELDS)} FROM medications WHERE patient_id IN ({ph})",
+                        ids),
+        ]
+        if include_reports:
+            queries.append(self._query(
+                "recent_reports_batch",
+                f"SELECT * FROM (SELECT *, ROW_NUMBER() OVER (PARTITION BY patient_id ORDER BY created_at DESC) AS rn "
+                f"FROM medical_reports WHERE patient_id IN ({ph})) WHERE rn <= 3 ORDER BY patient_id, created_at DESC",
+                ids))
+        users, vitals, meds, *reports = await asyncio.gather(*queries)
+        out = {pid: {"user": {}, "vitals": [], "medications": [], "reports": []} for pid in ids}
+        for u in users:
+            out[u["id"]]["user"] = u
+        for v in vitals:
+            v.pop("rn", None)
+            out[v["patient_id"]]["vitals"].append(v)
+        for m in meds:
+            out[m.pop("patient_id")]["medications"].append(m)
+        for r in (reports[0] if reports else []):
+            r.pop("rn", None)
+            out[r["patient_id"]]["reports"].append(r)
+        return out
+
+    async def medications(self, patient_id: str) -> List[Dict[str, Any]]:
+        return await self._query("medications", "SELECT * FROM medications WHERE patient_id = ?", (patient_id,))
+
+    # ── Doctors & appointments ─────────────────────────────────────────────────
+
+    async def list_doctors(self) -> List[Dict[str, Any]]:
+        return await self._query("list_doctors", f"SELECT {', '.join(DOCTOR_FIELDS)} FROM users WHERE role = 'doctor'")
+
+    async def find_doctor(self, name: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        base = f"SELECT {', '.join(DOCTOR_FIELDS)} FROM users WHERE role = 'doctor'"
+        if name:
+            rows = await self._query("find_doctor", base + " AND name LIKE ? LIMIT 1", (f"%{name}%",))
+            if rows:
+                return rows[0]
+        rows = await self._query("find_doctor", base + " LIMIT 1")
+        return rows[0] if rows else None
+
+    async def appointments_for_patient(self, patient_id: str) -> List[Dict[str, Any]]:
+        rows = await self._query(
+            "appointments_for_patient",
+            "SELECT a.*, d.name AS doctor_name, d.email AS doctor_email FROM appointments a "
+            "LEFT JOIN users d ON d.id = a.doctor_id WHERE a.patient_id = ? ORDER BY a.date",
+            (patient_id,),
+        )
+        for r in rows:
+            name, email = r.pop("doctor_name"), r.pop("doctor_email")
+            r["doctor"] = {"name": name, "email": email} if name is not None else None
+        return rows
+
+    async def appointments_for_doctor(self, doctor_id: str, date_from: str, date_to: Optional[str] = None) -> List[Dict[str, Any]]:
+        return await self._query(
+            "appointments_for_doctor",
+            f"SELECT * FROM appointments WHERE doctor_id = ? AND date BETWEEN ? AND ? "
+            f"AND status IN ({_placeholders(ACTIVE_APPOINTMENT_STATUSES)}) ORDER BY date, time",
+            (doctor_id, date_from, date_to or date_from, *ACTIVE_APPOINTMENT_STATUSES),
+        )
+
+    async def booked_slots(self, doctor_ids: List[str], date_from: str, date_to: Optional[str] = None) -> Dict[str, Dict[str, Set[str]]]:
+        if not doctor_ids:
+            return {}
+        rows = await self._query(
+            "booked_slots",
+            f"SELECT doctor_id, date, time FROM appointments WHERE doctor_id IN ({_placeholders(doctor_ids)}) "
+            f"AND date BETWEEN ? AND ? AND status IN ({_placeholders(ACTIVE_APPOINTMENT_STATUSES)})",
+            [*doctor_ids, date_from, date_to or date_from, *ACTIVE_APPOINTMENT_STATUSES],
+        )
+        out: Dict[str, Dict[str, Set[str]]] = {}
+        for r in rows:
+            out.setdefault(r["doctor_id"], {}).setdefault(r["date"], set()).add(r["time"])
+        return out
+
+    async def insert_appointment(self, row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        rows = await self.insert("appointments", [row], op="insert_appointment")
+        return rows[0] if rows else None
+
+    async def appointment_report(self, appointment_id: str) -> Optional[Dict[str, Any]]:
+        rows = await self._query("appointment_report",
+                                 "SELECT pre_visit_report, pre_visit_status FROM appointments WHERE id = ?",
+                                 (appointment_id,))
+        return rows[0] if rows else None
+
+    async def save_previsit_report(self, appointment_id: str, report: str, status: str):
+        await self._query("save_previsit_report",
+                          "UPDATE appointments SET pre_visit_report = ?, pre_visit_status = ?, "
+                          "updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                          (report, status, appointment_id))
+
+    # ── Hospital locations ─────────────────────────────────────────────────────
+
+    async def hospital_locations(self) -> List[Dict[str, Any]]:
+        return await self._query("hospital_locations", "SELECT name_key, name, latitude, longitude FROM hospital_locations")
+
+    def _upsert_locations_sync(self, rows: List[Dict[str, Any]]):
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO hospital_locations (name_key, name, latitude, longitude) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (name_key) DO UPDATE SET name = excluded.name, latitude = excluded.latitude, "
+                "longitude = excluded.longitude, geocoded_at = CURRENT_TIMESTAMP",
+                [(r["name_key"], r["name"], r.get("latitude"), r.get("longitude")) for r in rows],
+            )
+
+    async def upsert_hospital_locations(self, rows: List[Dict[str, Any]]):
+        if not rows:
+            return
+        self._count("upsert_hospital_locations")
+        with span("db", "upsert_hospital_locations"):
+            await asyncio.to_thread(self._upsert_locations_sync, rows)
+
+    # ── Refills ────────────────────────────────────────────────────────────────
+
+    async def low_stock_medications(self) -> List[Dict[str, Any]]:
+        return await self._query("low_stock_medications",
+                                 "SELECT * FROM medications WHERE current_stock IS NOT NULL "
+                                 "AND stock_threshold IS NOT NULL AND current_stock <= stock_threshold")
+
+    async def active_refill_medication_ids(self, medication_ids: List[str]) -> Set[str]:
+        if not medication_ids:
+            return set()
+        rows = await self._query(
+            "active_refills",
+            f"SELECT medication_id FROM refill_requests WHERE medication_id IN ({_placeholders(medication_ids)}) "
+            f"AND status IN ({_placeholders(ACTIVE_REFILL_STATUSES)})",
+            [*medication_ids, *ACTIVE_REFILL_STATUSES],
+        )
+        return {r["medication_id"] for r in rows}
+
+    async def bulk_insert_refills(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return await self.insert("refill_requests", rows, op="bulk_insert_refills")
+
+    # ── Audit ──────────────────────────────────────────────────────────────────
+
+    async def insert_mcp_events(self, rows: List[Dict[str, Any]]):
+        await self.insert("mcp_events", rows, op="insert_mcp_events")
@@ -0,0 +1,125 @@
+-- SQLite mirror of the Supabase schema (backend/schema.sql plus the tables the
+-- frontend's migrations own). UUIDs are generated by the application, timestamps
+-- are ISO-8601 text, JSONB/array columns are stored as JSON text.
+
+-- Users (patients and doctors)
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL UNIQUE,
+    password_hash TEXT NOT NULL DEFAULT '',
+    role TEXT NOT NULL DEFAULT 'patient',
+    guardian_phone TEXT,
+    phone TEXT,
+    dob TEXT,
+    speciality TEXT,
+    hospital_name TEXT,
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_users_role ON users (role);
+
+-- Vitals Table
+CREATE TABLE IF NOT EXISTS vitals (
+    id TEXT PRIMARY KEY,
+    patient_id TEXT REFERENCES users(id) ON DELETE CASCADE,
+    bp_systolic INTEGER NOT NULL,
+    bp_diastolic INTEGER NOT NULL,
+    heart_rate INTEGER NOT NULL,
+    spo2 INTEGER NOT NULL,
+    logged_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_vitals_patient ON vitals (patient_id, logged_at DESC);
+
+-- Medications Table
+CREATE TABLE IF NOT EXISTS medications (
+    id TEXT PRIMARY KEY,
+    patient_id TEXT REFERENCES users(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    dosage TEXT,
+    frequency TEXT,
+    started_at TEXT,
+    notes TEXT,
+    current_stock INTEGER,
+    stock_threshold INTEGER,
+    refill_quantity INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_medications_patient ON medications (patient_id);
+
+-- Appointments
+CREATE TABLE IF NOT EXISTS appointments (
+    id TEXT PRIMARY KEY,
+    patient_id TEXT NOT NULL REFERENCES users(id),
+    doctor_id TEXT NOT NULL REFERENCES users(id),
+    date TEXT NOT NULL,
+    time TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    type TEXT NOT NULL DEFAULT 'General Checkup',
+    reason TEXT,
+    patient_notes TEXT,
+    pre_visit_report TEXT,
+    pre_visit_status TEXT,
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_appointments_patient ON appointments (patient_id, date);
+CREATE INDEX IF NOT EXISTS idx_appointments_doctor ON appointments (doctor_id, date);
+
+-- Refill requests (dual-approval workflow)
+CREATE TABLE IF NOT EXISTS refill_requests (
+    id TEXT PRIMARY KEY,
+    patient_id TEXT REFERENCES users(id) ON DELETE CASCADE,
+    medication_id TEXT REFERENCES medications(id) ON DELETE CASCADE,
+    status TEXT NOT NULL DEFAULT 'pending',
+    health_report TEXT,
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_refill_requests_medication ON refill_requests (medication_id, status);
+
+-- Medical reports
+CREATE TABLE IF NOT EXISTS medical_reports (
+    id TEXT PRIMARY KEY,
+    patient_id TEXT REFERENCES users(id) ON DELETE CASCADE,
+    title TEXT,
+    summary TEXT,
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Hospitals Table
+CREATE TABLE IF NOT EXISTS hospitals (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    city TEXT NOT NULL,
+    specialization TEXT,
+    er_available INTEGER DEFAULT 1,
+    address TEXT,
+    contact_phone TEXT
+);
+
+-- Hospital coordinates, geocoded once per distinct doctors.hospital_name (see geo_index.py)
+CREATE TABLE IF NOT EXISTS hospital_locations (
+    name_key TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    latitude REAL,
+    longitude REAL,
+    geocoded_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+-- MCP Events (Audit Log)
+CREATE TABLE IF NOT EXISTS mcp_events (
+    id TEXT PRIMARY KEY,
+    source_agent TEXT NOT NULL,
+    target_agent TEXT,
+    event_type TEXT NOT NULL,
+    patient_id TEXT REFERENCES users(id) ON DELETE CASCADE,
+    payload TEXT NOT NULL,
+    timestamp TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Patients Table (Adapter)
+CREATE TABLE IF NOT EXISTS patients (
+    id TEXT PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    guardian_id TEXT REFERENCES users(id),
+    doctor_id TEXT REFERENCES users(id),
+    city TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
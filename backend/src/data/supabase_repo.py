@@ -0,0 +1,228 @@
+"""
+Supabase implementation of the Repository.
+The Supabase client is synchronous, so every round trip runs in a worker thread and
+independent queries are issued concurrently.
+"""
+import uuid
+import asyncio
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Set, Callable, TYPE_CHECKING
+
+from data.base import (
+    Repository,
+    ACTIVE_REFILL_STATUSES,
+    ACTIVE_APPOINTMENT_STATUSES,
+    USER_FIELDS,
+    DOCTOR_FIELDS,
+    MEDICATION_SUMMARY_FIELDS,
+)
+from metrics import span
+
+if TYPE_CHECKING:
+    from supabase import Client  # heavy import; only create_repository() needs the real package
+
+# Patients per round of per-patient queries when a recent_* function (schema.sql) isn't installed
+PER_PATIENT_CHUNK = 20
+
+
+class SupabaseRepository(Repository):
+    name = "supabase"
+
+    def __init__(self, client: "Client"):
+        super().__init__()
+        self.client = client
+        self._missing_functions: Set[str] = set()
+
+    def is_valid_id(self, value: Any) -> bool:
+        try:
+            uuid.UUID(str(value))
+            return True
+        except ValueError:
+            return False
+
+    async def _run(self, op: str, query: Callable[[], Any]) -> List[Dict[str, Any]]:
+        self._count(op)
+        with span("db", op):
+            res = await asyncio.to_thread(lambda: query().execute())
+        return res.data or []
+
+    # ── Patients ───────────────────────────────────────────────────────────────
+
+    async def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
+        rows = await self._run("get_user", lambda: self.client.table("users").select(", ".join(USER_FIELDS)).eq("id", user_id))
+        return rows[0] if rows else None
+
+    async def _recent_reports(self, patient_id: str) -> List[Dict[str, Any]]:
+        try:
+            return await self._run("recent_reports", lambda: self.client.table("medical_reports").select("*").eq(
+                "patient_id", patient_id).order("created_at", desc=True).limit(3))
+        except Exception:
+            return []  # Table may not exist or have different columns
+
+    async def _recent_reports_batch(self, patient_ids: List[str]) -> List[Dict[str, Any]]:
+        try:
+            return await self._latest_per_patient("recent_reports_batch", "recent_medical_reports",
+                                                  "medical_reports", "created_at", patient_ids, 3)
+        except Exception:
+            return []
+
+    async def _latest_per_patient(self, op: str, function: str, table: str, order_by: str,
+                                  patient_ids: List[str], per_patient: int) -> List[Dict[str, Any]]:
+        """The newest `per_patient` rows of `table` for each patient, bounded on the server:
+        one call to the schema.sql function, or limited per-patient queries (in chunks)
+        where that function isn't installed yet."""
+        if function not in self._missing_functions:
+            try:
+                return await self._run(op, lambda: self.client.rpc(
+                    function, {"patient_ids": patient_ids, "per_patient": per_patient}))
+            except Exception as e:
+                if "PGRST202" in str(e):  # PostgREST: no such function
+                    self._missing_functions.add(function)
+                print(f"[AgentCare] {function}() unavailable, querying {table} per patient: {e}")
+        rows: List[Dict[str, Any]] = []
+        for start in range(0, len(patient_ids), PER_PATIENT_CHUNK):
+            chunk = patient_ids[start:start + PER_PATIENT_CHUNK]
+            for result in await asyncio.gather(*(
+                self._run(op, lambda pid=pid: self.client.table(table).select("*").eq(
+                    "patient_id", pid).order(order_by, desc=True).limit(per_patient))
+                for pid in chunk
+            )):
+                rows.extend(result)
+        return rows
+
+    async def patient_context(self, patient_id: str, vitals_limit: int = 5, include_reports: bool = False) -> Dict[str, Any]:
+        queries = [
+            self.get_user(patient_id),
+            self._run("vitals", lambda: self.client.table("vitals").select("*").eq(
+                "patient_id", patient_id).order("logged_at", desc=True).limit(vitals_limit)),
+            self._run("medications", lambda: self.client.table("medications").select(
+                ", ".join(MEDICATION_SUMMARY_FIELDS)).eq("patient_id", patient_id)),
+        ]
+        if include_reports:
+            queries.append(self._recent_reports(patient_id))
+        results = await asyncio.gather(*queries)
+        return {
+            "user": results[0] or {},
+            "vitals": results[1],
+            "medications": results[2],
+            "reports": results[3] if include_reports else [],
+        }
+
+    async def patient_contexts(self, patient_ids: List[str], vitals_limit: int = 5, include_reports: bool = False) -> Dict[str, Dict[str, Any]]:
+        ids = list(dict.fromkeys(patient_ids))
+        if not ids:
+            return {}
+        queries = [
+            self._run("users_batch", lambda: self.client.table("users").select(", ".join(USER_FIELDS)).in_("id", ids)),
+            self._latest_per_patient("vitals_batch", "recent_vitals", "vitals", "logged_at", ids, vitals_limit),
+            self._run("medications_batch", lambda: self.client.table("medications").select(
+                ", ".join(MEDICATION_SUMMARY_FIELDS + ["patient_id"])).in_("patient_id", ids)),
+        ]
+        if include_reports:
+            queries.append(self._recent_reports_batch(ids))
+        users, vitals, meds, *reports = await asyncio.gather(*queries)
+        out = {pid: {"user": {}, "vitals": [], "medications": [], "reports": []} for pid in ids}
+        for u in users:
+            out[u["id"]]["user"] = u
+        for v in sorted(vitals, key=lambda v: v["logged_at"] or "", reverse=True):
+            out[v["patient_id"]]["vitals"].append(v)
+        for m in meds:
+            out[m.pop("patient_id")]["medications"].append(m)
+        for r in sorted(reports[0] if reports else [], key=lambda r: r["created_at"] or "", reverse=True):
+            out[r["patient_id"]]["reports"].append(r)
+        return out
+
+    async def medications(self, patient_id: str) -> List[Dict[str, Any]]:
+        return await self._run("medications", lambda: self.client.table("medications").select("*").eq("patient_id", patient_id))
+
+    # ── Doctors & appointments ─────────────────────────────────────────────────
+
+    async def list_doctors(self) -> List[Dict[str, Any]]:
+        return await self._run("list_doctors", lambda: self.client.table("users").select(
+            ", ".join(DOCTOR_FIELDS)).eq("role", "doctor"))
+
+    async def find_doctor(self, name: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        fields = ", ".join(DOCTOR_FIELDS)
+        if name:
+            rows = await self._run("find_doctor", lambda: self.client.table("users").select(fields).eq(
+                "role", "doctor").ilike("name", f"%{name}%").limit(1))
+            if rows:
+                return rows[0]
+        rows = await self._run("find_doctor", lambda: self.client.table("users").select(fields).eq("role", "doctor").limit(1))
+        return rows[0] if rows else None
+
+    async def appointments_for_patient(self, patient_id: str) -> List[Dict[str, Any]]:
+        return await self._run("appointments_for_patient", lambda: self.client.table("appointments").select(
+            "*, doctor:doctor_id (name, email)").eq("patient_id", patient_id).order("date", desc=False))
+
+    async def appointments_for_doctor(self, doctor_id: str, date_from: str, date_to: Optional[str] = None) -> List[Dict[str, Any]]:
+        return await self._run("appointments_for_doctor", lambda: self.client.table("appointments").select("*").eq(
+            "doctor_id", doctor_id).gte("date", date_from).lte("date", date_to or date_from).in_(
+            "status", ACTIVE_APPOINTMENT_STATUSES).order("date").order("time"))
+
+    async def booked_slots(self, doctor_ids: List[str], date_from: str, date_to: Optional[str] = None) -> Dict[str, Dict[str, Set[str]]]:
+        if not doctor_ids:
+            return {}
+        rows = await self._run("booked_slots", lambda: self.client.table("appointments").select(
+            "doctor_id, date, time").in_("doctor_id", doctor_ids).gte("date", date_from).lte(
+            "date", date_to or date_from).in_("status", ACTIVE_APPOINTMENT_STATUSES))
+        out: Dict[str, Dict[str, Set[str]]] = {}
+        for r in rows:
+            out.setdefault(r["doctor_id"], {}).setdefault(r["date"], set()).add(r["time"])
+        return out
+
+    async def insert_appointment(self, row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        rows = await self._run("insert_appointment", lambda: self.client.table("appointments").insert(row))
+        return rows[0] if rows else None
+
+    async def appointment_report(self, appointment_id: str) -> Optional[Dict[str, Any]]:
+        rows = await self._run("appointment_report", lambda: self.client.table("appointments").select(
+            "pre_visit_report, pre_visit_status").eq("id", appointment_id))
+        return rows[0] if rows else None
+
+    async def save_previsit_report(self, appointment_id: str, report: str, status: str):
+        await self._run("save_previsit_report", lambda: self.client.table("appointments").update({
+            "pre_visit_report": report,
+            "pre_visit_status": status,
+            "updated_at": datetime.now(timezone.utc).isoformat(),  # report freshness (see BulkReportRunner.is_current)
+        }).eq("id", appointment_id))
+
+    # ── Hospital locations ─────────────────────────────────────────────────────
+
+    async def hospital_locations(self) -> List[Dict[str, Any]]:
+        return await self._run("hospital_locations", lambda: self.client.table("hospital_locations").select(
+            "name_key, name, latitude, longitude"))
+
+    async def upsert_hospital_locations(self, rows: List[Dict[str, Any]]):
+        if not rows:
+            return
+        await self._run("upsert_hospital_locations", lambda: self.client.table("hospital_locations").upsert(
+            rows, on_conflict="name_key", returning="minimal"))
+
+    # ── Refills ────────────────────────────────────────────────────────────────
+
+    async def low_stock_medications(self) -> List[Dict[str, Any]]:
+        # PostgREST can't compare two columns, so filter nulls server-side and the rest here.
+        rows = await self._run("low_stock_medications", lambda: self.client.table("medications").select("*").not_.is_(
+            "current_stock", "null").not_.is_("stock_threshold", "null"))
+        return [m for m in rows if m["current_stock"] <= m["stock_threshold"]]
+
+    async def active_refill_medication_ids(self, medication_ids: List[str]) -> Set[str]:
+        if not medication_ids:
+            return set()
+        rows = await self._run("active_refills", lambda: self.client.table("refill_requests").select(
+            "medication_id").in_("medication_id", medication_ids).in_("status", ACTIVE_REFILL_STATUSES))
+        return {r["medication_id"] for r in rows}
+
+    async def bulk_insert_refills(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if not rows:
+            return []
+        return await self._run("bulk_insert_refills", lambda: self.client.table("refill_requests").insert(rows))
+
+    # ── Audit ──────────────────────────────────────────────────────────────────
+
+    async def insert_mcp_events(self, rows: List[Dict[str, Any]]):
+        if not rows:
+            return
+        # The audit log never reads its rows back; skip returning the representation
+        await self._run("insert_mcp_events", lambda: self.client.table("mcp_events").insert(rows, returning="minimal"))
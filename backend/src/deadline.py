@@ -0,0 +1,58 @@
+"""
+Per-request deadlines.
+The endpoint sets one absolute deadline for the whole request. It lives in a context
+variable, so the agent loop, tool executions and outbound HTTP calls beneath it (and
+any tasks they spawn) each get only the time that is left instead of their own fixed
+timeouts stacking up.
+"""
+import time
+import asyncio
+import contextvars
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+_deadline_var: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """The request's time budget is used up."""
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[None]:
+    """Give the block `seconds` to finish. Nested scopes can only shorten the deadline."""
+    if seconds is None:
+        yield
+        return
+    deadline = time.monotonic() + seconds
+    current = _deadline_var.get()
+    token = _deadline_var.set(deadline if current is None else min(deadline, current))
+    try:
+        yield
+    finally:
+        _deadline_var.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left in the current request, or None when no deadline is set."""
+    deadline = _deadline_var.get()
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+
+def without_deadline() -> contextvars.Context:
+    """A copy of the current context with no deadline, for shared work (a coalesced flight)
+    that must not inherit the budget of whichever request happened to start it."""
+    ctx = contextvars.copy_context()
+    ctx.run(_deadline_var.set, None)
+    return ctx
+
+
+def budget(cap: Optional[float] = None) -> Optional[float]:
+    """Timeout for the next step: its own cap, shortened to the time left.
+    Raises DeadlineExceeded when nothing is left."""
+    left = remaining()
+    if left is None:
+        return cap
+    if left <= 0:
+        raise DeadlineExceeded()
+    return left if cap is None else min(cap, left)
@@ -0,0 +1,125 @@
+"""
+Deterministic fast path for high-frequency read questions.
+"What are my medications?", "When is my next appointment?" and "How is my blood
+pressure?" are answered straight from the tool result with a templated reply,
+skipping the LLM entirely.
+"""
+import re
+from datetime import date, datetime
+from typing import Dict, Any, Optional
+
+from intents import EMERGENCY_KEYWORDS, classify
+
+FAST_INTENTS = {
+    "medications": (
+        "get_medications",
+        re.compile(
+            r"\b(what|which|list|show|tell me|remind me)\b.*\b(medications?|medicines?|meds|pills|tablets)\b|"
+            r"^\s*my (medications?|medicines?|meds)\s*\??$",
+            re.IGNORECASE,
+        ),
+    ),
+    "appointments": (
+        "get_appointments",
+        re.compile(
+            r"\b(when|what|show|list|do i have|any)\b.*\b(appointments?|next visit)\b|"
+            r"^\s*my (next )?appointments?\s*\??$",
+            re.IGNORECASE,
+        ),
+    ),
+    "health": (
+        "get_health_summary",
+        re.compile(
+            r"\b(how|what|show|check|tell me)\b.*\b(blood pressure|bp|vitals|heart rate|pulse|spo2|oxygen|health summary)\b",
+            re.IGNORECASE,
+        ),
+    ),
+}
+
+# Anything that asks for an action or judgement goes to the LLM.
+NOT_SIMPLE = re.compile(
+    r"\b(book|schedule|reschedule|cancel|change|refill|stop|skip|missed|side effects?|should i|can i|why|"
+    r"emergency|pain|hurt|help|doctor|hospital|and)\b",
+    re.IGNORECASE,
+)
+
+
+def match_fast_intent(message: str) -> Optional[str]:
+    """Return the fast-path intent for a short, single-purpose read question, else None."""
+    if len(message) > 120 or NOT_SIMPLE.search(message):
+        return None
+    # "I fainted, what are my pills?" reads like a lookup but must reach the emergency flow
+    if EMERGENCY_KEYWORDS.search(message) or "emergency" in classify(message):
+        return None
+    matches = [name for name, (_, pattern) in FAST_INTENTS.items() if pattern.search(message)]
+    return matches[0] if len(matches) == 1 else None
+
+
+def tool_for(intent: str) -> str:
+    return FAST_INTENTS[intent][0]
+
+
+def _friendly_date(value: str) -> str:
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").strftime("%A, %d %B").replace(" 0", " ")
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def _render_medications(result: Dict[str, Any]) -> str:
+    meds = result.get("medications") or []
+    if not meds:
+        return "I don't see any medications on file for you. If that doesn't look right, please let your doctor know."
+    parts = []
+    for m in meds:
+        detail = ", ".join(x for x in (m.get("dosage"), m.get("frequency")) if x)
+        parts.append(f"{m['name']} ({detail})" if detail else m["name"])
+    noun, pronoun = ("medication", "it") if len(meds) == 1 else ("medications", "them")
+    return f"You're currently taking {len(meds)} {noun}: {'; '.join(parts)}. Please keep taking {pronoun} as your doctor prescribed."
+
+
+def _render_appointments(result: Dict[str, Any]) -> str:
+    today = date.today().isoformat()
+    upcoming = [
+        a for a in result.get("appointments") or []
+        if (a.get("date") or "") >= today and a.get("status") in ("pending", "accepted")
+    ]
+    upcoming.sort(key=lambda a: (a["date"], a.get("time") or ""))
+    if not upcoming:
+        return "You don't have any upcoming appointments right now. Would you like me to help you book one?"
+    nxt = upcoming[0]
+    status = "confirmed" if nxt["status"] == "accepted" else "waiting for the doctor's confirmation"
+    reply = (
+        f"Your next appointment is with {nxt.get('doctor_name') or 'your doctor'} on "
+        f"{_friendly_date(nxt['date'])} at {nxt.get('time')}, and it is {status}."
+    )
+    if len(upcoming) > 1:
+        more = len(upcoming) - 1
+        reply += f" You also have {more} more upcoming {'appointment' if more == 1 else 'appointments'}."
+    return reply
+
+
+def _render_health(result: Dict[str, Any]) -> str:
+    v = result.get("latest_vitals")
+    if not v:
+        return "I don't have any recent vitals on file for you yet. Once your readings sync, I can go through them with you."
+    reply = (
+        f"Your latest reading shows blood pressure {v.get('bp_systolic')}/{v.get('bp_diastolic')}, "
+        f"heart rate {v.get('heart_rate')} bpm and oxygen level {v.get('spo2')}%."
+    )
+    if (v.get("bp_systolic") or 0) >= 140 or (v.get("spo2") or 100) < 94:
+        reply += " Some of these are outside the usual range, so it would be good to mention them to your doctor."
+    else:
+        reply += " Those look steady. Keep it up!"
+    return reply
+
+
+RENDERERS = {
+    "medications": _render_medications,
+    "appointments": _render_appointments,
+    "health": _render_health,
+}
+
+
+def render(intent: str, result: Dict[str, Any]) -> str:
+    return RENDERERS[intent](result)
@@ -0,0 +1,219 @@
+"""
+Geocoded doctor index for distance-ranked doctor search.
+Each distinct doctors.hospital_name is resolved to coordinates once and stored in
+hospital_locations; doctors are then bucketed into a grid of ~11 km cells. A
+k-nearest query scans rings of cells outward from the patient and stops as soon as
+the next ring can't hold anyone closer than the k-th doctor found, so a search
+touches a handful of cells and never calls Overpass. A background job geocodes
+hospital names it hasn't seen yet and rebuilds the index, picking up new doctors.
+"""
+import os
+import math
+import heapq
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+KM_PER_DEGREE = 111.32
+
+Geocoder = Callable[[str], Awaitable[Optional[Tuple[float, float]]]]
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points in kilometers."""
+    R = 6371.0  # Earth's radius in km
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+    a = math.sin(dlat / 2)**2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon / 2)**2
+    return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def hospital_key(name: Optional[str]) -> str:
+    """Spelling-insensitive key so "St. Jude's Hospital" and "st judes hospital " share a location."""
+    return " ".join("".join(c for c in (name or "").lower() if c.isalnum() or c.isspace()).split())
+
+
+class GridIndex:
+    """Points bucketed by (lat, lng) cell for k-nearest queries."""
+
+    def __init__(self, cell_deg: float = 0.1):
+        self.cell_deg = cell_deg
+        self._cells: Dict[Tuple[int, int], List[Tuple[float, float, Any]]] = {}
+        self._bounds: Optional[Tuple[int, int, int, int]] = None
+        self.size = 0
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg)
+
+    def build(self, points: List[Tuple[float, float, Any]]):
+        cells: Dict[Tuple[int, int], List[Tuple[float, float, Any]]] = {}
+        for lat, lng, item in points:
+            cells.setdefault(self._cell(lat, lng), []).append((lat, lng, item))
+        self._cells = cells
+        self.size = len(points)
+        rows = [c[0] for c in cells]
+        cols = [c[1] for c in cells]
+        self._bounds = (min(rows), max(rows), min(cols), max(cols)) if cells else None
+
+    def nearest(self, lat: float, lng: float, k: int, max_km: Optional[float] = None) -> List[Tuple[float, Any]]:
+        """Up to k (distance_km, item) pairs, closest first, within max_km."""
+        if not self._bounds or k <= 0:
+            return []
+        row, col = self._cell(lat, lng)
+        min_row, max_row, min_col, max_col = self._bounds
+        max_ring = max(abs(row - min_row), abs(row - max_row), abs(col - min_col), abs(col - max_col))
+        # A cell in ring r is at least (r - 1) whole cells away; longitude cells narrow toward the poles.
+        cell_km = self.cell_deg * KM_PER_DEGREE * min(1.0, math.cos(math.radians(min(abs(lat) + self.cell_deg, 89.0))))
+
+        best: List[Tuple[float, int, Any]] = []  # max-heap of the k closest, as (-distance, seq, item)
+        seq = 0
+        for ring in range(max_ring + 1):
+            bound = max(ring - 1, 0) * cell_km
+            if (max_km is not None and bound > max_km) or (len(best) == k and bound > -best[0][0]):
+                break
+            for r in range(row - ring, row + ring + 1):
+                for c in range(col - ring, col + ring + 1):
+                    if max(abs(r - row), abs(c - col)) != ring:
+                        continue
+                    for plat, plng, item in self._cells.get((r, c), ()):
+                        d = haversine_km(lat, lng, plat, plng)
+                        if max_km is not None and d > max_km:
+                            continue
+                        seq += 1
+                        if len(best) < k:
+                            heapq.heappush(best, (-d, seq, item))
+                        elif d < -best[0][0]:
+                            heapq.heapreplace(best, (-d, seq, item))
+        return [(-neg, item) for neg, _, item in sorted(best, key=lambda e: (-e[0], e[1]))]
+
+
+class DoctorIndex:
+    def __init__(self, cell_deg: float = 0.1, refresh_interval: float = 600.0, geocode_interval: float = 1.0,
+                 geocode_hint: Optional[str] = None):
+        self.refresh_interval = refresh_interval
+        self.geocode_interval = geocode_interval  # Nominatim allows about one request per second
+        self.geocode_hint = geocode_hint
+        self.repo = None
+        self._geocode: Optional[Geocoder] = None
+        self._grid = GridIndex(cell_deg)
+        self._locations: Dict[str, Optional[Tuple[float, float]]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self._built = False
+        self.doctors = 0
+        self.geocoded = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._built
+
+    async def start(self, repo, geocode: Optional[Geocoder] = None):
+        """Build from the stored locations now; geocode new hospitals and rebuild in the background.
+        Never raises: until a build succeeds, doctor search lists every doctor unranked."""
+        if self._task:
+            return
+        self._geocode = geocode
+        self.repo = repo
+        if not await self.try_rebuild(repo):
+            print(f"[AgentCare] Doctor index unavailable; retrying every {self.refresh_interval:.0f}s")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await self.try_rebuild(self.repo, geocode_missing=True)
+            await asyncio.sleep(self.refresh_interval)
+
+    async def try_rebuild(self, repo, geocode_missing: bool = False) -> bool:
+        """rebuild() that logs instead of raising; the last good grid (if any) stays in use."""
+        try:
+            await self.rebuild(repo, geocode_missing=geocode_missing)
+            return True
+        except Exception as e:
+            print(f"[AgentCare] Doctor index rebuild failed: {e}")
+            return False
+
+    async def rebuild(self, repo, geocode_missing: bool = False):
+        """Reload doctors and hospital locations (two queries) and swap in a fresh grid."""
+        async with self._lock:
+            self.repo = repo
+            doctors, locations = await asyncio.gather(repo.list_doctors(), repo.hospital_locations())
+            self._locations = {
+                row["name_key"]: (row["latitude"], row["longitude"]) if row.get("latitude") is not None else None
+                for row in locations
+            }
+            if geocode_missing and self._geocode is not None:
+                await self._geocode_missing(doctors)
+
+            points, unlocated = [], 0
+            for d in doctors:
+                coords = self._locations.get(hospital_key(d.get("hospital_name")))
+                if coords is None:
+                    unlocated += 1
+                    continue
+                points.append((coords[0], coords[1], d))
+            self._grid.build(points)
+            self._built = True
+            self.doctors = len(doctors)
+            if unlocated:
+                print(f"[AgentCare] Doctor index: {len(points)} doctors located, {unlocated} without a known hospital location")
+
+    async def _geocode_missing(self, doctors: List[Dict[str, Any]]):
+        names: Dict[str, str] = {}
+        for d in doctors:
+            key = hospital_key(d.get("hospital_name"))
+            if key and key not in self._locations:
+                names.setdefault(key, d["hospital_name"].strip())
+        for i, (key, name) in enumerate(names.items()):
+            if i:
+                await asyncio.sleep(self.geocode_interval)
+            await self.locate_hospital(name, key)
+
+    async def locate_hospital(self, name: str, key: Optional[str] = None) -> Optional[Tuple[float, float]]:
+        """Geocode one hospital name and store it; also usable when a doctor's hospital is written."""
+        key = key or hospital_key(name)
+        query = f"{name}, {self.geocode_hint}" if self.geocode_hint else name
+        try:
+            coords = await self._geocode(query)
+        except Exception as e:
+            print(f"[AgentCare] Could not geocode hospital {name!r}: {e}")
+            return None  # transient; retried on the next refresh
+        # Unresolvable names are stored too (NULL coordinates) so they aren't looked up every refresh
+        await self.repo.upsert_hospital_locations([{
+            "name_key": key, "name": name,
+            "latitude": coords[0] if coords else None, "longitude": coords[1] if coords else None,
+        }])
+        self._locations[key] = coords
+        self.geocoded += 1
+        return coords
+
+    def nearest(self, lat: float, lng: float, k: int = 20, max_km: Optional[float] = None) -> List[Dict[str, Any]]:
+        """The k doctors closest to (lat, lng), each with distance_km, closest first."""
+        return [{**d, "distance_km": round(km, 2)} for km, d in self._grid.nearest(lat, lng, k, max_km)]
+
+    def snapshot(self) -> Dict[str, int]:
+        return {
+            "doctors": self.doctors,
+            "located": self._grid.size,
+            "hospitals": sum(1 for c in self._locations.values() if c is not None),
+            "unresolved": sum(1 for c in self._locations.values() if c is None),
+            "geocoded": self.geocoded,
+        }
+
+
+_doctor_index: Optional[DoctorIndex] = None
+
+
+def get_doctor_index() -> DoctorIndex:
+    """Process-wide doctor index, configured from the environment on first use."""
+    global _doctor_index
+    if _doctor_index is None:
+        _doctor_index = DoctorIndex(
+            refresh_interval=float(os.environ.get("DOCTOR_INDEX_REFRESH_SECONDS", "600")),
+            geocode_hint=os.environ.get("HOSPITAL_GEOCODE_HINT") or None,
+        )
+    return _doctor_index
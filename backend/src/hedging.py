@@ -0,0 +1,71 @@
+"""
+Hedged requests for slow, replicated upstreams (Overpass mirrors).
+The first attempt goes to the preferred endpoint. If it hasn't answered by the time
+a latency percentile of recent successful calls has passed, the same request goes
+to the next mirror as well; the first success wins and the others are cancelled. An
+attempt that fails outright moves on to the next mirror immediately.
+"""
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, List, Optional, Tuple
+
+from metrics import HEDGED_REQUESTS
+
+
+class LatencyTracker:
+    """Rolling window of recent successful call durations."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+async def hedged(
+    name: str, attempts: List[Callable[[], Awaitable[Any]]], hedge_after: float,
+) -> Tuple[Any, int]:
+    """Run attempts in order, hedging after `hedge_after` seconds. Returns (result, index of
+    the attempt that won). Raises the last error when every attempt fails."""
+    pending = set()
+    started = 0
+    last_error: Optional[BaseException] = None
+
+    def launch():
+        nonlocal started
+        task = asyncio.ensure_future(attempts[started]())
+        task.index = started
+        pending.add(task)
+        started += 1
+
+    launch()
+    try:
+        while pending:
+            done, _ = await asyncio.wait(
+                pending, timeout=hedge_after if started < len(attempts) else None,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if not done:
+                HEDGED_REQUESTS.inc(upstream=name, result="hedged")
+                launch()
+                continue
+            for task in done:
+                pending.discard(task)
+                if task.exception() is None:
+                    if task.index > 0:
+                        HEDGED_REQUESTS.inc(upstream=name, result="hedge_won")
+                    return task.result(), task.index
+                last_error = task.exception()
+            if not pending and started < len(attempts):
+                launch()
+        raise last_error
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,82 @@
+"""
+Local intent classifier used to pick the tool subset sent to the LLM each turn.
+Pure keyword matching — no network, microseconds per message.
+"""
+import re
+from typing import Dict, List, Optional, Set
+
+EMERGENCY_KEYWORDS = re.compile(
+    r"\b(emergency|can't breathe|chest pain|heart attack|stroke|unconscious|fainted|dying|collapsed)\b",
+    re.IGNORECASE,
+)
+
+INTENT_PATTERNS: Dict[str, re.Pattern] = {
+    "emergency": re.compile(
+        r"\b(emergency|urgent|help me|ambulance|can'?t breathe|chest pain|heart attack|stroke|unconscious|"
+        r"fainted|dying|collapsed|fell|fallen|bleeding|alert (my|the) (family|guardian|son|daughter))\b",
+        re.IGNORECASE,
+    ),
+    "booking": re.compile(
+        r"\b(book|appointment|schedule|see a doctor|consult|checkup|check-up|visit)\b",
+        re.IGNORECASE,
+    ),
+    "symptoms": re.compile(
+        r"\b(pain|ache|aching|hurts?|fever|cough|cold|dizzy|dizziness|nausea|vomit\w*|swelling|swollen|"
+        r"rash|itch\w*|tired|fatigue|headache|breathless|sore|cramp\w*|injur\w*|sick|unwell)\b",
+        re.IGNORECASE,
+    ),
+    "doctors": re.compile(r"\b(doctors?|specialists?|physicians?|cardiologist|dentist|dr\.?)\b", re.IGNORECASE),
+    "hospital": re.compile(r"\b(hospitals?|clinics?|nearest|nearby|near me|medical cent(er|re))\b", re.IGNORECASE),
+    "appointments": re.compile(r"\b(appointments?|booked|upcoming|next visit|when do i see)\b", re.IGNORECASE),
+    "medications": re.compile(r"\b(medications?|medicines?|meds|pills?|tablets?|prescriptions?|dosage|dose)\b", re.IGNORECASE),
+    "health": re.compile(
+        r"\b(vitals?|blood pressure|bp|heart rate|pulse|spo2|oxygen|health|summary|how am i doing)\b",
+        re.IGNORECASE,
+    ),
+}
+
+SMALL_TALK = re.compile(
+    r"^\s*(hi|hello|hey|good (morning|afternoon|evening|night)|thanks?( you)?|thank you|ok(ay)?|bye|goodbye|"
+    r"how are you)\b[\s!.?,]*\w{0,12}[\s!.?]*$",
+    re.IGNORECASE,
+)
+
+INTENT_TOOLS: Dict[str, List[str]] = {
+    "emergency": ["emergency_response", "find_nearest_hospital", "send_emergency_alert", "get_health_summary"],
+    "booking": ["get_available_doctors", "find_available_slots", "book_appointment"],
+    "symptoms": ["book_appointment", "find_available_slots"],
+    "doctors": ["get_available_doctors", "find_available_slots"],
+    "hospital": ["find_nearest_hospital"],
+    "appointments": ["get_appointments", "status_overview"],
+    "medications": ["get_medications"],
+    "health": ["get_health_summary", "status_overview"],
+}
+
+
+def classify(message: str, history: Optional[List[Dict[str, str]]] = None) -> Set[str]:
+    """Return the intents in the current message. A bare answer to an intake
+    question (e.g. describing symptoms) inherits the intents of the previous user turn."""
+    intents = {name for name, pattern in INTENT_PATTERNS.items() if pattern.search(message)}
+    if history and ("symptoms" in intents or not intents):
+        for prev in reversed(history):
+            if prev["role"] == "user":
+                prev_intents = {n for n, p in INTENT_PATTERNS.items() if p.search(prev["content"] or "")}
+                intents |= prev_intents & {"booking", "emergency"}
+                break
+    return intents
+
+
+def select_tool_names(message: str, history: Optional[List[Dict[str, str]]] = None) -> Optional[List[str]]:
+    """Tool names relevant to this turn. [] means no tools (small talk);
+    None means the turn couldn't be classified and every tool should be sent."""
+    intents = classify(message, history)
+    if not intents:
+        return [] if SMALL_TALK.match(message) else None
+    names: List[str] = []
+    for intent, tools in INTENT_TOOLS.items():
+        if intent not in intents:
+            continue
+        for tool in tools:
+            if tool not in names:
+                names.append(tool)
+    return names
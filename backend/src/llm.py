@@ -0,0 +1,211 @@
+"""
+LLM provider interface shared by the orchestrator and the pre-visit agent.
+GroqProvider talks to Groq; FakeLLMProvider is a deterministic local stand-in that
+replays scripted tool calls and text with configurable latency and 429 injection,
+so the agentic loop can be exercised and benchmarked with no network.
+"""
+import os
+import re
+import json
+import math
+import time
+import random
+import asyncio
+import itertools
+from typing import Dict, Any, List, Optional, Callable, Union
+
+from context_budget import estimate_tokens, count_message_tokens
+
+
+class LLMProvider:
+    """Chat-completions provider. `complete` takes and returns the OpenAI/Groq wire shape."""
+    name = "base"
+
+    def complete(self, **kwargs) -> Any:
+        raise NotImplementedError
+
+    async def acomplete(self, **kwargs) -> Any:
+        # SDK clients are synchronous; keep them off the event loop by default.
+        return await asyncio.to_thread(self.complete, **kwargs)
+
+
+class GroqProvider(LLMProvider):
+    name = "groq"
+
+    def __init__(self, api_key: str):
+        from groq import Groq
+        self.client = Groq(api_key=api_key)
+
+    def complete(self, **kwargs) -> Any:
+        return self.client.chat.completions.create(**kwargs)
+
+
+# ── Fake provider ──────────────────────────────────────────────────────────────
+
+class FakeRateLimitError(Exception):
+    """Mirrors the text of Groq's 429 so the orchestrator's fallback logic triggers."""
+
+    def __init__(self):
+        super().__init__("Error code: 429 - {'error': {'type': 'rate_limit_exceeded', 'message': 'Rate limit reached (fake)'}}")
+
+
+class _Obj:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+def _response(content: Optional[str], tool_calls: Optional[List[_Obj]], prompt_tokens: int) -> _Obj:
+    message = _Obj(role="assistant", content=content, tool_calls=tool_calls)
+    completion = estimate_tokens(content) + sum(estimate_tokens(tc.function.arguments) for tc in tool_calls or [])
+    return _Obj(
+        choices=[_Obj(index=0, message=message, finish_reason="tool_calls" if tool_calls else "stop")],
+        usage=_Obj(prompt_tokens=prompt_tokens, completion_tokens=completion, total_tokens=prompt_tokens + completion),
+    )
+
+
+def fixed_latency(seconds: float) -> Callable[[], float]:
+    return lambda: seconds
+
+
+def uniform_latency(low: float, high: float, rng: Optional[random.Random] = None) -> Callable[[], float]:
+    rng = rng or random.Random()
+    return lambda: rng.uniform(low, high)
+
+
+def lognormal_latency(median: float, sigma: float = 0.5, rng: Optional[random.Random] = None) -> Callable[[], float]:
+    """Right-skewed latency with a long tail, which is what hosted LLM APIs look like."""
+    rng = rng or random.Random()
+    mu = math.log(median)
+    return lambda: rng.lognormvariate(mu, sigma)
+
+
+DEFAULT_SCRIPTS: Dict[str, List[Any]] = {
+    r"chest pain|can't breathe|emergency|collapsed|fell": [
+        {"tool_calls": [{"name": "emergency_response", "arguments": {"message": "{message}"}}]},
+        "I am finding a hospital near you and alerting your family right now. Please stay calm.",
+    ],
+    r"hospital|clinic": [
+        {"tool_calls": [{"name": "find_nearest_hospital"}]},
+        "I found a few hospitals close to you. The nearest one is just a short distance away.",
+    ],
+    r"\b(pain|hurts?|ache|fever|cough|dizzy)\b": [
+        {"tool_calls": [{"name": "book_appointment", "arguments": {
+            "doctor_name": "best match", "reason": "Consultation", "patient_notes": "{message}"}}]},
+        "I've booked an appointment for you. The doctor will confirm it soon.",
+    ],
+    r"book|appointment": ["Of course. Could you tell me a little bit about what symptoms you're experiencing?"],
+    r"medication|medicine|pills": [
+        {"tool_calls": [{"name": "get_medications"}]},
+        "Here are your current medications. Please keep taking them as prescribed.",
+    ],
+    r"how am i doing|overview|my status": [
+        {"tool_calls": [{"name": "status_overview"}]},
+        "Your readings look steady, and I've listed your upcoming appointments.",
+    ],
+    r"vitals|blood pressure|health": [
+        {"tool_calls": [{"name": "get_health_summary"}]},
+        "Your latest readings look steady.",
+    ],
+}
+
+
+class FakeLLMProvider(LLMProvider):
+    """Scripted, network-free provider.
+
+    `scripts` maps a regex (matched against the latest user message) to a list of
+    steps. A step is either reply text or {"tool_calls": [{"name", "arguments"}]};
+    "{message}" in a string argument is replaced by the user's message.
+    The step index is the number of assistant turns since that user message, so the
+    provider is stateless per conversation and safe under concurrency.
+    """
+    name = "fake"
+
+    def __init__(
+        self,
+        scripts: Optional[Dict[str, List[Any]]] = None,
+        default_reply: str = "I'm here to help. How are you feeling today?",
+        latency: Union[float, Callable[[], float]] = 0.0,
+        rate_limit_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.scripts = [(re.compile(p, re.IGNORECASE), steps) for p, steps in (scripts or DEFAULT_SCRIPTS).items()]
+        self.default_reply = default_reply
+        self.latency = latency if callable(latency) else fixed_latency(latency)
+        self.rate_limit_rate = rate_limit_rate
+        self._rng = random.Random(seed)
+        self._ids = itertools.count(1)
+        self.calls = 0
+        self.rate_limited = 0
+
+    def _respond(self, kwargs: Dict[str, Any]) -> Any:
+        self.calls += 1
+        if self.rate_limit_rate and self._rng.random() < self.rate_limit_rate:
+            self.rate_limited += 1
+            raise FakeRateLimitError()
+
+        messages = kwargs.get("messages") or []
+        prompt_tokens = count_message_tokens(messages, kwargs.get("tools"))
+        last_user = max((i for i, m in enumerate(messages) if m.get("role") == "user"), default=-1)
+        user_text = messages[last_user]["content"] if last_user >= 0 else ""
+        step_index = sum(1 for m in messages[last_user + 1:] if m.get("role") == "assistant")
+
+        steps = next((steps for pattern, steps in self.scripts if pattern.search(user_text or "")), None)
+        if not steps:
+            return _response(self.default_reply, None, prompt_tokens)
+        step = steps[min(step_index, len(steps) - 1)]
+        if isinstance(step, str) or not kwargs.get("tools"):
+            text = step if isinstance(step, str) else self.default_reply
+            return _response(text, None, prompt_tokens)
+
+        sent = {t["function"]["name"] for t in kwargs.get("tools") or []}
+        tool_calls = []
+        for call in step["tool_calls"]:
+            if call["name"] not in sent:
+                # Same failure Groq returns when the model calls a tool that wasn't offered.
+                raise RuntimeError(
+                    f"Error code: 400 - tool call validation failed: attempted to call tool "
+                    f"'{call['name']}' which was not in request.tools"
+                )
+            arguments = {k: v.replace("{message}", user_text or "") if isinstance(v, str) else v
+                         for k, v in (call.get("arguments") or {}).items()}
+            tool_calls.append(_Obj(
+                id=f"call_{next(self._ids)}",
+                type="function",
+                function=_Obj(name=call["name"], arguments=json.dumps(arguments)),
+            ))
+        return _response(None, tool_calls, prompt_tokens)
+
+    def complete(self, **kwargs) -> Any:
+        delay = self.latency()
+        if delay:
+            time.sleep(delay)
+        return self._respond(kwargs)
+
+    async def acomplete(self, **kwargs) -> Any:
+        delay = self.latency()
+        if delay:
+            await asyncio.sleep(delay)
+        return self._respond(kwargs)
+
+
+def create_llm_provider() -> LLMProvider:
+    """Pick the provider from LLM_PROVIDER (groq by default, or fake for offline runs)."""
+    if os.environ.get("LLM_PROVIDER", "groq").lower() == "fake":
+        scripts = None
+        script_path = os.environ.get("FAKE_LLM_SCRIPT")
+        if script_path:
+            with open(script_path) as f:
+                scripts = json.load(f)
+        latency_s = float(os.environ.get("FAKE_LLM_LATENCY_MS", "300")) / 1000
+        seed = int(os.environ["FAKE_LLM_SEED"]) if os.environ.get("FAKE_LLM_SEED") else None
+        return FakeLLMProvider(
+            scripts=scripts,
+            latency=lognormal_latency(latency_s, rng=random.Random(seed)) if latency_s > 0 else 0.0,
+            rate_limit_rate=float(os.environ.get("FAKE_LLM_429_RATE", "0")),
+            seed=seed,
+        )
+
+    api_key = os.environ.get("GROQ_API_KEY")
+    if not api_key:
+        raise ValueError("GROQ_API_KEY is required in .env")
+    return GroqProvider(api_key)
@@ -3,19 +3,112 @@ AgentCare Backend — FastAPI Server
 Provides the /chat endpoint for the AI chatbot system.
 """
 import os
-from fastapi import FastAPI, HTTPException
+import time
+import json
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import PlainTextResponse, JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
-from supabase import create_client, Client
 from pydantic import BaseModel
 from typing import Optional, List, Dict
 
 from orchestrator import AgentOrchestrator
 from agents.previsit_agent import PreVisitAgent
+from agents.previsit_bulk import BulkReportRunner
+from agents.alerts import get_alert_outbox
+from agents.tools import close_http_client, find_available_slots, geocode_place
+from llm import LLMProvider, create_llm_provider
+from data import Repository, create_repository
+from pubsub import get_report_broker
+from audit import get_audit_log
+from geo_index import get_doctor_index
+from metrics import request_scope, render_prometheus, HTTP_REQUEST_SECONDS, CHAT_ITERATIONS
 
 load_dotenv()
 
-app = FastAPI(title="AgentCare Backend")
+
+# ── Shared clients ─────────────────────────────────────────────────────────────
+# Built once, on first use, and shared by every agent. Nothing connects at import time,
+# so importing the app (tests, tooling, worker recycling) stays cheap; the lifespan
+# warms them up before the first request is served.
+
+_repo: Optional[Repository] = None
+_llm: Optional[LLMProvider] = None
+_orchestrator: Optional[AgentOrchestrator] = None
+_previsit_agent: Optional[PreVisitAgent] = None
+_bulk_runner: Optional[BulkReportRunner] = None
+
+
+def get_repo() -> Repository:
+    """Data access (Supabase, or local SQLite with DATA_BACKEND=sqlite)."""
+    global _repo
+    if _repo is None:
+        _repo = create_repository()
+    return _repo
+
+
+def get_llm() -> LLMProvider:
+    """One LLM provider (Groq, or the local fake with LLM_PROVIDER=fake) shared by both agents."""
+    global _llm
+    if _llm is None:
+        _llm = create_llm_provider()
+    return _llm
+
+
+def get_orchestrator() -> AgentOrchestrator:
+    global _orchestrator
+    if _orchestrator is None:
+        _orchestrator = AgentOrchestrator(get_repo(), get_llm())
+    return _orchestrator
+
+
+def get_previsit_agent() -> PreVisitAgent:
+    global _previsit_agent
+    if _previsit_agent is None:
+        _previsit_agent = PreVisitAgent(get_repo(), get_llm())
+    return _previsit_agent
+
+
+def get_bulk_runner() -> BulkReportRunner:
+    global _bulk_runner
+    if _bulk_runner is None:
+        _bulk_runner = BulkReportRunner(
+            get_previsit_agent(),
+            concurrency=int(os.environ.get("REPORT_BULK_CONCURRENCY", "4")),
+            requests_per_minute=float(os.environ.get("REPORT_BULK_RPM", "30")),
+        )
+    return _bulk_runner
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    get_orchestrator()
+    get_previsit_agent()
+    # Alert outbox workers live for the whole app; pending alerts resume on restart.
+    outbox = get_alert_outbox()
+    await outbox.start()
+    # Agent audit events are buffered in memory and written to mcp_events in batches.
+    audit = get_audit_log()
+    await audit.start(get_repo())
+    # Doctor search ranks by distance to geocoded hospitals; new hospital names resolve in the background.
+    doctor_index = get_doctor_index()
+    await doctor_index.start(get_repo(), geocode=geocode_place)
+    print(f"[AgentCare] Ready in {(time.perf_counter() - started) * 1000:.0f} ms")
+    yield
+    if _bulk_runner is not None:
+        for job in _bulk_runner.jobs.values():
+            if job.task and not job.task.done():
+                job.task.cancel()
+    await doctor_index.stop()
+    await outbox.stop()
+    await audit.stop()
+    await close_http_client()
+
+
+app = FastAPI(title="AgentCare Backend", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -25,14 +118,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize Supabase
-supabase_url = os.environ.get("SUPABASE_URL")
-supabase_key = os.environ.get("SUPABASE_KEY")
-supabase: Client = create_client(supabase_url, supabase_key)
-
-orchestrator = AgentOrchestrator(supabase)
-previsit_agent = PreVisitAgent(supabase)
 
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    """Tag each request with an ID (echoed as X-Request-ID) and record its latency per route."""
+    with request_scope(request.headers.get("X-Request-ID")) as request_id:
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+        finally:
+            # Label by route template, not raw path, so IDs in URLs don't explode cardinality
+            route = request.scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, method=request.method, path=path, status=status)
+    response.headers["X-Request-ID"] = request_id
+    return response
 
 class ChatMessage(BaseModel):
     role: str
@@ -52,13 +154,30 @@ async def root():
     return {"status": "AgentCare Backend Online"}
 
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint."""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+# End-to-end budget for one /chat turn; past it the agent answers with what it has
+CHAT_DEADLINE_SECONDS = float(os.environ.get("CHAT_DEADLINE_SECONDS", "30"))
+
+
 @app.post("/chat")
 async def chat(req: ChatRequest):
     """Process a chat message through the AI agent."""
     try:
         print(f"[AgentCare] Chat request: {req.message} | Lat: {req.lat}, Lng: {req.lng}")
         history_dicts = [{"role": m.role, "content": m.content} for m in req.history] if req.history else []
-        result = await orchestrator.chat(req.patient_id, req.message, history_dicts, lat=req.lat, lng=req.lng)
+        result = await get_orchestrator().chat(
+            req.patient_id, req.message, history_dicts, lat=req.lat, lng=req.lng, timeout=CHAT_DEADLINE_SECONDS,
+        )
+        CHAT_ITERATIONS.observe(
+            (result.get("usage") or {}).get("llm_calls", 0),
+            route="fast_path" if result.get("fast_path") else "shed" if result.get("shed")
+            else "partial" if result.get("partial") else "llm",
+        )
         return result
     except Exception as e:
         print(f"[AgentCare] Error: {e}")
@@ -66,6 +185,7 @@ async def chat(req: ChatRequest):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+
 class LocationRequest(BaseModel):
     latitude: float
     longitude: float
@@ -81,8 +201,30 @@ async def nearby_hospitals(req: LocationRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/availability")
+async def availability(
+    specialty: Optional[str] = None,
+    doctor_name: Optional[str] = None,
+    date_from: Optional[str] = None,
+    days: int = 14,
+    limit: int = 5,
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None,
+):
+    """Earliest open appointment slots across suitable doctors (nearby ones when a location is given)."""
+    result = await find_available_slots(
+        get_repo(), specialty=specialty, doctor_name=doctor_name, date_from=date_from,
+        days=days, limit=min(max(limit, 1), 50), user_lat=latitude, user_lng=longitude,
+    )
+    if result.get("error"):
+        raise HTTPException(status_code=400, detail=result["error"])
+    return result
+
+
 # ── Pre-Visit Endpoints ────────────────────────────────────────────────────────
 
+SSE_KEEPALIVE_SECONDS = 15.0
+
 class PreVisitInterviewRequest(BaseModel):
     appointment_id: str
     appointment_reason: str
@@ -94,7 +236,7 @@ async def previsit_interview_turn(req: PreVisitInterviewRequest):
     """Process a turn in the pre-visit interview. Generates next question AND live report draft."""
     try:
         # 1. Get the next question (or conclude)
-        turn_result = previsit_agent.conduct_interview_turn(
+        turn_result = await get_previsit_agent().conduct_interview_turn(
             appointment_reason=req.appointment_reason,
             patient_id=req.patient_id,
             chat_history=req.chat_history
@@ -102,7 +244,7 @@ async def previsit_interview_turn(req: PreVisitInterviewRequest):
         
         # 2. Generate the live report draft
         # If the interview is complete, passing is_final=True saves it as 'completed'
-        report = previsit_agent.generate_report(
+        report = await get_previsit_agent().generate_report(
             appointment_id=req.appointment_id,
             patient_id=req.patient_id,
             appointment_reason=req.appointment_reason,
@@ -122,22 +264,106 @@ async def previsit_interview_turn(req: PreVisitInterviewRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
 @app.get("/api/previsit/report/{appointment_id}")
-async def get_previsit_report(appointment_id: str):
-    """Fetch the pre-visit report for a specific appointment."""
+async def get_previsit_report(appointment_id: str, request: Request):
+    """Fetch the pre-visit report for a specific appointment. Honours If-None-Match (304)."""
     try:
-        res = supabase.table("appointments").select(
-            "pre_visit_report, pre_visit_status"
-        ).eq("id", appointment_id).execute()
-        if not res.data:
+        broker = get_report_broker()
+        if_none_match = request.headers.get("if-none-match")
+        # A draft this process just saved (or served) answers the revalidation without a query
+        known = broker.latest(appointment_id)
+        if known and _etag_matches(if_none_match, known[0]):
+            return Response(status_code=304, headers={"ETag": known[0]})
+
+        report = await get_repo().appointment_report(appointment_id)
+        if report is None:
             raise HTTPException(status_code=404, detail="Appointment not found")
-        return res.data[0]
+        etag = broker.remember(appointment_id, report)
+        if _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        return JSONResponse(report, headers={"ETag": etag, "Cache-Control": "no-cache"})
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/previsit/report/{appointment_id}/stream")
+async def stream_previsit_report(appointment_id: str, request: Request):
+    """Server-Sent Events: the current report, then every new draft as the interview progresses."""
+    broker = get_report_broker()
+    # Subscribe before reading so a draft saved in between isn't missed
+    queue = broker.subscribe(appointment_id)
+    try:
+        known = broker.latest(appointment_id)
+        if known:
+            etag, report = known
+        else:
+            report = await get_repo().appointment_report(appointment_id)
+            if report is None:
+                raise HTTPException(status_code=404, detail="Appointment not found")
+            etag = broker.remember(appointment_id, report)
+    except BaseException:
+        broker.unsubscribe(appointment_id, queue)
+        raise
+
+    def event(etag: str, report: Dict) -> str:
+        return f"id: {etag}\nevent: report\ndata: {json.dumps(report)}\n\n"
+
+    async def events():
+        try:
+            if request.headers.get("last-event-id") != etag:
+                yield event(etag, report)
+            if report.get("pre_visit_status") == "completed":
+                return
+            while True:
+                try:
+                    next_etag, next_report = await asyncio.wait_for(queue.get(), SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keepalive\n\n"
+                    continue
+                yield event(next_etag, next_report)
+                if next_report.get("pre_visit_status") == "completed":
+                    return
+        finally:
+            broker.unsubscribe(appointment_id, queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+
+class BulkReportRequest(BaseModel):
+    doctor_id: str
+    date_from: str
+    date_to: Optional[str] = None
+    force: bool = False
+
+
+@app.post("/api/previsit/bulk-reports", status_code=202)
+async def start_bulk_reports(req: BulkReportRequest):
+    """Prepare pre-visit reports for all of a doctor's appointments in a date range (background job)."""
+    job = get_bulk_runner().start(req.doctor_id, req.date_from, req.date_to, force=req.force)
+    return job.progress()
+
+
+@app.get("/api/previsit/bulk-reports/{job_id}")
+async def bulk_reports_progress(job_id: str):
+    job = get_bulk_runner().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.progress()
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
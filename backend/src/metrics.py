@@ -0,0 +1,190 @@
+"""
+Lightweight hot-path instrumentation.
+Span-style timers for LLM calls, tool executions, database queries and outbound HTTP,
+tagged with the current request ID, plus Prometheus-format counters and histograms
+served at /metrics. Dependency-free; recording a span is a perf_counter pair, a bisect
+and a couple of dict updates, cheap enough to leave on in production.
+"""
+import os
+import time
+import uuid
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple, Iterator, Any
+
+INF_LABEL = 'le="+Inf"'
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+_trace_var: contextvars.ContextVar[Optional[List[Tuple[str, str, float]]]] = contextvars.ContextVar("trace", default=None)
+
+SLOW_REQUEST_SECONDS = float(os.environ.get("SLOW_REQUEST_SECONDS", "5"))
+
+
+def _label_key(labelnames: Tuple[str, ...], labels: Dict[str, Any]) -> Tuple[str, ...]:
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _escape(value: str) -> str:
+    """Escape a label value for the Prometheus text format."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(labelnames, values) if v != ""]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(self.labelnames, labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, v in sorted(self._values.items()):
+            lines.append(f"{self.name}{_fmt_labels(self.labelnames, key)} {v:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames, self.buckets = name, help, labelnames, buckets
+        self._series: Dict[Tuple[str, ...], List[float]] = {}  # per-bucket counts + [sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 3)
+            series[idx] += 1  # idx == len(buckets) is the +Inf overflow slot
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self._series.items()):
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = 'le="%g"' % bound
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, key, le)} {cumulative:g}")
+            labels = _fmt_labels(self.labelnames, key)
+            lines.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, key, INF_LABEL)} {series[-1]:g}")
+            lines.append(f"{self.name}_sum{labels} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{labels} {series[-1]:g}")
+        return lines
+
+
+# ── Registry ───────────────────────────────────────────────────────────────────
+
+SPAN_SECONDS = Histogram(
+    "agentcare_span_duration_seconds", "Duration of instrumented operations.", ("kind", "name", "status"))
+HTTP_REQUEST_SECONDS = Histogram(
+    "agentcare_http_request_duration_seconds", "Duration of inbound HTTP requests.", ("method", "path", "status"))
+LLM_TOKENS = Counter("agentcare_llm_tokens_total", "LLM tokens reported by the provider.", ("agent", "type"))
+LLM_CALLS = Counter("agentcare_llm_calls_total", "LLM completion calls.", ("agent", "model", "status"))
+TOOL_CALLS = Counter("agentcare_tool_calls_total", "Tool executions in the orchestrator.", ("tool", "cached"))
+TOOL_CACHE = Counter("agentcare_tool_cache_lookups_total", "Read-only tool cache lookups.", ("result",))
+CHAT_ITERATIONS = Histogram(
+    "agentcare_chat_llm_iterations", "LLM calls per /chat request (0 for fast-path answers).", ("route",),
+    buckets=(0, 1, 2, 3, 4, 5, 6, 8))
+DB_QUERIES = Counter("agentcare_db_queries_total", "Database round trips by repository operation.", ("backend", "op"))
+ADMISSIONS = Counter(
+    "agentcare_chat_admissions_total", "Chat admission decisions (admitted or shed, by reason).", ("result", "priority"))
+ADMISSION_WAIT_SECONDS = Histogram(
+    "agentcare_chat_admission_wait_seconds", "Time chat turns spent queued for an LLM session.", ("priority",))
+COALESCED_CALLS = Counter(
+    "agentcare_coalesced_calls_total", "Singleflight lookups: leaders hit upstream, followers shared a flight.", ("flight", "role"))
+AUDIT_EVENTS = Counter(
+    "agentcare_audit_events_total", "Audit log events by outcome (recorded, written, spilled, dropped).", ("result",))
+PREFETCHES = Counter(
+    "agentcare_prefetch_total", "Speculative tool prefetches (started, then hit or wasted).", ("tool", "result"))
+HEDGED_REQUESTS = Counter(
+    "agentcare_hedged_requests_total", "Hedged upstream requests (hedged = second attempt sent).", ("upstream", "result"))
+DEADLINE_EXCEEDED = Counter(
+    "agentcare_deadline_exceeded_total", "Steps cut short by the request deadline.", ("stage",))
+
+REGISTRY = [
+    HTTP_REQUEST_SECONDS, SPAN_SECONDS, LLM_CALLS, LLM_TOKENS, TOOL_CALLS, TOOL_CACHE, CHAT_ITERATIONS, DB_QUERIES,
+    ADMISSIONS, ADMISSION_WAIT_SECONDS, COALESCED_CALLS, AUDIT_EVENTS, PREFETCHES,
+    HEDGED_REQUESTS, DEADLINE_EXCEEDED,
+]
+
+
+def render_prometheus() -> str:
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ── Spans ──────────────────────────────────────────────────────────────────────
+
+@contextmanager
+def span(kind: str, name: str) -> Iterator[None]:
+    """Time a block as one span (kind: llm, tool, db, http, sms). Usable around awaits."""
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        SPAN_SECONDS.observe(elapsed, kind=kind, name=name, status=status)
+        trace = _trace_var.get()
+        if trace is not None:
+            trace.append((kind, name, elapsed))
+
+
+@contextmanager
+def request_scope(request_id: Optional[str] = None) -> Iterator[str]:
+    """Bind a request ID and collect this request's spans for the slow-request breakdown."""
+    rid = request_id or uuid.uuid4().hex[:12]
+    rid_token = request_id_var.set(rid)
+    trace: List[Tuple[str, str, float]] = []
+    trace_token = _trace_var.set(trace)
+    started = time.perf_counter()
+    try:
+        yield rid
+    finally:
+        elapsed = time.perf_counter() - started
+        _trace_var.reset(trace_token)
+        request_id_var.reset(rid_token)
+        if elapsed >= SLOW_REQUEST_SECONDS and trace:
+            print(f"[Metrics] Slow request {rid} ({elapsed * 1000:.0f} ms): {summarize_trace(trace)}")
+
+
+def summarize_trace(trace: List[Tuple[str, str, float]]) -> str:
+    totals: Dict[str, float] = {}
+    for kind, name, elapsed in trace:
+        label = f"{kind}:{name}"
+        totals[label] = totals.get(label, 0.0) + elapsed
+    ranked = sorted(totals.items(), key=lambda kv: kv[1], reverse=True)
+    return ", ".join(f"{label}={secs * 1000:.0f}ms" for label, secs in ranked)
+
+
+def record_llm_usage(agent: str, model: str, response: Any):
+    LLM_CALLS.inc(agent=agent, model=model, status="ok")
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        LLM_TOKENS.inc(getattr(usage, "prompt_tokens", 0) or 0, agent=agent, type="prompt")
+        LLM_TOKENS.inc(getattr(usage, "completion_tokens", 0) or 0, agent=agent, type="completion")
@@ -4,12 +4,12 @@ Uses Groq (LLaMA 3.3 70B) function-calling to interpret user messages and autono
 """
 import os
 import json
+import time
 import asyncio
 import re
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 
-from groq import Groq
-from supabase import Client
+from data import Repository
 
 from agents.tools import (
     get_health_summary,
@@ -19,7 +19,31 @@ from agents.tools import (
     send_emergency_alert,
     get_medications,
     get_available_doctors,
+    find_available_slots,
 )
+from tool_cache import ToolResultCache, READ_ONLY_TOOLS, WRITE_TOOLS
+from context_budget import ContextManager, UsageMeter, count_message_tokens
+from intents import EMERGENCY_KEYWORDS, classify, select_tool_names
+from admission import AdmissionController, AdmissionRejected, priority_for, EMERGENCY, PRIORITY_NAMES
+import fast_router
+from llm import LLMProvider, create_llm_provider
+from metrics import span, record_llm_usage, LLM_CALLS, TOOL_CALLS, TOOL_CACHE, DEADLINE_EXCEEDED
+from audit import AuditLog, get_audit_log
+from prefetch import ToolPrefetch, tools_to_prefetch
+from deadline import DeadlineExceeded, deadline_scope, remaining, budget
+from workflows import WORKFLOWS, combine
+from availability import MAX_DAYS
+
+# Don't start another model call with less time than this left; answer with what we have.
+MIN_LLM_SECONDS = 1.5
+
+
+def _int_arg(value: Any, default: int, low: int, high: int) -> int:
+    """A model-supplied integer argument, clamped to [low, high]; default when it isn't a number."""
+    try:
+        return max(low, min(int(value), high))
+    except (TypeError, ValueError, OverflowError):
+        return default
 
 # ── Tool declarations ──────────────────────────────────────────────────────────
 
@@ -45,12 +69,32 @@ BASE_TOOLS = [
         "function": {
             "name": "get_available_doctors",
             "description": (
-                "Fetch the list of available doctors. "
-                "Call this BEFORE booking to choose the right doctor."
+                "Fetch the doctors nearest the patient. "
+                "Only needed when the patient wants to see or choose a doctor themselves."
             ),
             "parameters": {"type": "object", "properties": {}, "required": []},
         },
     },
+    {
+        "type": "function",
+        "function": {
+            "name": "find_available_slots",
+            "description": (
+                "Find the earliest open appointment slots across suitable nearby doctors. "
+                "Use it to offer the soonest date and time, then pass them to book_appointment."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "specialty": {"type": "string", "description": "Doctor speciality to filter on, e.g. 'Cardiologist' (optional)."},
+                    "doctor_name": {"type": "string", "description": "Only this doctor (optional)."},
+                    "date_from": {"type": "string", "description": "Earliest date in YYYY-MM-DD (optional, defaults to today)."},
+                    "days": {"type": "integer", "description": "How many days ahead to search (optional, default 14)."},
+                },
+                "required": [],
+            },
+        },
+    },
     {
         "type": "function",
         "function": {
@@ -79,6 +123,35 @@ BASE_TOOLS = [
             },
         },
     },
+    {
+        "type": "function",
+        "function": {
+            "name": "emergency_response",
+            "description": (
+                "Emergency in one step: finds the nearest hospitals and alerts the patient's guardian at the same time. "
+                "Use this instead of calling find_nearest_hospital and send_emergency_alert separately."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "message": {"type": "string", "description": "Alert message for the guardian (optional)"},
+                    "city": {"type": "string", "description": "City to search if the patient's location is unknown (optional)."},
+                },
+                "required": [],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "status_overview",
+            "description": (
+                "The patient's health summary (vitals, medications) and upcoming appointments in one step. "
+                "Use it when they ask how they are doing overall or want both."
+            ),
+            "parameters": {"type": "object", "properties": {}, "required": []},
+        },
+    },
     {
         "type": "function",
         "function": {
@@ -94,16 +167,23 @@ BOOK_TOOL = {
     "function": {
         "name": "book_appointment",
         "description": (
-            "Book an appointment with a specific doctor from get_available_doctors. "
-            "Always set doctor_name (exact name from doctors list), reason (short label), "
-            "and patient_notes (full 2-3 sentence symptom summary for the doctor)."
+            "Book an appointment. With doctor_name 'best match' the server picks the nearest doctor "
+            "whose specialty fits patient_notes, so no doctor list is needed first. "
+            "Always set reason (short label) and patient_notes (full 2-3 sentence symptom summary for the doctor)."
         ),
         "parameters": {
             "type": "object",
             "properties": {
                 "doctor_name": {
                     "type": "string",
-                    "description": "Exact name of the chosen doctor from get_available_doctors."
+                    "description": (
+                        "'best match' (default) to let the server choose, or the exact name of a doctor "
+                        "the patient asked for."
+                    ),
+                },
+                "specialty": {
+                    "type": "string",
+                    "description": "Specialty the patient asked for, e.g. 'Cardiology' (optional; otherwise inferred from patient_notes)",
                 },
                 "date": {"type": "string", "description": "Date in YYYY-MM-DD (optional, defaults to tomorrow)"},
                 "time": {"type": "string", "description": "Time in HH:MM (optional, auto-selects first available)"},
@@ -121,7 +201,7 @@ BOOK_TOOL = {
                     )
                 },
             },
-            "required": ["doctor_name", "reason", "patient_notes"],
+            "required": ["reason", "patient_notes"],
         },
     },
 }
@@ -133,21 +213,24 @@ SYSTEM_PROMPT = """You are AgentCare, a warm and caring AI health assistant for
 ## CORE RULE: LOCATION-BASED CARE
 You have access to the user's live location. ALWAYS prioritize finding doctors and hospitals near the patient.
 1. When a patient needs care, use `find_nearest_hospital` to locate medical centers.
-2. Automatically call `get_available_doctors` which filters for staff at those specific nearby hospitals.
+2. Automatically call `get_available_doctors`, which lists the doctors nearest the patient, closest first.
 
 ## THE 2-PHASE BOOKING PROTOCOL
 You must follow this exact sequence for appointments:
 1. PHASE 1 (Intake): If a patient requests an appointment, DO NOT book it yet. Ask ONE clarifying question to understand their symptoms (e.g., "Could you tell me a little bit about what symptoms you're experiencing?").
-2. PHASE 2 (Booking): Once they describe their symptoms, immediately call `get_available_doctors` to find matching doctors. 
-3. After getting the doctors list, IMMEDIATELY call `book_appointment` with the best doctor from the list. 
-   - DO NOT hallucinate doctor names. ONLY use names provided by `get_available_doctors`.
-   - DO NOT ask for confirmation of the doctor or hospital. Just pick the best fit from the list and execute `book_appointment` immediately.
+2. PHASE 2 (Booking): Once they describe their symptoms, IMMEDIATELY call `book_appointment` with doctor_name "best match" and detailed patient_notes. The server picks the nearest doctor whose specialty fits.
+   - Only call `get_available_doctors` first if the patient asks to see or choose a doctor, and then use an exact name from that list.
+   - DO NOT hallucinate doctor names.
+   - DO NOT ask for confirmation of the doctor or hospital.
 
 ## EMERGENCY & SAFETY
-- For physical emergencies (chest pain, falls, etc.), call `find_nearest_hospital` and `send_emergency_alert`.
+- For physical emergencies (chest pain, falls, etc.), call `emergency_response` once: it finds the nearest hospitals and alerts the guardian together.
 - STAY CALM: Focus on physical health and logistics. Avoid language that sounds like a psychiatric crisis unless the user specifically mentions self-harm.
 - If the patient is in pain, provide immediate reassurance: "I am finding a hospital near you and alerting your family right now."
 
+## STATUS
+- When the patient asks how they are doing overall, or about both their health and their appointments, call `status_overview` once instead of separate tools.
+
 ## OUTPUT RESTRICTIONS
 - NEVER output raw `<function>` or `<tool>` XML tags in your text (e.g., `<function=book_appointment>`). Always use the system's native tool calling JSON format.
 - NEVER show technical details, JSON, or tool names to the user.
@@ -164,44 +247,164 @@ You must follow this exact sequence for appointments:
 
 # ── Helpers ────────────────────────────────────────────────────────────────────
 
-EMERGENCY_KEYWORDS = re.compile(
-    r"\b(emergency|can't breathe|chest pain|heart attack|stroke|unconscious|fainted|dying|collapsed)\b",
-    re.IGNORECASE,
-)
+ALL_TOOLS = BASE_TOOLS + [BOOK_TOOL]
+TOOLS_BY_NAME = {t["function"]["name"]: t for t in ALL_TOOLS}
+
 
 def _is_emergency(message: str) -> bool:
     return bool(EMERGENCY_KEYWORDS.search(message))
 
 
+def _assistant_message_dict(message: Any) -> Dict[str, Any]:
+    """Plain-dict form of an SDK assistant message so it can be re-sent and token-counted."""
+    out: Dict[str, Any] = {"role": "assistant", "content": message.content or ""}
+    if message.tool_calls:
+        out["tool_calls"] = [{
+            "id": tc.id,
+            "type": "function",
+            "function": {"name": tc.function.name, "arguments": tc.function.arguments or "{}"},
+        } for tc in message.tool_calls]
+    return out
+
+
 
 # ── Orchestrator ───────────────────────────────────────────────────────────────
 
 class AgentOrchestrator:
-    def __init__(self, supabase: Client):
-        self.supabase = supabase
-        api_key = os.environ.get("GROQ_API_KEY")
-        if not api_key:
-            raise ValueError("GROQ_API_KEY is required in .env")
-        self.client = Groq(api_key=api_key)
+    def __init__(self, repo: Repository, llm: Optional[LLMProvider] = None, audit: Optional[AuditLog] = None):
+        self.repo = repo
+        self.llm = llm or create_llm_provider()
+        self.audit = audit or get_audit_log()
         self.model = "llama-3.1-8b-instant"
-
-    async def _execute_tool(self, tool_name: str, args: Dict[str, Any], patient_id: str, lat: Optional[float] = None, lng: Optional[float] = None) -> Dict[str, Any]:
-        """Execute a tool function by name."""
+        self.tool_cache = ToolResultCache(ttl_seconds=float(os.environ.get("TOOL_CACHE_TTL_SECONDS", "60")))
+        self.context = ContextManager(
+            max_prompt_tokens=int(os.environ.get("CHAT_MAX_PROMPT_TOKENS", "3000")),
+            max_completion_tokens=int(os.environ.get("CHAT_MAX_COMPLETION_TOKENS", "512")),
+        )
+        self.admission = AdmissionController(
+            max_sessions=int(os.environ.get("CHAT_MAX_SESSIONS", "8")),
+            max_queue=int(os.environ.get("CHAT_MAX_QUEUE", "32")),
+            queue_timeout=float(os.environ.get("CHAT_QUEUE_TIMEOUT_SECONDS", "20")),
+        )
+
+    async def _execute_tool(
+        self, tool_name: str, args: Dict[str, Any], patient_id: str, lat: Optional[float] = None, lng: Optional[float] = None,
+        prefetch: Optional[ToolPrefetch] = None,
+    ) -> Tuple[Dict[str, Any], bool]:
+        """Execute a tool function by name. Returns (result, served_from_cache)."""
+        args = args or {}
+        started = time.perf_counter()
+        # The model can name any tool; keep made-up names out of the metric labels
+        metric_name = tool_name if tool_name in TOOLS_BY_NAME else "unknown"
+        if tool_name in READ_ONLY_TOOLS:
+            key = ToolResultCache.make_key(patient_id, tool_name, args, lat, lng)
+            cached = self.tool_cache.get(key)
+            TOOL_CACHE.inc(result="miss" if cached is None else "hit")
+            TOOL_CALLS.inc(tool=metric_name, cached="false" if cached is None else "true")
+            if cached is not None:
+                self._audit_tool(patient_id, tool_name, args, cached, True, started)
+                return cached, True
+            inflight = prefetch.take(tool_name) if prefetch is not None else None
+            with span("tool", metric_name):
+                pending = inflight if inflight is not None else self._dispatch_tool(tool_name, args, patient_id, lat=lat, lng=lng)
+                result = await self._within_deadline(tool_name, pending)
+            self.tool_cache.put(key, result)  # timeouts carry an error and aren't cached
+            self._audit_tool(patient_id, tool_name, args, result, False, started)
+            return result, False
+
+        TOOL_CALLS.inc(tool=metric_name, cached="false")
+        with span("tool", metric_name):
+            pending = self._dispatch_tool(tool_name, args, patient_id, lat=lat, lng=lng)
+            # Writes (bookings, alerts) always finish: cutting one off halfway helps nobody
+            result = await (pending if tool_name in WRITE_TOOLS else self._within_deadline(tool_name, pending))
+        if tool_name in WRITE_TOOLS:
+            self.tool_cache.invalidate_patient(patient_id)
+        self._audit_tool(patient_id, tool_name, args, result, False, started)
+        return result, False
+
+    async def _within_deadline(self, tool_name: str, pending) -> Dict[str, Any]:
+        """Await a tool result for at most the time left in the request."""
+        try:
+            try:
+                timeout = budget()
+            except DeadlineExceeded:
+                # Out of time before awaiting: stop the work here, or a prefetch task runs on
+                if asyncio.iscoroutine(pending):
+                    pending.close()
+                else:
+                    pending.cancel()
+                raise
+            return await asyncio.wait_for(pending, timeout)
+        except asyncio.TimeoutError:
+            DEADLINE_EXCEEDED.inc(stage="tool")
+            print(f"[AgentCare] {tool_name} cut off by the request deadline")
+            return {"error": f"{tool_name} timed out"}
+
+    async def _run_workflow(
+        self, workflow: str, args: Dict[str, Any], patient_id: str, lat: Optional[float] = None, lng: Optional[float] = None,
+        prefetch: Optional[ToolPrefetch] = None,
+    ) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """Run a composite tool's steps concurrently. Returns (combined result, one action per step)."""
         args = args or {}
+        steps = [(tool, step_args(args)) for tool, step_args in WORKFLOWS[workflow]]
+        with span("workflow", workflow):
+            outcomes = await asyncio.gather(*(
+                self._execute_tool(tool, tool_args, patient_id, lat=lat, lng=lng, prefetch=prefetch)
+                for tool, tool_args in steps
+            ), return_exceptions=True)
+        actions = []
+        for (tool, tool_args), outcome in zip(steps, outcomes):
+            # One failing step (hospital search down) must not lose the others (the alert)
+            if isinstance(outcome, Exception):
+                print(f"[AgentCare] {workflow}: {tool} failed: {outcome}")
+                outcome = ({"error": f"{tool} failed: {str(outcome)[:150]}"}, False)
+            elif isinstance(outcome, BaseException):
+                raise outcome
+            result, cached = outcome
+            actions.append({"tool": tool, "args": tool_args, "result": result, "cached": cached})
+        return combine(workflow, {a["tool"]: a["result"] for a in actions}), actions
+
+    def _audit_tool(self, patient_id: str, tool_name: str, args: Dict[str, Any], result: Any, cached: bool, started: float):
+        # Arguments and outcome only; results can be large and are reproducible from the tables
+        error = result.get("error") if isinstance(result, dict) else None
+        self.audit.record("orchestrator", "tool_call", {
+            "tool": tool_name,
+            "args": args,
+            "cached": cached,
+            "ok": not error,
+            "error": error,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+        }, patient_id=patient_id, target_agent=tool_name)
+
+    async def _dispatch_tool(self, tool_name: str, args: Dict[str, Any], patient_id: str, lat: Optional[float] = None, lng: Optional[float] = None) -> Dict[str, Any]:
+        """Run the underlying tool implementation."""
         if tool_name == "get_health_summary":
-            return await get_health_summary(self.supabase, patient_id)
+            return await get_health_summary(self.repo, patient_id)
         elif tool_name == "get_appointments":
-            return await get_appointments(self.supabase, patient_id)
+            return await get_appointments(self.repo, patient_id)
         elif tool_name == "get_available_doctors":
-            return await get_available_doctors(self.supabase, user_lat=lat, user_lng=lng)
+            return await get_available_doctors(self.repo, user_lat=lat, user_lng=lng)
         elif tool_name == "book_appointment":
             return await book_appointment(
-                self.supabase, patient_id,
+                self.repo, patient_id,
                 doctor_name=args.get("doctor_name"),
+                specialty=args.get("specialty"),
                 date=args.get("date"),
                 time=args.get("time"),
                 reason=args.get("reason"),
                 patient_notes=args.get("patient_notes"),
+                user_lat=lat,
+                user_lng=lng,
+            )
+        elif tool_name == "find_available_slots":
+            return await find_available_slots(
+                self.repo,
+                specialty=args.get("specialty"),
+                doctor_name=args.get("doctor_name"),
+                date_from=args.get("date_from"),
+                days=_int_arg(args.get("days"), 14, 1, MAX_DAYS),
+                user_lat=lat,
+                user_lng=lng,
             )
         elif tool_name == "find_nearest_hospital":
             return await find_nearest_hospital(
@@ -210,45 +413,146 @@ class AgentOrchestrator:
                 longitude=lng or args.get("longitude")
             )
         elif tool_name == "send_emergency_alert":
-            return await send_emergency_alert(self.supabase, patient_id, message=args.get("message"))
+            return await send_emergency_alert(self.repo, patient_id, message=args.get("message"))
         elif tool_name == "get_medications":
-            return await get_medications(self.supabase, patient_id)
+            return await get_medications(self.repo, patient_id)
         else:
             return {"error": f"Unknown tool: {tool_name}"}
 
-    async def chat(self, patient_id: str, message: str, history: List[Dict] = None, lat: Optional[float] = None, lng: Optional[float] = None) -> Dict[str, Any]:
-        """Process a user chat message, execute any tool calls, and return the response."""
-        actions_taken = []
+    async def chat(
+        self, patient_id: str, message: str, history: List[Dict] = None, lat: Optional[float] = None, lng: Optional[float] = None,
+        timeout: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """Process a user chat message, execute any tool calls, and return the response.
+        With a timeout, every step below (queueing, model calls, tools, outbound HTTP) shares
+        one deadline and the turn ends with a partial answer rather than running over."""
+        with deadline_scope(timeout):
+            return await self._chat(patient_id, message, history, lat=lat, lng=lng)
+
+    async def _chat(self, patient_id: str, message: str, history: Optional[List[Dict]], lat: Optional[float] = None, lng: Optional[float] = None) -> Dict[str, Any]:
         history = history or []
+        usage = UsageMeter()
 
         # ── Fast paths and Gates ───────────────────────────────────────────────
-        tools = BASE_TOOLS + [BOOK_TOOL]
+        fast_intent = fast_router.match_fast_intent(message)
+        if fast_intent:
+            tool_name = fast_router.tool_for(fast_intent)
+            result, cached = await self._execute_tool(tool_name, {}, patient_id, lat=lat, lng=lng)
+            if not result.get("error"):
+                print(f"[AgentCare] Fast path: {fast_intent} via {tool_name}")
+                return {
+                    "response": fast_router.render(fast_intent, result),
+                    "actions": [{"tool": tool_name, "args": {}, "result": result, "cached": cached}],
+                    "usage": usage.as_dict(),
+                    "fast_path": fast_intent,
+                }
+
+        # ── Admission: bounded LLM sessions, emergencies first ────────────────
+        priority = priority_for(classify(message, history))
+        try:
+            async with self.admission.admit(patient_id, priority):
+                return await self._agent_turn(patient_id, message, history, usage, lat=lat, lng=lng)
+        except AdmissionRejected as e:
+            print(f"[AgentCare] Shedding {PRIORITY_NAMES[priority]} turn for {patient_id}: {e.reason}")
+            return await self._shed_turn(patient_id, message, priority, e.reason, usage)
+
+    async def _shed_turn(self, patient_id: str, message: str, priority: int, reason: str, usage: UsageMeter) -> Dict[str, Any]:
+        """Answer without the LLM when the turn can't be admitted. Emergencies still raise the alert."""
+        actions_taken = []
+        if priority == EMERGENCY:
+            result, _ = await self._execute_tool("send_emergency_alert", {"message": message}, patient_id)
+            actions_taken.append({"tool": "send_emergency_alert", "args": {"message": message}, "result": result, "cached": False})
+            alerted = "I've alerted your guardian right away." if result.get("success") else "I couldn't reach your guardian."
+            response = f"{alerted} If you are in danger, please call emergency services (112) now. I'll be with you again in a moment."
+        elif reason == "patient_busy":
+            response = "I'm still working on your previous message. I'll be with you in just a moment."
+        else:
+            response = "I'm helping a lot of people right now. Please wait a few seconds and try again."
+        return {
+            "response": response,
+            "actions": actions_taken,
+            "usage": usage.as_dict(),
+            "shed": reason,
+        }
+
+    def _start_prefetch(
+        self, patient_id: str, message: str, history: List[Dict], tools_sent: List[str], lat: Optional[float], lng: Optional[float],
+    ) -> Optional[ToolPrefetch]:
+        """Start the location lookups this turn is likely to ask for, unless already cached."""
+        if lat is None or lng is None:
+            return None
+        prefetch = ToolPrefetch()
+        for tool_name in tools_to_prefetch(classify(message, history), tools_sent):
+            if self.tool_cache.contains(ToolResultCache.make_key(patient_id, tool_name, {}, lat, lng)):
+                continue
+            prefetch.start(tool_name, lambda name=tool_name: self._dispatch_tool(name, {}, patient_id, lat=lat, lng=lng))
+        return prefetch
+
+    async def _agent_turn(self, patient_id: str, message: str, history: List[Dict], usage: UsageMeter, lat: Optional[float] = None, lng: Optional[float] = None) -> Dict[str, Any]:
+        """Run the LLM tool-calling loop for one admitted turn."""
+        # Only send the schemas this turn plausibly needs; widen to all on a miss.
+        selected = select_tool_names(message, history)
+        tools = ALL_TOOLS if selected is None else [TOOLS_BY_NAME[n] for n in selected]
+        tool_selection = {"tools_sent": [t["function"]["name"] for t in tools], "widened": False}
+
+        # Hospital/doctor lookups take seconds; run them while the model thinks.
+        prefetch = self._start_prefetch(patient_id, message, history, tool_selection["tools_sent"], lat, lng)
+        try:
+            return await self._agent_loop(patient_id, message, history, usage, tools, tool_selection, prefetch, lat=lat, lng=lng)
+        finally:
+            if prefetch is not None:
+                prefetch.cancel_unused()
+
+    async def _agent_loop(
+        self, patient_id: str, message: str, history: List[Dict], usage: UsageMeter,
+        tools: List[Dict[str, Any]], tool_selection: Dict[str, Any], prefetch: Optional[ToolPrefetch],
+        lat: Optional[float] = None, lng: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        actions_taken = []
         system_prompt = SYSTEM_PROMPT
 
-        # ── Build message history ──────────────────────────────────────────────
-        messages = [{"role": "system", "content": system_prompt}]
-        for msg in history:
-            messages.append({"role": msg["role"], "content": msg["content"]})
-        messages.append({"role": "user", "content": message})
+        # ── Build message history (trimmed to the prompt budget) ───────────────
+        messages = self.context.build_messages(system_prompt, history, message, tools)
 
         # ── Agentic loop ───────────────────────────────────────────────────────
         max_iterations = 8
         for _ in range(max_iterations):
+            left = remaining()
+            if left is not None and left < MIN_LLM_SECONDS:
+                DEADLINE_EXCEEDED.inc(stage="loop")
+                return self._partial_response(actions_taken, usage, tool_selection)
             try:
                 kwargs = {
                     "model": self.model,
                     "messages": messages,
-                    "max_tokens": 4096,
+                    "max_tokens": self.context.max_completion_tokens,
                 }
                 if tools:
                     kwargs["tools"] = tools
                     kwargs["tool_choice"] = "auto"
 
-                response = self.client.chat.completions.create(**kwargs)
+                with span("llm", self.model):
+                    timeout = budget()  # before creating the call, so an expired budget leaves no coroutine behind
+                    response = await asyncio.wait_for(self.llm.acomplete(**kwargs), timeout)
+                record_llm_usage("orchestrator", self.model, response)
+                usage.record_call(response, count_message_tokens(messages, tools))
+            except asyncio.TimeoutError:
+                LLM_CALLS.inc(agent="orchestrator", model=self.model, status="timeout")
+                DEADLINE_EXCEEDED.inc(stage="llm")
+                print("[AgentCare] LLM call cut off by the request deadline")
+                return self._partial_response(actions_taken, usage, tool_selection)
             except Exception as e:
                 error_msg = str(e)
-                print(f"[AgentCare] Groq API error: {error_msg}")
-                
+                LLM_CALLS.inc(agent="orchestrator", model=self.model, status="error")
+                print(f"[AgentCare] LLM API error: {error_msg}")
+
+                # Model tried to call a tool we didn't send this turn: widen and retry
+                if "not in request.tools" in error_msg or "tool call validation failed" in error_msg.lower():
+                    if len(tools) < len(ALL_TOOLS):
+                        tools = ALL_TOOLS
+                        tool_selection["widened"] = True
+                        continue
+
                 # If rate limited, try fallback model
                 if ("rate_limit" in error_msg.lower() or "429" in error_msg) and self.model != "mixtral-8x7b-32768":
                     print(f"[AgentCare] Rate limit hit for {self.model}. Trying fallback Mixtral...")
@@ -259,10 +563,14 @@ class AgentOrchestrator:
                     return {
                         "response": "I'm experiencing very high demand right now. Please wait a minute and try again.",
                         "actions": actions_taken,
+                        "usage": usage.as_dict(),
+                        "tool_selection": tool_selection,
                     }
                 return {
                     "response": f"Sorry, I encountered an error: {error_msg[:150]}",
                     "actions": actions_taken,
+                    "usage": usage.as_dict(),
+                    "tool_selection": tool_selection,
                 }
 
             choice = response.choices[0]
@@ -280,12 +588,17 @@ class AgentOrchestrator:
                 return {
                     "response": clean_response or raw_response, # Fallback if too aggressive
                     "actions": actions_taken,
+                    "usage": usage.as_dict(),
+                    "tool_selection": tool_selection,
                 }
 
-            messages.append(choice.message)
+            messages.append(_assistant_message_dict(choice.message))
 
             for tool_call in choice.message.tool_calls:
                 tool_name = tool_call.function.name
+                if tool_name in TOOLS_BY_NAME and TOOLS_BY_NAME[tool_name] not in tools:
+                    tools = ALL_TOOLS
+                    tool_selection["widened"] = True
                 try:
                     tool_args = json.loads(tool_call.function.arguments) if tool_call.function.arguments else {}
                 except json.JSONDecodeError:
@@ -293,21 +606,53 @@ class AgentOrchestrator:
 
                 print(f"[AgentCare] Executing tool: {tool_name}({tool_args})")
 
-                result = await self._execute_tool(tool_name, tool_args, patient_id, lat=lat, lng=lng)
-                actions_taken.append({
-                    "tool": tool_name,
-                    "args": tool_args,
-                    "result": result,
-                })
+                if tool_name in WORKFLOWS:
+                    # The client sees each step as its own action; the model gets one combined result
+                    result, step_actions = await self._run_workflow(tool_name, tool_args, patient_id, lat=lat, lng=lng, prefetch=prefetch)
+                    actions_taken.extend(step_actions)
+                else:
+                    result, cached = await self._execute_tool(tool_name, tool_args, patient_id, lat=lat, lng=lng, prefetch=prefetch)
+                    actions_taken.append({
+                        "tool": tool_name,
+                        "args": tool_args,
+                        "result": result,
+                        "cached": cached,
+                    })
 
                 # Add tool result to messages
                 messages.append({
                     "role": "tool",
                     "tool_call_id": tool_call.id,
-                    "content": json.dumps(result, default=str),
+                    "content": self.context.compact_tool_result(tool_name, result, usage),
                 })
 
         return {
             "response": "I've completed the requested actions.",
             "actions": actions_taken,
+            "usage": usage.as_dict(),
+            "tool_selection": tool_selection,
+        }
+
+    def _partial_response(self, actions_taken: List[Dict[str, Any]], usage: UsageMeter, tool_selection: Dict[str, Any]) -> Dict[str, Any]:
+        """Answer from whatever the tools already returned when the deadline runs out."""
+        parts = []
+        for action in actions_taken:
+            tool, result = action["tool"], action["result"]
+            if tool == "send_emergency_alert" and result.get("success"):
+                parts.append("I've alerted your guardian.")
+            elif tool == "book_appointment" and result.get("success"):
+                parts.append(f"Your appointment with {result['doctor_name']} on {result['date']} at {result['time']} is booked.")
+            elif tool == "find_nearest_hospital" and result.get("hospitals"):
+                nearest = result["hospitals"][0]
+                distance = f" ({nearest['distance']} km away)" if nearest.get("distance") is not None else ""
+                parts.append(f"The nearest hospital I found is {nearest['name']}{distance}.")
+        if any(a["tool"] == "send_emergency_alert" for a in actions_taken):
+            parts.append("If you are in danger, please call emergency services (112) now.")
+        parts.append("I couldn't finish everything in time, so please ask me again for the rest.")
+        return {
+            "response": " ".join(parts),
+            "actions": actions_taken,
+            "usage": usage.as_dict(),
+            "tool_selection": tool_selection,
+            "partial": True,
         }
@@ -0,0 +1,55 @@
+"""
+Speculative prefetch of slow, location-based tool results for one chat turn.
+When a turn carries coordinates and its intents make a lookup likely, the hospital
+search starts alongside the first LLM call instead of after the model asks for it.
+A tool call the prefetch can serve awaits the task already in flight; prefetches
+the model never asks for are cancelled when the turn ends. Hits and waste are
+counted per tool.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from metrics import PREFETCHES
+from workflows import step_tools
+
+# Tools whose result depends only on the patient's location (never on the model's
+# arguments) when coordinates are known, so a prefetch is exactly what the call returns,
+# and the intents after which the model usually calls them this turn. Doctor search is
+# an in-memory index lookup (geo_index.py) and isn't worth prefetching.
+PREFETCH_INTENTS: Dict[str, Set[str]] = {
+    "find_nearest_hospital": {"emergency", "hospital"},
+}
+
+
+def tools_to_prefetch(intents: Set[str], tools_sent: List[str]) -> List[str]:
+    """Tools sent this turn (directly or as a workflow step) that its intents make likely."""
+    sent = step_tools(tools_sent)
+    return [name for name, wanted in PREFETCH_INTENTS.items() if name in sent and intents & wanted]
+
+
+class ToolPrefetch:
+    def __init__(self):
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def start(self, tool_name: str, fn: Callable[[], Awaitable[Any]]):
+        if tool_name in self._tasks:
+            return
+        self._tasks[tool_name] = asyncio.ensure_future(fn())
+        PREFETCHES.inc(tool=tool_name, result="started")
+
+    def take(self, tool_name: str) -> Optional[asyncio.Task]:
+        """Claim the in-flight lookup for a tool call (at most once per tool and turn)."""
+        task = self._tasks.pop(tool_name, None)
+        if task is not None:
+            PREFETCHES.inc(tool=tool_name, result="hit")
+        return task
+
+    def cancel_unused(self):
+        for tool_name, task in self._tasks.items():
+            PREFETCHES.inc(tool=tool_name, result="wasted")
+            if task.done():
+                if not task.cancelled():
+                    task.exception()  # mark retrieved; nobody will await it
+            else:
+                task.cancel()
+        self._tasks.clear()
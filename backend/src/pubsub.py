@@ -0,0 +1,84 @@
+"""
+In-process pub/sub for live pre-visit reports.
+Each saved draft is published once and fanned out to every SSE viewer of that
+appointment. The broker also remembers the latest version (ETag) per appointment
+so conditional GETs can answer 304 without touching the database.
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+
+def report_etag(report: Dict[str, Any]) -> str:
+    digest = hashlib.sha1(json.dumps(report, sort_keys=True, default=str).encode()).hexdigest()
+    return f'"{digest[:20]}"'
+
+
+class ReportBroker:
+    def __init__(self, version_ttl: float = 5.0, max_versions: int = 2048, queue_size: int = 8):
+        # Versions learned here are only trusted for version_ttl seconds: another worker
+        # (or the dashboard itself) may have written the row since.
+        self.version_ttl = version_ttl
+        self.max_versions = max_versions
+        self.queue_size = queue_size
+        self._versions: "OrderedDict[str, Tuple[float, str, Dict[str, Any]]]" = OrderedDict()
+        self._subscribers: Dict[str, List[asyncio.Queue]] = {}
+        self.published = 0
+        self.delivered = 0
+
+    def remember(self, appointment_id: str, report: Dict[str, Any]) -> str:
+        etag = report_etag(report)
+        self._versions[appointment_id] = (time.monotonic() + self.version_ttl, etag, report)
+        self._versions.move_to_end(appointment_id)
+        while len(self._versions) > self.max_versions:
+            self._versions.popitem(last=False)
+        return etag
+
+    def latest(self, appointment_id: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        entry = self._versions.get(appointment_id)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1], entry[2]
+
+    def publish(self, appointment_id: str, report: Dict[str, Any]) -> str:
+        """Record the new version and push it to every viewer. Slow viewers skip to the latest."""
+        etag = self.remember(appointment_id, report)
+        self.published += 1
+        for queue in self._subscribers.get(appointment_id, []):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait((etag, report))
+            self.delivered += 1
+        return etag
+
+    def subscribe(self, appointment_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(appointment_id, []).append(queue)
+        return queue
+
+    def unsubscribe(self, appointment_id: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(appointment_id, [])
+        if queue in queues:
+            queues.remove(queue)
+        if not queues:
+            self._subscribers.pop(appointment_id, None)
+
+    def subscriber_count(self, appointment_id: Optional[str] = None) -> int:
+        if appointment_id is not None:
+            return len(self._subscribers.get(appointment_id, []))
+        return sum(len(q) for q in self._subscribers.values())
+
+
+_broker: Optional[ReportBroker] = None
+
+
+def get_report_broker() -> ReportBroker:
+    """Process-wide broker, configured from the environment on first use."""
+    global _broker
+    if _broker is None:
+        _broker = ReportBroker(version_ttl=float(os.environ.get("REPORT_VERSION_TTL_SECONDS", "5")))
+    return _broker
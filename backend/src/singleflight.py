@@ -0,0 +1,68 @@
+"""
+Request coalescing ("singleflight") for identical concurrent lookups.
+The first caller for a key starts the work; callers that arrive while it is in
+flight await the same result (or exception) instead of repeating the upstream call.
+Nothing is kept after the flight lands; caching is the job of tool_cache.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from metrics import COALESCED_CALLS
+from deadline import budget, without_deadline
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._flights: Dict[Hashable, asyncio.Task] = {}
+        self._waiting: Dict[asyncio.Task, int] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]], timeout: Optional[float] = None) -> Any:
+        """Run fn() once per key at a time. The flight runs outside any caller's request
+        deadline, bounded only by `timeout`, so every caller on the key sees the same
+        asyncio.TimeoutError; errors propagate the same way. Each caller waits no longer
+        than its own deadline allows."""
+        task = self._flights.get(key)
+        if task is None:
+            self.leaders += 1
+            COALESCED_CALLS.inc(flight=self.name, role="leader")
+            work = asyncio.wait_for(fn(), timeout) if timeout else fn()
+            task = asyncio.get_running_loop().create_task(work, context=without_deadline())
+            self._flights[key] = task
+            task.add_done_callback(lambda t: self._land(key, t))
+        else:
+            self.followers += 1
+            COALESCED_CALLS.inc(flight=self.name, role="follower")
+        # Shielded: one caller giving up (client disconnect, deadline) must not cancel the others'
+        # flight, but when the last one gives up nobody wants the result and the flight is cancelled.
+        self._waiting[task] = self._waiting.get(task, 0) + 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), budget())
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            if self._waiting[task] == 1 and not task.done():
+                task.cancel()
+                if self._flights.get(key) is task:
+                    del self._flights[key]  # later callers start a fresh flight
+            raise
+        finally:
+            self._waiting[task] -= 1
+            if not self._waiting[task]:
+                del self._waiting[task]
+
+    def _land(self, key: Hashable, task: asyncio.Task):
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved; callers that are still waiting get it via shield
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+
+def location_key(lat: Optional[float], lng: Optional[float], precision: int = 3) -> Optional[tuple]:
+    """Round coordinates to ~110 m so patients in the same building share a key."""
+    if lat is None or lng is None:
+        return None
+    return (round(lat, precision), round(lng, precision))
@@ -0,0 +1,123 @@
+"""
+Local symptom-to-specialty matcher used to pick a doctor without an LLM round trip.
+Weighted keywords per specialty are scored against the patient's notes (no network,
+microseconds per call); doctors are then ranked by how well their speciality fits
+and how far away their hospital is. General Physician is the fallback for anything
+that matches no specialist.
+"""
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+GENERAL = "General Physician"
+
+# Keyword -> weight. Keywords match whole words (plurals included); a trailing "*"
+# matches any ending ("confus*" covers confused and confusion).
+SPECIALTY_KEYWORDS: Dict[str, Dict[str, float]] = {
+    "Cardiology": {
+        "chest": 3, "heart": 3, "palpitation*": 3, "racing heart": 3, "irregular heartbeat": 3, "angina": 3,
+        "blood pressure": 2, "bp": 2, "hypertension": 2, "breathless": 2, "short of breath": 2,
+        "ankle swelling": 2, "cholesterol": 1,
+    },
+    "Orthopedics": {
+        "knee": 3, "hip": 3, "joint": 3, "back pain": 3, "spine": 3, "fractur*": 3, "bone": 3, "shoulder": 3,
+        "arthritis": 3, "sprain*": 2, "fell": 2, "fall": 2, "wrist": 2, "ankle": 2, "neck pain": 2, "stiff*": 1,
+        "walking": 1, "swollen": 1, "swelling": 1,
+    },
+    "Neurology": {
+        "headache": 3, "migraine*": 3, "numb*": 3, "tingling": 3, "seizure": 3, "tremor": 3, "stroke": 3,
+        "dizz*": 2, "vertigo": 2, "faint*": 2, "balance": 2, "weakness on one side": 3,
+        "slur*": 3, "memory": 1,
+    },
+    "Geriatrics": {
+        "memory": 2, "forget*": 2, "confus*": 2, "dementia": 3, "frail": 3, "falls": 2, "incontinence": 2,
+        "many medications": 2, "sleep": 1, "appetite": 1, "weak*": 1,
+    },
+    "Dermatology": {
+        "rash": 3, "itch*": 3, "skin": 3, "mole": 3, "eczema": 3, "psoriasis": 3, "hives": 3, "blister": 2,
+        "wound": 1, "ulcer": 1, "redness": 1,
+    },
+    "ENT": {
+        "ear": 3, "earache": 3, "hearing": 3, "tinnitus": 3, "nose": 3, "sinus": 3, "throat": 3, "tonsil": 3, "swallow*": 2,
+        "hoarse": 2, "nosebleed": 3, "congest*": 2, "vertigo": 1,
+    },
+    GENERAL: {
+        "fever": 2, "cough": 2, "cold": 2, "flu": 2, "tired*": 1, "fatigue": 1, "vomit*": 1, "nausea": 1,
+        "diarrh*": 1, "checkup": 2, "check-up": 2, "sugar": 1, "diabetes": 1, "weight": 1,
+    },
+}
+
+# How doctors' free-text speciality fields map onto the keys above
+SPECIALTY_ALIASES: List[Tuple[str, str]] = [
+    ("cardio", "Cardiology"), ("heart", "Cardiology"),
+    ("ortho", "Orthopedics"), ("bone", "Orthopedics"),
+    ("neuro", "Neurology"),
+    ("geriat", "Geriatrics"), ("elder", "Geriatrics"),
+    ("derma", "Dermatology"), ("skin", "Dermatology"),
+    ("ent", "ENT"), ("otolaryng", "ENT"), ("ear", "ENT"),
+    ("general", GENERAL), ("family", GENERAL), ("physician", GENERAL),
+]
+
+# A General Physician can see anything, so it always fits a little. How much fit
+# one kilometre of distance is worth when ranking doctors.
+GENERAL_FIT = 0.35
+FIT_PER_KM = 0.02
+
+_WORD = re.compile(r"[a-z][a-z'-]*")
+
+
+def _compile(keywords: Dict[str, float]) -> List[Tuple[re.Pattern, float]]:
+    patterns = []
+    for keyword, weight in keywords.items():
+        stem = re.escape(keyword.rstrip("*")).replace(r"\ ", r"\s+")
+        patterns.append((re.compile(r"\b" + stem + (r"\w*" if keyword.endswith("*") else r"(e?s)?\b")), weight))
+    return patterns
+
+
+_PATTERNS = {specialty: _compile(keywords) for specialty, keywords in SPECIALTY_KEYWORDS.items()}
+
+
+def canonical_specialty(speciality: Optional[str]) -> str:
+    """Map a doctor's speciality text ("Cardiologist", "ENT Surgeon") to a SPECIALTY_KEYWORDS key."""
+    words = _WORD.findall((speciality or "").lower())
+    for prefix, specialty in SPECIALTY_ALIASES:
+        if any(w.startswith(prefix) if len(prefix) > 3 else w == prefix for w in words):
+            return specialty
+    return GENERAL if not words else (speciality or GENERAL).strip()
+
+
+def score_specialties(text: Optional[str]) -> Dict[str, float]:
+    """Specialty -> keyword score for the symptoms in text (only specialties that matched)."""
+    text = (text or "").lower()
+    scores: Dict[str, float] = {}
+    for specialty, patterns in _PATTERNS.items():
+        score = sum(w for pattern, w in patterns if pattern.search(text))
+        if score:
+            scores[specialty] = score
+    return scores
+
+
+def specialty_fit(scores: Dict[str, float], specialty: str) -> float:
+    """How well a specialty fits the scored symptoms, 0..1 (relative to the best match)."""
+    top = max(scores.values(), default=0.0)
+    fit = scores.get(specialty, 0.0) / top if top else 0.0
+    return max(fit, GENERAL_FIT) if specialty == GENERAL else fit
+
+
+def rank_doctors(
+    text: Optional[str], doctors: List[Dict[str, Any]], preferred: Optional[str] = None,
+) -> List[Tuple[float, str, Dict[str, Any]]]:
+    """(score, specialty, doctor) best first, for the symptoms in text. Doctors carrying
+    distance_km (from the doctor index) lose FIT_PER_KM per kilometre; `preferred` is a
+    specialty the model or patient asked for, which outranks the keyword match."""
+    scores = score_specialties(text)
+    if preferred:
+        wanted = canonical_specialty(preferred)
+        scores[wanted] = max(scores.values(), default=0.0) + 1.0
+    ranked = []
+    for order, d in enumerate(doctors):
+        specialty = canonical_specialty(d.get("speciality"))
+        score = specialty_fit(scores, specialty) - FIT_PER_KM * (d.get("distance_km") or 0.0)
+        ranked.append((score, -order, specialty, d))
+    ranked.sort(key=lambda r: (r[0], r[1]), reverse=True)
+    return [(round(score, 3), specialty, d) for score, _, specialty, d in ranked]
+
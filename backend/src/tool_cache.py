@@ -0,0 +1,79 @@
+"""
+Per-session memoization of read-only tool results.
+Entries are keyed by patient, tool name and arguments, expire after a short TTL,
+and are dropped for a patient whenever one of their write tools runs.
+"""
+import json
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+READ_ONLY_TOOLS = {
+    "get_health_summary",
+    "get_appointments",
+    "get_medications",
+    "get_available_doctors",
+    "find_nearest_hospital",
+}
+
+WRITE_TOOLS = {
+    "book_appointment",
+    "send_emergency_alert",
+}
+
+
+class ToolResultCache:
+    def __init__(self, ttl_seconds: float = 60.0, max_entries: int = 2048):
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(patient_id: str, tool_name: str, args: Dict[str, Any],
+                 lat: Optional[float] = None, lng: Optional[float] = None) -> Tuple:
+        # ~100 m of GPS jitter between turns should still hit the same entry.
+        loc = (round(lat, 3) if lat is not None else None, round(lng, 3) if lng is not None else None)
+        return (patient_id, tool_name, json.dumps(args or {}, sort_keys=True, default=str), loc)
+
+    def get(self, key: Tuple) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def contains(self, key: Tuple) -> bool:
+        """Whether a live entry exists. A probe: not counted as a hit or miss, recency unchanged."""
+        entry = self._entries.get(key)
+        return entry is not None and entry[0] >= time.monotonic()
+
+    def put(self, key: Tuple, result: Dict[str, Any]):
+        # Don't pin failures; the next call should get a fresh attempt.
+        if result.get("error") or result.get("success") is False:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate_patient(self, patient_id: str) -> int:
+        """Drop every cached entry for a patient. Returns the number removed."""
+        stale = [k for k in self._entries if k[0] == patient_id]
+        for k in stale:
+            del self._entries[k]
+        return len(stale)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
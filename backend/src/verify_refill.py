@@ -35,7 +35,8 @@ async def verify_refill_flow():
 
     # 3. Trigger autonomous check
     from agents.refill_agent import RefillMonitorAgent
-    agent = RefillMonitorAgent(supabase)
+    from data import SupabaseRepository
+    agent = RefillMonitorAgent(SupabaseRepository(supabase))
     print("Triggering autonomous stock check...")
     await agent.check_stocks_and_trigger_refills()
 
@@ -0,0 +1,60 @@
+"""
+Composite tools for the multi-tool flows the model always runs the same way.
+One call runs every step server-side (independent steps concurrently, through the
+orchestrator's normal tool execution, so caching, prefetch, deadlines and auditing
+still apply per step) and returns one combined result, saving the model a round
+trip per step. Booking needs no composite: book_appointment with "best match"
+already picks the doctor itself.
+"""
+from datetime import date
+from typing import Any, Callable, Dict, List, Tuple
+
+from data.base import ACTIVE_APPOINTMENT_STATUSES
+
+# workflow -> [(step tool, args for that step from the workflow's args)]
+StepArgs = Callable[[Dict[str, Any]], Dict[str, Any]]
+
+WORKFLOWS: Dict[str, List[Tuple[str, StepArgs]]] = {
+    "emergency_response": [
+        ("find_nearest_hospital", lambda args: {"city": args["city"]} if args.get("city") else {}),
+        ("send_emergency_alert", lambda args: {"message": args["message"]} if args.get("message") else {}),
+    ],
+    "status_overview": [
+        ("get_health_summary", lambda args: {}),
+        ("get_appointments", lambda args: {}),
+    ],
+}
+
+
+def step_tools(names: List[str]) -> List[str]:
+    """Tool names with every workflow expanded into its steps."""
+    out: List[str] = []
+    for name in names:
+        for tool in [step for step, _ in WORKFLOWS[name]] if name in WORKFLOWS else [name]:
+            if tool not in out:
+                out.append(tool)
+    return out
+
+
+def combine(workflow: str, results: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """One result for the whole workflow from its steps' results."""
+    if workflow == "emergency_response":
+        hospitals, alert = results["find_nearest_hospital"], results["send_emergency_alert"]
+        return {
+            "alert": alert,
+            "alert_sent": bool(alert.get("success")),
+            "hospitals": hospitals.get("hospitals", [])[:3],
+            "hospital_error": hospitals.get("error"),
+        }
+    if workflow == "status_overview":
+        today = date.today().isoformat()
+        appointments = results["get_appointments"].get("appointments", [])
+        return {
+            "health": results["get_health_summary"],
+            "upcoming_appointments": [
+                a for a in appointments
+                if (a.get("date") or "") >= today and a.get("status") in ACTIVE_APPOINTMENT_STATUSES
+            ],
+            "error": results["get_health_summary"].get("error") or results["get_appointments"].get("error"),
+        }
+    raise KeyError(workflow)